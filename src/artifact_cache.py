@@ -0,0 +1,197 @@
+"""
+artifact_cache.py
+
+This file stores fitted models, best parameters and metrics on disk so that
+a pipeline run with unchanged inputs does not train the models again.
+
+It performs the following tasks.
+1. Build a cache key from a hash of the input data, the feature set,
+   the hyperparameter grid, the split settings and the library versions.
+2. Save an artifact together with a small JSON file holding its checksum.
+3. Load an artifact and check that it is complete and not stale.
+   Corrupted or stale entries are removed so they are rebuilt.
+4. Remove the least recently used entries when the cache grows larger
+   than its size limit.
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import platform
+import time
+
+import numpy as np
+import pandas as pd
+import sklearn
+
+
+# Bump when the layout of a cache entry changes
+CACHE_FORMAT = 1
+
+
+def library_versions():
+    """
+    Return the versions of the libraries that affect a fitted model.
+    """
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def data_fingerprint(df, columns=("Re", "St", "Cd")):
+    """
+    Return a sha256 hash of the given dataframe columns.
+
+    Parameters
+    df : pandas DataFrame
+        Dataset to hash.
+    columns : sequence of str
+        Columns included in the hash.
+
+    Returns
+    digest : str
+        Hex digest of the column names, shapes and values.
+    """
+    h = hashlib.sha256()
+    for col in columns:
+        values = np.ascontiguousarray(df[col].to_numpy(dtype=np.float64))
+        h.update(col.encode())
+        h.update(str(values.shape).encode())
+        h.update(values.tobytes())
+    return h.hexdigest()
+
+
+class ArtifactCache:
+    """
+    Content addressed on-disk store for pipeline artifacts.
+
+    Each entry is a pickle file named after its key and a JSON file with
+    the sha256 of the pickle, its size and the library versions.
+    """
+
+    def __init__(self, root, max_bytes=512 * 1024 * 1024):
+        """
+        Parameters
+        root : str
+            Folder holding the cache entries.
+        max_bytes : int
+            Total size of the pickle files kept before old entries are evicted.
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, **parts):
+        """
+        Build a cache key from keyword parts and the library versions.
+        """
+        parts["_versions"] = library_versions()
+        parts["_format"] = CACHE_FORMAT
+        text = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.root, key)
+        return base + ".pkl", base + ".json"
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def load(self, key):
+        """
+        Return the artifact stored under key, or None when it is missing,
+        corrupted, no longer unpickles against the current code or was
+        written by other library versions.
+        """
+        data_path, meta_path = self._paths(key)
+        if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+            return None
+
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            with open(data_path, "rb") as f:
+                payload = f.read()
+
+            if (meta.get("format") != CACHE_FORMAT
+                    or meta.get("versions") != library_versions()
+                    or meta.get("sha256") != hashlib.sha256(payload).hexdigest()):
+                raise ValueError("stale or corrupted cache entry")
+
+            obj = pickle.loads(payload)
+
+        except (OSError, ValueError, pickle.UnpicklingError, EOFError, AttributeError,
+                ImportError, TypeError):
+            self._remove(key)
+            return None
+
+        # Mark the entry as recently used for eviction
+        os.utime(data_path)
+        return obj
+
+    def save(self, key, obj):
+        """
+        Store obj under key and evict old entries if the cache is too large.
+        """
+        data_path, meta_path = self._paths(key)
+        payload = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # Write to temporary files first so a crash never leaves a half entry
+        with open(data_path + ".tmp", "wb") as f:
+            f.write(payload)
+        meta = {
+            "format": CACHE_FORMAT,
+            "sha256": hashlib.sha256(payload).hexdigest(),
+            "size": len(payload),
+            "created": time.time(),
+            "versions": library_versions(),
+        }
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+
+        os.replace(data_path + ".tmp", data_path)
+        os.replace(meta_path + ".tmp", meta_path)
+
+        self.evict()
+
+    def get_or_build(self, key, build):
+        """
+        Return the cached artifact for key or call build() and store its result.
+
+        Returns
+        obj : object
+            The cached or freshly built artifact.
+        hit : bool
+            True when the artifact came from the cache.
+        """
+        obj = self.load(key)
+        if obj is not None:
+            return obj, True
+
+        obj = build()
+        self.save(key, obj)
+        return obj, False
+
+    def evict(self):
+        """
+        Remove least recently used entries until the cache fits in max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.root):
+            if name.endswith(".pkl"):
+                path = os.path.join(self.root, name)
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, name[:-4]))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
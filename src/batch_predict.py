@@ -0,0 +1,139 @@
+"""
+batch_predict.py
+
+This file scores large files of Re and St values with a saved model.
+
+It performs the following tasks.
+1. Load a model written by save_model, a compiled FlatForest npz file or a
+   CdLookupTable npz file once in every worker process.
+2. Read the input CSV file in chunks with iter_data, or hand slices of a
+   binary dataset folder to the workers, which open it with memory mapping.
+3. Predict every chunk with one vectorized call in a pool of worker
+   processes, which also format the output rows.
+4. Write the chunks to the output CSV file in input order as soon as they
+   are ready. At most two chunks per worker are in flight, so memory stays
+   flat for any file size.
+5. Report the number of rows, the time and the throughput in rows per second.
+
+Example
+python -m src.main predict --model results/models/gbr_re_st.npz --input data/big.csv --output results/big_pred.csv
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from src.data_loader import iter_data, load_binary
+from src.predict_server import load_model
+
+
+# Model used by the tasks of the current process, set by _init_worker
+_MODEL = None
+
+
+def _init_worker(model):
+    global _MODEL
+    _MODEL = load_model(model) if isinstance(model, str) else model
+
+
+def _feature_columns(model):
+    """
+    Return the input columns of a model, Re only or Re and St.
+    """
+    return ("Re",) if getattr(model, "n_features_in_", 2) == 1 else ("Re", "St")
+
+
+def _predict_rows(X, columns):
+    # Runs in a worker, returns the CSV text of the chunk and its row count
+    out = pd.DataFrame(X, columns=list(columns))
+    out["Cd_pred"] = _MODEL.predict(X)
+    return out.to_csv(header=False, index=False).encode(), len(X)
+
+
+def _predict_slice(folder, start, stop, columns):
+    # Reads its rows from the memory mapped folder instead of receiving them
+    df = load_binary(folder).iloc[start:stop][list(columns)].dropna()
+    return _predict_rows(df.to_numpy(dtype=np.float64), columns)
+
+
+def _tasks(path, columns, chunksize):
+    if os.path.isdir(path):
+        n_rows = len(load_binary(path))
+        for start in range(0, n_rows, chunksize):
+            yield _predict_slice, (path, start, min(start + chunksize, n_rows), columns)
+    else:
+        for chunk in iter_data(path, chunksize=chunksize, columns=columns):
+            yield _predict_rows, (chunk.to_numpy(dtype=np.float64), columns)
+
+
+def predict_file(model, input_path, output_path, chunksize=200000, n_workers=None):
+    """
+    Predict Cd for every row of a file and write the results as CSV.
+
+    Rows with a missing input value are skipped, like in load_data.
+
+    Parameters
+    model : str or model object
+        Path of a saved model, or a model with a predict method.
+    input_path : str
+        CSV file, or binary dataset folder written by synthetic.py.
+    output_path : str
+        Output CSV file with the input columns and Cd_pred. It is written to
+        a temporary file first and replaced when all rows are done.
+    chunksize : int
+        Rows predicted per task.
+    n_workers : int or None
+        Worker processes. None uses one per CPU, 1 predicts in this process.
+
+    Returns
+    stats : dictionary with rows, seconds, rows_per_s and bytes
+
+    Raises
+    FileNotFoundError
+        When the model or the input file is not found.
+    ValueError
+        When the input misses a column the model needs.
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    start = time.perf_counter()
+
+    loaded = load_model(model) if isinstance(model, str) else model
+    columns = _feature_columns(loaded)
+    rows = 0
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = output_path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write((",".join(columns + ("Cd_pred",)) + "\n").encode())
+
+        if n_workers == 1:
+            _init_worker(loaded)
+            for func, args in _tasks(input_path, columns, chunksize):
+                text, n = func(*args)
+                f.write(text)
+                rows += n
+        else:
+            # Workers load the model themselves, so it is not sent with every task
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                                     initargs=(model,)) as pool:
+                pending = []
+                for func, args in _tasks(input_path, columns, chunksize):
+                    pending.append(pool.submit(func, *args))
+                    if len(pending) >= 2 * n_workers:
+                        text, n = pending.pop(0).result()
+                        f.write(text)
+                        rows += n
+                for future in pending:
+                    text, n = future.result()
+                    f.write(text)
+                    rows += n
+
+    os.replace(tmp_path, output_path)
+    seconds = time.perf_counter() - start
+    return {"rows": rows, "seconds": seconds,
+            "rows_per_s": rows / seconds if seconds > 0 else 0.0,
+            "bytes": os.path.getsize(output_path)}
@@ -0,0 +1,503 @@
+"""
+benchmark.py
+
+This file measures how the hot paths of the pipeline scale with the number
+of rows.
+
+It performs the following tasks.
+1. Build datasets from 1k to 10M rows with the synthetic generator, so every
+   size follows the distribution of the measured data.
+2. Time load_data, polynomial_regression, train_gbr in both search modes,
+   single row and batch predict of every model engine, the regression
+   metrics, run_eda and every plotting function at each size.
+3. Measure the peak traced memory of each case in a separate call.
+4. Fit the scaling exponent of every case, time ~ rows ** exponent.
+5. Save the results as a JSON baseline and flag cases that became slower
+   or larger than a previous baseline by more than a threshold.
+6. Measure the memory parallel CV workers use for the training arrays when
+   they are pickled, memory mapped by joblib or shared once, see --data-plane.
+
+Example
+python -m src.benchmark --sizes 1000,10000,100000 --save results/benchmarks/baseline.json
+python -m src.benchmark --sizes 1000,10000,100000 --compare results/benchmarks/baseline.json
+python -m src.benchmark --data-plane 2000000
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error, max_error
+
+from src.data_loader import load_data
+from src.eda import run_eda
+from src.polynomial_regression import polynomial_regression
+from src.gbr_model import train_gbr
+from src.metrics import regression_metrics
+from src.profiling import pss_mb
+from src.shared_data import shared_arrays
+from src.poly_basis import ChebyshevFamily
+from src.tree_engine import compile_gbr
+from src.surrogate_table import build_lookup_table
+from src.synthetic import SyntheticModel, generate_chunks
+from src.visualization import (
+    plot_cd_vs_re,
+    plot_cd_vs_st,
+    plot_re_vs_st,
+    plot_combined_cd_re,
+    plot_pred_vs_actual,
+)
+
+
+PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA = os.path.join(PROJECT, "data", "vortex_data.csv")
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000, 10000000)
+
+# Cases slower than this are timed once instead of best of repeats
+SLOW_CASE_S = 1.0
+
+# Differences below these are treated as noise when comparing runs
+MIN_DIFF_S = 0.005
+MIN_DIFF_MB = 1.0
+
+
+def make_dataset(n_rows, seed=0, source=DATA):
+    """
+    Draw a synthetic dataset of n_rows rows fitted to the measured data.
+    """
+    model = SyntheticModel.fit(load_data(source))
+    return pd.concat(generate_chunks(model, n_rows, seed=seed))
+
+
+_MODELS = {}
+
+
+def _models():
+    """
+    Fit the models used by the predict and plot cases once, on 10k rows.
+    """
+    if not _MODELS:
+        df = make_dataset(10000, seed=1)
+        params = dict(n_estimators=300, learning_rate=0.1, max_depth=4,
+                      subsample=0.9, random_state=42)
+        gbr_re = GradientBoostingRegressor(**params).fit(df[["Re"]].values, df["Cd"].values)
+        gbr_st = GradientBoostingRegressor(**params).fit(df[["Re", "St"]].values, df["Cd"].values)
+        family = ChebyshevFamily(5).fit(df["Re"].values, df["Cd"].values)
+        flat_st = compile_gbr(gbr_st)
+        _MODELS.update({
+            "gbr_re": gbr_re,
+            "gbr_st": gbr_st,
+            "flat_re": compile_gbr(gbr_re),
+            "flat_st": flat_st,
+            "table": build_lookup_table(flat_st, n_check=1000),
+            "family": family,
+            "poly_results": {d: {"test_r2": 0.0} for d in range(1, 6)},
+        })
+    return _MODELS
+
+
+def _rows(df, use_st=True):
+    return df[["Re", "St"]].values if use_st else df[["Re"]].values
+
+
+# Every case takes the dataset and a scratch folder and returns the function
+# to time. Setup work such as writing the CSV file is not timed.
+
+def _case_load_csv(df, tmp):
+    path = os.path.join(tmp, "data.csv")
+    df.to_csv(path, index=False)
+    return lambda: load_data(path, use_cache=False)
+
+
+def _case_load_cached(df, tmp):
+    path = os.path.join(tmp, "data.csv")
+    if not os.path.exists(path):
+        df.to_csv(path, index=False)
+    load_data(path)
+    return lambda: load_data(path)
+
+
+def _case_polynomial(engine):
+    return lambda df, tmp: (lambda: polynomial_regression(df, engine=engine))
+
+
+def _case_train_gbr(search, engine="exact"):
+    return lambda df, tmp: (lambda: train_gbr(df, use_st=True, search=search, engine=engine))
+
+
+def _case_predict_single(engine):
+    def setup(df, tmp):
+        model = _models()[engine]
+        X = _rows(df)[:100]
+
+        def run():
+            for i in range(len(X)):
+                model.predict(X[i:i + 1])
+        return run
+    return setup
+
+
+def _case_predict_batch(engine):
+    def setup(df, tmp):
+        model = _models()[engine]
+        X = _rows(df)
+        return lambda: model.predict(X)
+    return setup
+
+
+def _case_plot(func, *columns):
+    def setup(df, tmp):
+        path = os.path.join(tmp, func.__name__ + ".png")
+        if columns:
+            data = df.assign(Cd_pred=_models()["flat_st"].predict(_rows(df)))
+            return lambda: func(data, *columns, path)
+        return lambda: func(df, path)
+    return setup
+
+
+def _case_combined(df, tmp):
+    m = _models()
+    path = os.path.join(tmp, "combined.png")
+    return lambda: plot_combined_cd_re(df.copy(), m["poly_results"], m["flat_re"], m["flat_st"],
+                                       path, poly_family=m["family"])
+
+
+def _case_metrics(engine):
+    def setup(df, tmp):
+        y = df["Cd"].to_numpy()
+        y_pred = _models()["flat_st"].predict(_rows(df))
+        if engine == "fused":
+            return lambda: regression_metrics(y, y_pred)
+
+        def run():
+            r2_score(y, y_pred)
+            np.sqrt(mean_squared_error(y, y_pred))
+            mean_absolute_error(y, y_pred)
+            max_error(y, y_pred)
+        return run
+    return setup
+
+
+def _case_eda(df, tmp):
+    return lambda: run_eda(df, os.path.join(tmp, "eda"), n_workers=1)
+
+
+# name : (setup, largest number of rows, runs at every size)
+CASES = {
+    "load_data_csv": (_case_load_csv, None, True),
+    "load_data_cached": (_case_load_cached, None, True),
+    "polynomial_sklearn": (_case_polynomial("sklearn"), None, True),
+    "polynomial_chebyshev": (_case_polynomial("chebyshev"), None, True),
+    "train_gbr_grid": (_case_train_gbr("grid"), 10000, True),
+    "train_gbr_halving": (_case_train_gbr("halving"), 10000, True),
+    "train_gbr_hist": (_case_train_gbr("halving", "hist"), 1000000, True),
+    "predict_single_x100_sklearn": (_case_predict_single("gbr_st"), None, False),
+    "predict_single_x100_flat": (_case_predict_single("flat_st"), None, False),
+    "predict_single_x100_table": (_case_predict_single("table"), None, False),
+    "predict_batch_sklearn": (_case_predict_batch("gbr_st"), None, True),
+    "predict_batch_flat": (_case_predict_batch("flat_st"), None, True),
+    "predict_batch_table": (_case_predict_batch("table"), None, True),
+    "plot_cd_vs_re": (_case_plot(plot_cd_vs_re), None, True),
+    "plot_cd_vs_st": (_case_plot(plot_cd_vs_st), None, True),
+    "plot_re_vs_st": (_case_plot(plot_re_vs_st), None, True),
+    "plot_pred_vs_actual": (_case_plot(plot_pred_vs_actual, "Cd_pred"), None, True),
+    "plot_combined_cd_re": (_case_combined, None, True),
+    "metrics_sklearn": (_case_metrics("sklearn"), None, True),
+    "metrics_fused": (_case_metrics("fused"), None, True),
+    "run_eda": (_case_eda, None, True),
+}
+
+
+def measure(func, repeats=3):
+    """
+    Time func and measure its peak traced memory.
+
+    Returns
+    seconds : best wall time over the timed calls
+    peak_mb : peak memory traced during one extra call
+    """
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+        if best > SLOW_CASE_S:
+            break
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return best, peak / (1024 * 1024)
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, cases=None, repeats=3, gbr_max_rows=None,
+                   verbose=False):
+    """
+    Run the benchmark cases at every dataset size.
+
+    Parameters
+    sizes : sequence of int
+        Dataset sizes in rows.
+    cases : sequence of str or None
+        Names from CASES. All cases when None.
+    repeats : int
+        Timed calls per case and size, the best one is kept.
+    gbr_max_rows : int or None
+        Override the size limit of the train_gbr cases.
+    verbose : bool
+        Print every result as it is measured.
+
+    Returns
+    results : list of dictionaries with case, rows, seconds and peak_mb
+    """
+    names = list(CASES) if cases is None else list(cases)
+    unknown = [n for n in names if n not in CASES]
+    if unknown:
+        raise ValueError("Unknown benchmark case: " + ", ".join(unknown))
+
+    sizes = sorted(sizes)
+    results = []
+
+    # Warnings are only silenced while the cases run, not for the caller
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for n in sizes:
+            df = make_dataset(n)
+            with tempfile.TemporaryDirectory() as tmp:
+                for name in names:
+                    setup, max_rows, scaling = CASES[name]
+                    if name in ("train_gbr_grid", "train_gbr_halving") and gbr_max_rows is not None:
+                        max_rows = gbr_max_rows
+                    if (max_rows is not None and n > max_rows) or (not scaling and n != sizes[0]):
+                        continue
+
+                    seconds, peak_mb = measure(setup(df, tmp), repeats)
+                    results.append({"case": name, "rows": n, "seconds": seconds, "peak_mb": peak_mb})
+                    if verbose:
+                        print(f"{name:<30} {n:>10}  {seconds:>10.4f} s  {peak_mb:>9.1f} MB",
+                              flush=True)
+
+    return results
+
+
+def scaling_exponents(results):
+    """
+    Fit time ~ rows ** exponent for every case measured at two or more sizes.
+
+    Returns
+    exponents : dictionary mapping case name to the fitted exponent
+    """
+    exponents = {}
+    for name in dict.fromkeys(r["case"] for r in results):
+        points = [(r["rows"], r["seconds"]) for r in results if r["case"] == name]
+        if len(points) >= 2:
+            rows, seconds = np.log(np.array(points)).T
+            exponents[name] = float(np.polyfit(rows, seconds, 1)[0])
+    return exponents
+
+
+def save_results(results, path):
+    """
+    Save benchmark results with the machine description as a JSON baseline.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    payload = {
+        "created": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": results,
+        "scaling": scaling_exponents(results),
+    }
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+
+
+def load_results(path):
+    """
+    Load the results list of a baseline written by save_results.
+    """
+    with open(path) as f:
+        return json.load(f)["results"]
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compare results against a baseline.
+
+    A case at a given size is flagged when its time or peak memory grew by
+    more than threshold, relative, and by more than MIN_DIFF_S or MIN_DIFF_MB.
+
+    Returns
+    regressions : list of dictionaries with case, rows, metric, baseline,
+                  current and ratio
+    """
+    previous = {(r["case"], r["rows"]): r for r in baseline}
+    regressions = []
+    for r in results:
+        old = previous.get((r["case"], r["rows"]))
+        if old is None:
+            continue
+        for metric, min_diff in (("seconds", MIN_DIFF_S), ("peak_mb", MIN_DIFF_MB)):
+            before, now = old[metric], r[metric]
+            if now > before * (1 + threshold) and now - before > min_diff:
+                regressions.append({"case": r["case"], "rows": r["rows"], "metric": metric,
+                                    "baseline": before, "current": now,
+                                    "ratio": now / before if before > 0 else np.inf})
+    return regressions
+
+
+def plot_scaling(results, save_path):
+    """
+    Save a log log plot of time against rows for every case.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(9, 6))
+    for name in dict.fromkeys(r["case"] for r in results):
+        points = sorted((r["rows"], r["seconds"]) for r in results if r["case"] == name)
+        if len(points) >= 2:
+            rows, seconds = zip(*points)
+            plt.loglog(rows, seconds, marker="o", label=name)
+    plt.xlabel("Rows")
+    plt.ylabel("Seconds")
+    plt.title("Benchmark scaling")
+    plt.legend(fontsize=7, ncol=2)
+    plt.grid(True, which="both", alpha=0.3)
+    plt.tight_layout()
+    plt.savefig(save_path)
+    plt.close()
+
+
+def _worker_memory(X=None, y=None, train_idx=None):
+    # Touch every page of the inputs, then report the memory of this worker
+    if X is not None:
+        float(X.sum()) + float(y.sum())
+    return os.getpid(), pss_mb()
+
+
+def data_plane_memory(n_rows=1000000, workers=(2, 4, 8), cv=3, seed=0):
+    """
+    Measure the memory parallel CV workers use for the training arrays.
+
+    The folds are sent to the workers in three ways: pickled arrays,
+    joblib's automatic memory mapping of large arguments, and the shared
+    files of shared_data.shared_arrays used by train_gbr. Each worker
+    reports its proportional memory (PSS) while it holds the data, minus its
+    memory when idle. PSS splits shared pages between the processes that
+    map them, so the sum over workers is the physical memory of the data.
+    With one worker joblib runs in the main process, so workers start at two.
+
+    Returns
+    rows : list of dictionaries with mode, workers, data_mb and seconds.
+           data_mb is None where PSS is not available.
+    """
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import KFold
+
+    df = make_dataset(n_rows, seed)
+    X = df[["Re", "St"]].to_numpy()
+    y = df["Cd"].to_numpy()
+    folds = [train for train, _ in KFold(n_splits=cv).split(X)]
+
+    rows = []
+    for n_workers in workers:
+        tasks = [folds[i % cv] for i in range(max(cv, 2 * n_workers))]
+
+        for mode in ("pickle", "joblib_auto", "shared"):
+            max_nbytes = None if mode == "pickle" else "1M"
+            # The idle and the data calls share one set of worker processes
+            with Parallel(n_jobs=n_workers, max_nbytes=max_nbytes) as parallel:
+                idle = dict(parallel(delayed(_worker_memory)() for _ in range(4 * n_workers)))
+                start = time.perf_counter()
+                with shared_arrays(X, y, enabled=mode == "shared") as (X_in, y_in):
+                    reports = parallel(delayed(_worker_memory)(X_in, y_in, idx) for idx in tasks)
+                seconds = time.perf_counter() - start
+
+            peak = {}
+            for pid, pss in reports:
+                if pss is not None:
+                    peak[pid] = max(peak.get(pid, 0.0), pss)
+            data_mb = (sum(max(0.0, pss - (idle.get(pid) or pss)) for pid, pss in peak.items())
+                       if peak else None)
+            rows.append({"mode": mode, "workers": n_workers, "data_mb": data_mb,
+                         "seconds": seconds})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline hot paths")
+    parser.add_argument("--sizes", default=",".join(str(n) for n in DEFAULT_SIZES),
+                        help="Comma separated dataset sizes in rows")
+    parser.add_argument("--cases", default=None, help="Comma separated case names, default all")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--gbr-max-rows", type=int, default=None,
+                        help="Largest size for the train_gbr cases, default 10000")
+    parser.add_argument("--save", default=os.path.join(PROJECT, "results", "benchmarks", "latest.json"),
+                        help="Write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Baseline JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Relative slowdown flagged as a regression")
+    parser.add_argument("--plot", default=None, help="Save a scaling plot to this PNG file")
+    parser.add_argument("--list", action="store_true", help="Print the case names and exit")
+    parser.add_argument("--data-plane", type=int, default=None, metavar="ROWS",
+                        help="Measure the CV worker memory for the training arrays of ROWS rows and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(CASES))
+        return 0
+
+    if args.data_plane:
+        print(f"{'Mode':<12} {'Workers':>8} {'Data MB':>10} {'Seconds':>10}")
+        for r in data_plane_memory(args.data_plane):
+            data_mb = f"{r['data_mb']:.1f}" if r["data_mb"] is not None else "-"
+            print(f"{r['mode']:<12} {r['workers']:>8} {data_mb:>10} {r['seconds']:>10.3f}")
+        return 0
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    cases = args.cases.split(",") if args.cases else None
+    # Read the baseline first, --save may point to the same file
+    baseline = load_results(args.compare) if args.compare else None
+    results = run_benchmarks(sizes, cases, args.repeats, args.gbr_max_rows, verbose=True)
+
+    print("\nScaling exponent, time ~ rows ** k")
+    for name, k in scaling_exponents(results).items():
+        print(f"{name:<30} {k:>6.2f}")
+
+    save_results(results, args.save)
+    print("\nResults saved in:", args.save)
+    if args.plot:
+        plot_scaling(results, args.plot)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regressions above {args.threshold:.0%}")
+            for r in regressions:
+                print(f"{r['case']:<30} {r['rows']:>10}  {r['metric']:<8} "
+                      f"{r['baseline']:.4g} -> {r['current']:.4g}  x{r['ratio']:.2f}")
+            return 1
+        print("\nNo regressions against", args.compare)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,19 +9,171 @@ It performs the following steps:
 3. Verify that the required columns Re, St and Cd are present.
 4. Remove rows with missing values.
 5. Return a clean dataframe.
+
+The cleaned columns are also kept in a binary sidecar cache, one .npy file
+per column in a hidden folder next to the CSV. The cache is invalidated
+when the size, modification time or hash of the CSV changes, and it is
+opened through memory mapping so reloads and subsets such as head(50)
+only touch the pages they need.
+
+iter_data streams the same cleaned data in chunks, so files larger than
+memory can be processed with bounded peak memory.
+
+Both functions also accept a folder of .npy columns with a meta.json file,
+the binary format written by synthetic.py. Such a folder is opened with
+memory mapping without any parsing.
 """
 
-import pandas as pd
+import hashlib
+import json
 import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+
+# Columns every dataset must contain
+REQUIRED_COLS = ("Re", "St", "Cd")
+
+# Bump when the layout of the binary cache changes
+CACHE_FORMAT = 1
+
+# Timing of the last load_data call, see load_data
+LOAD_STATS = {}
 
 
-def load_data(path):
+def cache_dir_for(path):
+    """
+    Return the sidecar cache folder of a data file.
+    """
+    folder, name = os.path.split(os.path.abspath(path))
+    return os.path.join(folder, f".{name}.cache")
+
+
+def _file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _read_cache(path, cache_dir):
+    """
+    Open the cached columns with memory mapping.
+    Returns None when the cache is missing or stale.
+    """
+    meta_path = os.path.join(cache_dir, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("format") != CACHE_FORMAT:
+            return None
+
+        st = os.stat(path)
+        if st.st_size != meta["size"]:
+            return None
+
+        # A changed mtime alone triggers a hash check instead of a rebuild
+        if st.st_mtime_ns != meta["mtime_ns"]:
+            if _file_hash(path) != meta["sha256"]:
+                return None
+            meta["mtime_ns"] = st.st_mtime_ns
+            with open(meta_path, "w") as f:
+                json.dump(meta, f, indent=2)
+
+        # Copy on write mapping, edits to the dataframe never reach the files
+        columns = {
+            col: np.load(os.path.join(cache_dir, f"{i}.npy"), mmap_mode="c")
+            for i, col in enumerate(meta["columns"])
+        }
+        if any(len(v) != meta["rows"] for v in columns.values()):
+            return None
+
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return pd.DataFrame(columns, copy=False), meta
+
+
+def _write_cache(path, cache_dir, df, parse_s):
+    """
+    Write the cleaned columns and the metadata of the source file.
+    The files are written to a temporary folder that is renamed at the end.
+    """
+    if not all(np.issubdtype(dtype, np.number) for dtype in df.dtypes):
+        return
+
+    st = os.stat(path)
+    tmp_dir = cache_dir + ".tmp"
+    try:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        for i, col in enumerate(df.columns):
+            np.save(os.path.join(tmp_dir, f"{i}.npy"), df[col].to_numpy())
+
+        meta = {
+            "format": CACHE_FORMAT,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": _file_hash(path),
+            "columns": list(df.columns),
+            "rows": len(df),
+            "parse_s": parse_s,
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(tmp_dir, cache_dir)
+
+    except OSError:
+        # A read only data folder just means no cache
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_binary(folder):
+    """
+    Open a folder of .npy columns written by synthetic.write_dataset.
+
+    Raises
+    ValueError
+        When the folder is not a binary dataset or misses a required column.
+    """
+    meta_path = os.path.join(folder, "meta.json")
+    if not os.path.exists(meta_path):
+        raise ValueError(f"Not a binary dataset folder: {folder}")
+    with open(meta_path) as f:
+        meta = json.load(f)
+
+    if not set(REQUIRED_COLS).issubset(meta["columns"]):
+        raise ValueError(f"Dataset must contain columns: {set(REQUIRED_COLS)}")
+
+    columns = {
+        col: np.load(os.path.join(folder, f"{i}.npy"), mmap_mode="c")
+        for i, col in enumerate(meta["columns"])
+    }
+    return pd.DataFrame(columns, copy=False)
+
+
+def load_data(path, use_cache=True):
     """
     Load the dataset from the given file path.
 
     Parameters
     path : str
-        Path to the vortex data file.
+        Path to the vortex data file, or to a binary dataset folder.
+    use_cache : bool
+        If True, load from the binary sidecar cache when it is valid and
+        create it after parsing the CSV otherwise.
+
+    After each call LOAD_STATS holds the source used ("csv", "cache" or "binary"),
+    the time taken, the last measured CSV parse time and the number of rows.
 
     Returns
     df : pandas DataFrame
@@ -38,15 +190,115 @@ def load_data(path):
     if not os.path.exists(path):
         raise FileNotFoundError(f"Dataset not found at: {path}")
 
+    start = time.perf_counter()
+
+    # Binary dataset folder, nothing to parse or cache
+    if os.path.isdir(path):
+        df = load_binary(path)
+        LOAD_STATS.clear()
+        LOAD_STATS.update({
+            "source": "binary",
+            "load_s": time.perf_counter() - start,
+            "parse_s": 0.0,
+            "rows": len(df),
+        })
+        return df
+
+    cache_dir = cache_dir_for(path)
+
+    # Fast path, memory mapped binary cache
+    if use_cache:
+        cached = _read_cache(path, cache_dir)
+        if cached is not None:
+            df, meta = cached
+            LOAD_STATS.clear()
+            LOAD_STATS.update({
+                "source": "cache",
+                "load_s": time.perf_counter() - start,
+                "parse_s": meta["parse_s"],
+                "rows": len(df),
+            })
+            return df
+
     # Load CSV into dataframe
     df = pd.read_csv(path)
 
     # Ensure required columns exist
-    required_cols = {"Re", "St", "Cd"}
+    required_cols = set(REQUIRED_COLS)
     if not required_cols.issubset(df.columns):
         raise ValueError(f"Dataset must contain columns: {required_cols}")
 
     # Remove missing values and clean index
     df = df.dropna().reset_index(drop=True)
+    parse_s = time.perf_counter() - start
+
+    if use_cache:
+        _write_cache(path, cache_dir, df, parse_s)
+
+    LOAD_STATS.clear()
+    LOAD_STATS.update({
+        "source": "csv",
+        "load_s": time.perf_counter() - start,
+        "parse_s": parse_s,
+        "rows": len(df),
+    })
 
     return df
+
+
+def iter_data(path, chunksize=100000, dtype="float64", columns=REQUIRED_COLS):
+    """
+    Stream the dataset in cleaned chunks.
+
+    Only the requested columns are parsed. Rows with missing values are
+    dropped from each chunk. The index of every chunk keeps the row number
+    in the file, so results can be joined back by row id.
+
+    Parameters
+    path : str
+        Path to the vortex data file.
+    chunksize : int
+        Number of file rows read per chunk.
+    dtype : str
+        "float64" or "float32" for the parsed columns.
+    columns : sequence of str
+        Columns to read. All of them must exist in the file.
+
+    Yields
+    chunk : pandas DataFrame
+        Cleaned chunk with the requested columns.
+
+    Raises
+    FileNotFoundError
+        When the file path is not found.
+    ValueError
+        When required columns are missing or dtype is not supported.
+    """
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Dataset not found at: {path}")
+
+    if dtype not in ("float64", "float32"):
+        raise ValueError(f"Unsupported dtype: {dtype}")
+
+    if os.path.isdir(path):
+        df = load_binary(path)
+        if not set(columns).issubset(df.columns):
+            raise ValueError(f"Dataset must contain columns: {set(columns)}")
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize][list(columns)].astype(dtype).dropna()
+        return
+
+    # Check the header before parsing any data
+    header = pd.read_csv(path, nrows=0).columns
+    if not set(columns).issubset(header):
+        raise ValueError(f"Dataset must contain columns: {set(columns)}")
+
+    reader = pd.read_csv(
+        path,
+        usecols=list(columns),
+        dtype={c: dtype for c in columns},
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        yield chunk[list(columns)].dropna()
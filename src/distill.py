@@ -0,0 +1,225 @@
+"""
+distill.py
+
+This file compresses a trained GBR Re St model into a smaller predictor
+whose test RMSE stays within a set tolerance of the original model.
+
+It performs the following tasks.
+1. Score every prefix of the boosting stages on the test rows of the
+   train_gbr split with one staged_predict pass and keep the fewest trees
+   whose test RMSE is within the tolerance. The kept trees are compiled to
+   a FlatForest, whose cell table shrinks with the number of thresholds.
+2. Tabulate the model on uniform (log Re, St) grids of growing size and
+   keep the smallest CdLookupTable within the tolerance. A coarse grid
+   smooths the steps of the trees instead of following every threshold.
+3. Measure the file size, single row latency, batch throughput and test
+   metrics of the original model and every candidate, and compare them
+   with the metrics dictionary returned by train_gbr.
+4. Return the smallest candidate within the tolerance. Both kinds are npz
+   files that inference.py loads with NumPy only.
+
+Example
+python -m src.distill --tolerance 0.02 --out results/models/gbr_re_st_small.npz
+"""
+
+import copy
+import os
+import pickle
+import tempfile
+import time
+
+import numpy as np
+
+from src.metrics import regression_metrics
+from src.surrogate_table import CdLookupTable, RE_RANGE, ST_RANGE, _grid_values
+from src.tree_engine import compile_gbr
+
+
+# Lookup table grids tried from small to large, nodes in Re and St
+TABLE_GRIDS = ((16, 8), (32, 8), (32, 16), (64, 16), (64, 32), (128, 32), (256, 64))
+
+
+def truncate_gbr(model, n_trees):
+    """
+    Return a copy of a fitted GradientBoostingRegressor with only its first
+    n_trees boosting stages. The trees are shared with the original model.
+    """
+    small = copy.copy(model)
+    small.estimators_ = model.estimators_[:n_trees]
+    small.train_score_ = model.train_score_[:n_trees]
+    small.n_estimators = n_trees
+    if hasattr(model, "n_estimators_"):
+        small.n_estimators_ = n_trees
+    return small
+
+
+def uniform_table(model, n_re, n_st, re_range=RE_RANGE, st_range=ST_RANGE):
+    """
+    Tabulate a Re and St model on a uniform grid in (log Re, St).
+    """
+    re_nodes = np.geomspace(re_range[0], re_range[1], n_re)
+    st_nodes = np.linspace(st_range[0], st_range[1], n_st)
+    return CdLookupTable(np.log10(re_nodes), st_nodes, _grid_values(model, re_nodes, st_nodes))
+
+
+def file_bytes(model):
+    """
+    Return the size of a model file, npz for models with a save method and
+    pickle otherwise.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        if hasattr(model, "save"):
+            path = os.path.join(tmp, "model.npz")
+            model.save(path)
+        else:
+            path = os.path.join(tmp, "model.pkl")
+            with open(path, "wb") as f:
+                pickle.dump(model, f)
+        return os.path.getsize(path)
+
+
+def _best_time(func, X, repeats):
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(X)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _candidate(name, model, size, X_test, y_test, budget, repeats):
+    # 1. Accuracy on the test rows, 2. size, 3. latency of one row and of all rows
+    metrics = regression_metrics(y_test, model.predict(X_test))
+    batch_s = _best_time(model.predict, X_test, repeats)
+    return {
+        "model": name,
+        "size": size,
+        "kb": file_bytes(model) / 1024,
+        "row_us": _best_time(model.predict, X_test[:1], 20 * repeats) * 1e6,
+        "rows_per_s": len(X_test) / batch_s if batch_s > 0 else 0.0,
+        "test_rmse": metrics["rmse"],
+        "test_r2": metrics["r2"],
+        "within": metrics["rmse"] <= budget,
+        "predictor": model,
+    }
+
+
+def compress_gbr(model, df, metrics=None, tolerance=0.02, grids=TABLE_GRIDS, repeats=3):
+    """
+    Compress a GBR Re St model within a test RMSE tolerance.
+
+    Parameters
+    model : fitted GradientBoostingRegressor
+        Best model of train_gbr with use_st=True.
+    df : pandas DataFrame
+        Dataset the model was trained on. The test rows of the train_gbr
+        split are used to score the candidates.
+    metrics : dictionary or None
+        Metrics returned by train_gbr. The budget is
+        metrics["test_rmse"] * (1 + tolerance). None scores the model on
+        the test rows instead.
+    tolerance : float
+        Allowed relative increase of the test RMSE, 0.02 allows 2 percent.
+    grids : sequence of (int, int)
+        Lookup table grids tried, from small to large.
+    repeats : int
+        Timing repeats, the best time is kept.
+
+    Returns
+    best : FlatForest or CdLookupTable
+        Smallest candidate within the budget, the compiled full model when
+        no smaller one is.
+    report : list of dictionaries
+        One row per candidate with model, size, kb, row_us, rows_per_s,
+        test_rmse, test_r2, rmse_change against the original metrics and
+        within, in the order original, compiled, truncated, tables.
+
+    Raises
+    TypeError
+        When model is not a fitted GradientBoostingRegressor.
+    """
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.model_selection import train_test_split
+    from src.gbr_model import TEST_SIZE, RANDOM_STATE
+
+    if not isinstance(model, GradientBoostingRegressor):
+        raise TypeError(f"compress_gbr needs a fitted GradientBoostingRegressor, got {type(model).__name__}")
+
+    X = df[["Re", "St"]].values
+    _, X_test, _, y_test = train_test_split(X, df["Cd"].values, test_size=TEST_SIZE,
+                                            random_state=RANDOM_STATE)
+    if metrics is None:
+        metrics = {"test_rmse": regression_metrics(y_test, model.predict(X_test))["rmse"]}
+    budget = metrics["test_rmse"] * (1 + tolerance)
+    n_trees = len(model.estimators_)
+
+    # 1. Original model and its compiled arrays
+    candidates = [
+        _candidate("gbr", model, f"{n_trees} trees", X_test, y_test, budget, repeats),
+        _candidate("flat_forest", compile_gbr(model), f"{n_trees} trees",
+                   X_test, y_test, budget, repeats),
+    ]
+
+    # 2. Fewest leading trees within the budget, from one staged pass
+    rmse = np.array([np.sqrt(np.mean((y_test - pred) ** 2))
+                     for pred in model.staged_predict(X_test)])
+    keep = int(np.argmax(rmse <= budget)) + 1 if (rmse <= budget).any() else n_trees
+    if keep < n_trees:
+        candidates.append(_candidate("truncated", compile_gbr(truncate_gbr(model, keep)),
+                                     f"{keep} trees", X_test, y_test, budget, repeats))
+
+    # 3. Smallest uniform lookup table within the budget
+    for n_re, n_st in grids:
+        table = uniform_table(model, n_re, n_st)
+        row = _candidate("lookup_table", table, f"{n_re}x{n_st} nodes",
+                         X_test, y_test, budget, repeats)
+        candidates.append(row)
+        if row["within"]:
+            break
+
+    for row in candidates:
+        row["rmse_change"] = row["test_rmse"] / metrics["test_rmse"] - 1
+
+    # 4. Smallest file among the NumPy only candidates within the budget
+    fits = [row for row in candidates[1:] if row["within"]] or [candidates[1]]
+    best = min(fits, key=lambda row: row["kb"])["predictor"]
+    report = [{k: v for k, v in row.items() if k != "predictor"} for row in candidates]
+    return best, report
+
+
+def main():
+    import argparse
+    from src.data_loader import load_data
+    from src.predict_server import load_model
+
+    parser = argparse.ArgumentParser(description="Compress the GBR Re St model within a test RMSE tolerance")
+    parser.add_argument("--model", default="results/models/gbr_re_st.pkl")
+    parser.add_argument("--data", default="data/vortex_data.csv")
+    parser.add_argument("--tolerance", type=float, default=0.02,
+                        help="Allowed relative increase of the test RMSE")
+    parser.add_argument("--out", default="results/models/gbr_re_st_small.npz")
+    args = parser.parse_args()
+
+    df = load_data(args.data)
+    model = load_model(args.model)
+    best, report = compress_gbr(model, df, tolerance=args.tolerance)
+    best.save(args.out)
+    print_report(report)
+    print("Compressed model saved in:", args.out)
+
+
+def print_report(report):
+    """
+    Print the size, latency and accuracy of every candidate.
+    """
+    headers = ["Model", "Size", "KB", "Row us", "Rows/s", "Test RMSE", "Change %", "Within"]
+    print("\n" + "  ".join(f"{h:>14}" for h in headers))
+    for r in report:
+        print("  ".join(f"{v:>14}" for v in [
+            r["model"], r["size"], f"{r['kb']:.1f}", f"{r['row_us']:.1f}",
+            f"{r['rows_per_s']:.3g}", f"{r['test_rmse']:.5f}",
+            f"{100 * r['rmse_change']:+.2f}", "yes" if r["within"] else "no"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -8,15 +8,194 @@ It creates four types of outputs.
 2. Histograms for Re, St and Cd.
 3. Pairplot for the three variables.
 4. Correlation heatmap.
+
+The figures are independent, so they can be rendered in parallel worker
+processes through render.py.
+
+For large datasets a scalable mode is used. Histograms and KDE curves are
+computed from binned counts with an FFT convolution, the pairplot is drawn
+from a stratified sample, and the summary statistics and correlations come
+from one vectorized pass. Only small binned arrays reach the plotting code,
+so EDA time grows very slowly with the number of rows.
 """
 
 import os
+import numpy as np
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 
+from src.render import plot_job, render_figures
+
+
+# Number of rows above which mode="auto" uses the scalable EDA mode
+LARGE_THRESHOLD = 200000
+
+COLUMNS = ["Re", "St", "Cd"]
+
+
+def summary_stats(df):
+    """
+    Compute the describe() table and the correlation matrix in one pass.
+
+    Returns
+    stats : pandas DataFrame laid out like df.describe()
+    corr : pandas DataFrame of Pearson correlations
+    """
+    X = df[COLUMNS].to_numpy(dtype=np.float64)
+    n = len(X)
+
+    mean = X.mean(axis=0)
+    centered = X - mean
+    cov = centered.T @ centered / (n - 1)
+    std = np.sqrt(np.diag(cov))
+    q = np.percentile(X, [0, 25, 50, 75, 100], axis=0)
+
+    stats = pd.DataFrame(
+        np.vstack([np.full(len(COLUMNS), n), mean, std, q]),
+        index=["count", "mean", "std", "min", "25%", "50%", "75%", "max"],
+        columns=COLUMNS,
+    )
+    corr = pd.DataFrame(cov / np.outer(std, std), index=COLUMNS, columns=COLUMNS)
+    return stats, corr
+
+
+def binned_kde(values, bins=40, oversample=32, bandwidth=None):
+    """
+    Histogram and Gaussian KDE of one column from binned counts.
+
+    The values are counted once on a fine grid of bins * oversample cells.
+    The histogram sums groups of fine cells and the KDE convolves the fine
+    counts with a sampled Gaussian kernel using the FFT.
+
+    Parameters
+    values : array like
+        Column values.
+    bins : int
+        Number of histogram bins.
+    oversample : int
+        Fine grid cells per histogram bin.
+    bandwidth : float or None
+        Kernel standard deviation. Scott's rule when None, as in seaborn.
+
+    Returns
+    edges : histogram bin edges
+    counts : histogram counts
+    grid : KDE evaluation points
+    density : KDE values at grid
+    """
+    x = np.asarray(values, dtype=np.float64)
+    n = len(x)
+    lo, hi = float(x.min()), float(x.max())
+    if hi == lo:
+        hi = lo + 1.0
+
+    n_fine = bins * oversample
+    step = (hi - lo) / n_fine
+    idx = np.minimum(((x - lo) / step).astype(np.intp), n_fine - 1)
+    fine = np.bincount(idx, minlength=n_fine).astype(np.float64)
+
+    edges = np.linspace(lo, hi, bins + 1)
+    counts = fine.reshape(bins, oversample).sum(axis=1)
+
+    if bandwidth is None:
+        bandwidth = x.std(ddof=1) * n ** (-1.0 / 5.0) if n > 1 else step
+
+    # Gaussian kernel sampled on the fine grid, truncated at 4 bandwidths
+    half = int(np.ceil(4 * bandwidth / step))
+    offsets = np.arange(-half, half + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    kernel /= kernel.sum()
+
+    # Linear convolution through the FFT with zero padding
+    size = n_fine + len(kernel) - 1
+    conv = np.fft.irfft(np.fft.rfft(fine, size) * np.fft.rfft(kernel, size), size)
+    density = np.clip(conv, 0, None) / (n * step)
+
+    grid = lo + (np.arange(size) - half + 0.5) * step
+    return edges, counts, grid, density
+
+
+def stratified_sample(df, cap=5000, by="Re", n_strata=20, seed=42):
+    """
+    Draw at most cap rows, keeping the share of every quantile stratum of by.
+    """
+    if len(df) <= cap:
+        return df
+
+    rng = np.random.default_rng(seed)
+    edges = np.quantile(df[by].to_numpy(), np.linspace(0, 1, n_strata + 1))
+    strata = np.clip(np.searchsorted(edges, df[by].to_numpy(), side="right") - 1, 0, n_strata - 1)
+
+    order = np.argsort(strata, kind="stable")
+    bounds = np.searchsorted(strata[order], np.arange(n_strata + 1))
+
+    picks = []
+    for s in range(n_strata):
+        members = order[bounds[s]:bounds[s + 1]]
+        k = int(round(cap * len(members) / len(df)))
+        if k > 0:
+            picks.append(rng.choice(members, size=min(k, len(members)), replace=False))
+
+    return df.iloc[np.sort(np.concatenate(picks))]
+
+
+def plot_binned_histogram(edges, counts, grid, density, col, save_path):
+    """
+    Save a histogram with KDE drawn from precomputed binned arrays.
+    """
+    width = edges[1] - edges[0]
+    plt.figure(figsize=(6, 4))
+    plt.bar(edges[:-1], counts, width=width, align="edge", alpha=0.6,
+            edgecolor="white", linewidth=0.5)
+    plt.plot(grid, density * counts.sum() * width, linewidth=1.5)
+    plt.xlim(edges[0], edges[-1])
+    plt.xlabel(col)
+    plt.ylabel("Count")
+    plt.title(f"Histogram of {col}")
+    plt.tight_layout()
+    plt.savefig(save_path)
+    plt.close()
+
 
-def run_eda(df, save_dir):
+def plot_histogram(values, col, save_path):
+    """
+    Save a histogram with KDE of one column.
+    """
+    plt.figure(figsize=(6, 4))
+    sns.histplot(values, kde=True, bins=40)
+    plt.title(f"Histogram of {col}")
+    plt.tight_layout()
+    plt.savefig(save_path)
+    plt.close()
+
+
+def plot_pairplot(df, save_path):
+    """
+    Save a pairplot of Re, St and Cd.
+    """
+    sns.pairplot(df[["Re", "St", "Cd"]], diag_kind="kde", plot_kws={"rasterized": True})
+    plt.savefig(save_path)
+    plt.close()
+    # This code snippet is generated by OPEN AI chatgpt version 5.1
+
+
+def plot_corr_heatmap(df, save_path, corr=None):
+    """
+    Save the correlation heatmap of Re, St and Cd.
+    A precomputed correlation matrix can be passed as corr.
+    """
+    if corr is None:
+        corr = df[["Re", "St", "Cd"]].corr()
+    plt.figure(figsize=(6, 4))
+    sns.heatmap(corr, annot=True, cmap="coolwarm")
+    plt.title("Correlation Heatmap")
+    plt.tight_layout()
+    plt.savefig(save_path)
+    plt.close()
+
+
+def run_eda(df, save_dir, n_workers=1, mode="auto", sample_cap=5000):
     """
     Generate exploratory data analysis plots and summary statistics.
 
@@ -25,34 +204,78 @@ def run_eda(df, save_dir):
         Dataset containing Re, St and Cd.
     save_dir : str
         Directory where all analysis results will be saved.
+    n_workers : int or None
+        Worker processes used to render the figures. None uses one per CPU.
+    mode : str
+        "exact" uses seaborn on every row, "large" uses binned histograms,
+        FFT KDEs and a sampled pairplot, "auto" picks "large" above
+        LARGE_THRESHOLD rows.
+    sample_cap : int
+        Largest number of rows drawn in the pairplot in "large" mode.
+
+    Returns
+    report : list of dictionaries with the render time and size of each figure
     """
 
+    if mode not in ("auto", "exact", "large"):
+        raise ValueError(f"Unknown EDA mode: {mode}")
+    if mode == "auto":
+        mode = "large" if len(df) > LARGE_THRESHOLD else "exact"
+
     # Create folder if needed
     if not os.path.exists(save_dir):
         os.makedirs(save_dir)
 
+    if mode == "large":
+        return _run_large_eda(df, save_dir, n_workers, sample_cap)
+
     # 1. Save summary statistics
     df.describe().to_csv(os.path.join(save_dir, "summary_stats.csv"))
 
+    data = df[["Re", "St", "Cd"]]
+    jobs = []
+
     # 2. Histograms for Re, St, Cd
     for col in ["Re", "St", "Cd"]:
-        plt.figure(figsize=(6, 4))
-        sns.histplot(df[col], kde=True, bins=40)
-        plt.title(f"Histogram of {col}")
-        plt.tight_layout()
-        plt.savefig(os.path.join(save_dir, f"hist_{col}.png"))
-        plt.close()
+        jobs.append(plot_job(f"hist_{col}", plot_histogram, data[col], col,
+                             save_path=os.path.join(save_dir, f"hist_{col}.png")))
 
     # 3. Pairplot of variables
-    sns.pairplot(df[["Re", "St", "Cd"]], diag_kind="kde")
-    plt.savefig(os.path.join(save_dir, "pairplot.png"))
-    plt.close()
-    # This code snippet is generated by OPEN AI chatgpt version 5.1
+    jobs.append(plot_job("pairplot", plot_pairplot, data,
+                         save_path=os.path.join(save_dir, "pairplot.png")))
 
     # 4. Correlation heatmap
-    plt.figure(figsize=(6, 4))
-    sns.heatmap(df[["Re", "St", "Cd"]].corr(), annot=True, cmap="coolwarm")
-    plt.title("Correlation Heatmap")
-    plt.tight_layout()
-    plt.savefig(os.path.join(save_dir, "corr_heatmap.png"))
-    plt.close()
+    jobs.append(plot_job("corr_heatmap", plot_corr_heatmap, data,
+                         save_path=os.path.join(save_dir, "corr_heatmap.png")))
+
+    return render_figures(jobs, n_workers)
+
+
+def _run_large_eda(df, save_dir, n_workers, sample_cap):
+    """
+    Scalable EDA, the same outputs as run_eda built from binned data.
+    """
+
+    # 1. Summary statistics and correlations in one pass
+    stats, corr = summary_stats(df)
+    stats.to_csv(os.path.join(save_dir, "summary_stats.csv"))
+
+    jobs = []
+
+    # 2. Histograms and KDEs from binned counts
+    for col in COLUMNS:
+        edges, counts, grid, density = binned_kde(df[col].to_numpy())
+        jobs.append(plot_job(f"hist_{col}", plot_binned_histogram,
+                             edges, counts, grid, density, col,
+                             save_path=os.path.join(save_dir, f"hist_{col}.png")))
+
+    # 3. Pairplot from a stratified sample
+    sample = stratified_sample(df[COLUMNS], cap=sample_cap)
+    jobs.append(plot_job("pairplot", plot_pairplot, sample,
+                         save_path=os.path.join(save_dir, "pairplot.png")))
+
+    # 4. Correlation heatmap from the precomputed matrix
+    jobs.append(plot_job("corr_heatmap", plot_corr_heatmap, None,
+                         save_path=os.path.join(save_dir, "corr_heatmap.png"), corr=corr))
+
+    return render_figures(jobs, n_workers)
@@ -9,21 +9,266 @@ It supports two modes.
 It performs the following actions.
 1. Select input features.
 2. Split data into train and test.
-3. Perform grid search to find best hyperparameters.
+3. Search for the best hyperparameters, either with an exhaustive grid
+   search or with a staged successive halving search. With a score memo
+   only candidates without stored cross validation scores are fitted.
 4. Train the best model.
 5. Evaluate model on train and test sets.
 6. Return model, metrics and best parameters.
+
+The staged successive halving search shares work between candidates.
+Each (learning_rate, max_depth, subsample) combination is fitted once with
+the largest n_estimators and the smaller counts are scored from staged
+predictions. Weak combinations are dropped early while they are still
+trained on a small part of each training fold.
+
+Two boosting engines are available. "exact" is GradientBoostingRegressor,
+which sorts the feature values at every split. "hist" is
+HistGradientBoostingRegressor, which bins every feature into at most 255
+quantile bins once per fit, searches splits over bin histograms and stops
+adding trees when the validation loss stops improving. Its cost grows
+linearly with the number of rows, so it is the engine for large datasets.
 """
 
+import argparse
+import itertools
+import math
+import time
+
 import numpy as np
-from sklearn.ensemble import GradientBoostingRegressor
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error
+from joblib import Parallel, delayed
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.model_selection import train_test_split, GridSearchCV, HalvingGridSearchCV, KFold
+
+from src.metrics import train_test_metrics, MetricAccumulator
+from src.profiling import span, PROFILER
+from src.shared_data import shared_arrays
+from src.score_memo import ScoreMemo, arrays_fingerprint, full_params, memo_grid_search
+
+
+# Train test split settings
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
+# Hyperparameter grid shared by both search modes
+PARAM_GRID = {
+    "n_estimators": [100, 200, 300],
+    "learning_rate": [0.05, 0.1, 0.2],
+    "max_depth": [2, 3, 4],
+    "subsample": [0.7, 0.9, 1.0],
+}
+
+# Grid of the hist engine. The number of trees is set by early stopping
+HIST_PARAM_GRID = {
+    "learning_rate": [0.05, 0.1, 0.2],
+    "max_leaf_nodes": [7, 15, 31],
+    "min_samples_leaf": [20, 100],
+}
+
+# Settings of the hist engine that are not searched
+HIST_SETTINGS = {
+    "max_iter": 1000,
+    "max_bins": 255,
+    "early_stopping": True,
+    "validation_fraction": 0.1,
+    "n_iter_no_change": 20,
+}
+
+
+def _fit_staged(X, y, train_idx, val_idx, params, n_list, random_state):
+    """
+    Fit one booster with the largest n_estimators and return the validation
+    MSE after each stage count listed in n_list.
+    """
+    model = GradientBoostingRegressor(
+        n_estimators=max(n_list), random_state=random_state, **params
+    )
+    model.fit(X[train_idx], y[train_idx])
+
+    wanted = set(n_list)
+    scores = {}
+    for n, y_pred in enumerate(model.staged_predict(X[val_idx]), start=1):
+        if n in wanted:
+            scores[n] = np.mean((y[val_idx] - y_pred) ** 2)
+
+    return [scores[n] for n in n_list]
+
+
+def _staged_key(params, n, random_state):
+    # Memo key of the booster with n trees fitted by _fit_staged
+    return full_params(GradientBoostingRegressor(random_state=random_state),
+                       {**params, "n_estimators": n})
+
+
+def _memo_scores(memo, params, n_list, fold, rows, random_state):
+    """
+    Return the validation MSE of params for every count in n_list from the
+    memo, or None when any of them is missing.
+    """
+    if memo is None:
+        return None
+    entries = [memo.get(_staged_key(params, n, random_state), fold, rows) for n in n_list]
+    if any(e is None for e in entries):
+        return None
+    return [-e["test_score"] for e in entries]
 
 
-def train_gbr(df, use_st=False):
+def staged_halving_search(X, y, param_grid=None, cv=3, factor=3,
+                          min_samples=20, random_state=42, n_jobs=-1, memo=None):
     """
-    Train a Gradient Boosting Regressor using grid search.
+    Search hyperparameters with staged predictions and successive halving.
+
+    Parameters
+    X : numpy array
+        Training inputs.
+    y : numpy array
+        Training targets.
+    param_grid : dict
+        Grid in the same format as PARAM_GRID. Defaults to PARAM_GRID.
+    cv : int
+        Number of cross validation folds.
+    factor : int
+        Only the best 1 / factor of the candidates survive each round and
+        the training budget grows by the same factor.
+    min_samples : int
+        Smallest number of training rows used in a fold.
+    random_state : int
+        Seed for the boosters and for the row budgets.
+    n_jobs : int
+        Number of parallel jobs used for the fits.
+    memo : ScoreMemo or None
+        Stored validation scores. Fits whose scores are all in the memo are
+        skipped and every fresh fit is added as soon as it is done.
+
+    Returns
+    best_params : dictionary of best hyperparameters
+    report : dictionary describing the work done compared to a full grid search
+    """
+
+    if param_grid is None:
+        param_grid = PARAM_GRID
+
+    # 1. Build the base candidates, everything except n_estimators
+    n_list = sorted(param_grid["n_estimators"])
+    base_keys = [k for k in param_grid if k != "n_estimators"]
+    candidates = [
+        dict(zip(base_keys, values))
+        for values in itertools.product(*(param_grid[k] for k in base_keys))
+    ]
+
+    # 2. Fixed folds and a fixed row order inside every training fold,
+    #    so each round trains on a superset of the rows of the round before
+    rng = np.random.RandomState(random_state)
+    folds = []
+    for train_idx, val_idx in KFold(n_splits=cv).split(X):
+        folds.append((rng.permutation(train_idx), val_idx))
+
+    n_rounds = max(1, math.ceil(math.log(len(candidates), factor)))
+    alive = list(range(len(candidates)))
+    rounds = []
+    fits = 0
+    cached_fits = 0
+    row_trees = 0.0
+    best = None
+
+    # 3. Successive halving rounds
+    for r in range(n_rounds):
+        jobs = []
+        for c in alive:
+            for i, (train_idx, val_idx) in enumerate(folds):
+                full = len(train_idx)
+                budget = min(full, max(min_samples, full // factor ** (n_rounds - 1 - r)))
+                jobs.append((c, i, train_idx[:budget], val_idx, full))
+
+        # Scores of every stage count from the memo, None when a fit is needed
+        fold_scores = [_memo_scores(memo, candidates[c], n_list, i, len(tr), random_state)
+                       for c, i, tr, _, _ in jobs]
+        todo = [k for k, scores in enumerate(fold_scores) if scores is None]
+        fresh = Parallel(n_jobs=n_jobs, return_as="generator")(
+            delayed(_fit_staged)(X, y, jobs[k][2], jobs[k][3], candidates[jobs[k][0]],
+                                 n_list, random_state)
+            for k in todo
+        )
+        for k, scores in zip(todo, fresh):
+            fold_scores[k] = scores
+            if memo is not None:
+                c, i, tr = jobs[k][:3]
+                for n, mse in zip(n_list, scores):
+                    memo.put(_staged_key(candidates[c], n, random_state), i, len(tr),
+                             test_score=-mse)
+
+        fits += len(todo)
+        cached_fits += len(jobs) - len(todo)
+        row_trees += sum(len(jobs[k][2]) / jobs[k][4] * n_list[-1] for k in todo)
+
+        # Mean validation MSE per candidate and per n_estimators value
+        mean_scores = {}
+        for (c, _, _, _, _), s in zip(jobs, fold_scores):
+            mean_scores.setdefault(c, []).append(s)
+        mean_scores = {c: np.mean(s, axis=0) for c, s in mean_scores.items()}
+
+        ranked = sorted(alive, key=lambda c: mean_scores[c].min())
+        best_c = ranked[0]
+        best = (best_c, n_list[int(np.argmin(mean_scores[best_c]))])
+
+        rounds.append({
+            "candidates": len(alive),
+            "train_rows": len(jobs[0][2]),
+            "best_mse": float(mean_scores[best_c].min()),
+        })
+
+        alive = ranked[:max(1, math.ceil(len(alive) / factor))]
+
+    best_c, best_n = best
+    best_params = {"n_estimators": best_n, **candidates[best_c]}
+
+    # 4. Compare with the work an exhaustive grid search would do
+    grid_fits = len(candidates) * len(n_list) * cv
+    grid_trees = len(candidates) * sum(n_list) * cv
+    report = {
+        "grid_fits": grid_fits,
+        "fits": fits,
+        "fits_saved": grid_fits - fits,
+        "cached_fits": cached_fits,
+        "grid_trees": grid_trees,
+        "row_weighted_trees": int(round(row_trees)),
+        "tree_work_ratio": round(grid_trees / row_trees, 2) if row_trees > 0 else None,
+        "rounds": rounds,
+    }
+
+    return best_params, report
+
+
+def _hist_halving_report(search, cv):
+    """
+    Describe a HalvingGridSearchCV run with the keys of the staged halving report.
+    """
+    results = search.cv_results_
+    grid_fits = search.n_candidates_[0] * cv
+    fits = len(results["params"]) * cv
+
+    rounds = []
+    for r, (n_candidates, n_rows) in enumerate(zip(search.n_candidates_, search.n_resources_)):
+        scores = results["mean_test_score"][results["iter"] == r]
+        rounds.append({
+            "candidates": int(n_candidates),
+            "train_rows": int(n_rows),
+            "best_mse": float(-np.nanmax(scores)),
+        })
+
+    return {
+        "grid_fits": grid_fits,
+        "fits": fits,
+        "fits_saved": grid_fits - fits,
+        "rounds": rounds,
+    }
+
+
+def train_gbr(df, use_st=False, search="grid", engine="exact", n_jobs=-1,
+              param_grid=None, memo_dir=None):
+    """
+    Train a Gradient Boosting Regressor using a hyperparameter search.
 
     Parameters
     df : pandas DataFrame
@@ -31,13 +276,36 @@ def train_gbr(df, use_st=False):
     use_st : bool
         If True, the model uses Re and St.
         If False, the model uses only Re.
+    search : str
+        "grid" runs the exhaustive GridSearchCV.
+        "halving" runs staged_halving_search for the exact engine and
+        HalvingGridSearchCV for the hist engine. The search report is
+        stored on the returned model as search_report_.
+    engine : str
+        "exact" trains GradientBoostingRegressor over PARAM_GRID.
+        "hist" trains HistGradientBoostingRegressor with early stopping
+        over HIST_PARAM_GRID.
+    n_jobs : int
+        Number of parallel jobs used by the search. -1 uses all cores.
+    param_grid : dict or None
+        Grid of the exact engine. Defaults to PARAM_GRID.
+    memo_dir : str or None
+        Folder of the cross validation score memo of the exact engine.
+        When given, only candidates without stored scores are fitted, an
+        interrupted search resumes from its finished fits, and the grid
+        search stores its merged cv_results on the model as cv_results_.
 
     Returns
-    best_model : trained GradientBoostingRegressor
+    best_model : trained GradientBoostingRegressor or HistGradientBoostingRegressor
     metrics : dictionary containing train and test metrics
     best_params : dictionary of best hyperparameters
     """
 
+    if search not in ("grid", "halving"):
+        raise ValueError(f"Unknown search mode: {search}")
+    if engine not in ("exact", "hist"):
+        raise ValueError(f"Unknown engine: {engine}")
+
     # 1. Select input columns
     if use_st:
         X = df[["Re", "St"]].values
@@ -48,46 +316,165 @@ def train_gbr(df, use_st=False):
 
     # 2. Train test split
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
+        X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE
     )
 
-    # 3. Grid search for hyperparameters
-    param_grid = {
-        "n_estimators": [100, 200, 300],
-        "learning_rate": [0.05, 0.1, 0.2],
-        "max_depth": [2, 3, 4],
-        "subsample": [0.7, 0.9, 1.0],
-    }
+    if param_grid is None:
+        param_grid = PARAM_GRID
 
-    grid = GridSearchCV(
-        GradientBoostingRegressor(random_state=42),
-        param_grid,
-        cv=3,
-        scoring="neg_mean_squared_error",
-        n_jobs=-1,
-        verbose=0,
-        return_train_score=True
-    )
+    # Scores depend on the training rows, the features, the folds and the estimator
+    memo = None
+    if memo_dir is not None and engine == "exact":
+        memo = ScoreMemo(memo_dir, data=arrays_fingerprint(X_train, y_train),
+                         features=["Re", "St"] if use_st else ["Re"],
+                         split={"test_size": TEST_SIZE, "random_state": RANDOM_STATE},
+                         cv={"kind": "KFold", "n_splits": 3, "search": search,
+                             "random_state": RANDOM_STATE},
+                         estimator="GradientBoostingRegressor(random_state=42)")
 
-    # 4. Fit grid search and get best model
-    grid.fit(X_train, y_train)
-    best_model = grid.best_estimator_
-    best_params = grid.best_params_
+    # 3. Hyperparameter search and 4. best model
+    # Parallel workers map the training arrays from shared memory and only
+    # receive the row indices of their folds
+    with shared_arrays(X_train, y_train, enabled=n_jobs != 1) as (X_fit, y_fit):
+        if engine == "hist":
+            estimator = HistGradientBoostingRegressor(random_state=42, **HIST_SETTINGS)
+            if search == "halving":
+                grid = HalvingGridSearchCV(estimator, HIST_PARAM_GRID, factor=3, cv=3,
+                                           scoring="neg_mean_squared_error", n_jobs=n_jobs,
+                                           random_state=RANDOM_STATE)
+            else:
+                grid = GridSearchCV(estimator, HIST_PARAM_GRID, cv=3,
+                                    scoring="neg_mean_squared_error", n_jobs=n_jobs)
+            with span("search", rows=len(X_fit)):
+                grid.fit(X_fit, y_fit)
+            PROFILER.add("refit", grid.refit_time_, rows=len(X_fit))
+            best_model = grid.best_estimator_
+            best_params = grid.best_params_
+            if search == "halving":
+                best_model.search_report_ = _hist_halving_report(grid, cv=3)
+        elif search == "halving":
+            with span("search", rows=len(X_fit)):
+                best_params, report = staged_halving_search(X_fit, y_fit, param_grid, n_jobs=n_jobs,
+                                                            memo=memo)
+            with span("refit", rows=len(X_fit)):
+                best_model = GradientBoostingRegressor(random_state=42, **best_params)
+                best_model.fit(X_fit, y_fit)
+            best_model.search_report_ = report
+        elif memo is not None:
+            with span("search", rows=len(X_fit)):
+                best_params, cv_results, report = memo_grid_search(
+                    GradientBoostingRegressor(random_state=42), param_grid, X_fit, y_fit,
+                    memo, cv=3, n_jobs=n_jobs)
+            with span("refit", rows=len(X_fit)):
+                best_model = GradientBoostingRegressor(random_state=42, **best_params)
+                best_model.fit(X_fit, y_fit)
+            best_model.cv_results_ = cv_results
+            best_model.memo_report_ = report
+        else:
+            grid = GridSearchCV(
+                GradientBoostingRegressor(random_state=42),
+                param_grid,
+                cv=3,
+                scoring="neg_mean_squared_error",
+                n_jobs=n_jobs,
+                verbose=0,
+                return_train_score=True
+            )
+            # GridSearchCV refits the best model inside fit and times it separately
+            with span("search", rows=len(X_fit)):
+                grid.fit(X_fit, y_fit)
+            PROFILER.add("refit", grid.refit_time_, rows=len(X_fit))
+            best_model = grid.best_estimator_
+            best_params = grid.best_params_
 
     # 5. Predictions
-    y_train_pred = best_model.predict(X_train)
-    y_test_pred = best_model.predict(X_test)
+    with span("predict", rows=len(X_train) + len(X_test)):
+        y_train_pred = best_model.predict(X_train)
+        y_test_pred = best_model.predict(X_test)
 
     # 6. Compute performance metrics
-    metrics = {
-        "train_r2": r2_score(y_train, y_train_pred),
-        "test_r2": r2_score(y_test, y_test_pred),
-        "train_rmse": np.sqrt(mean_squared_error(y_train, y_train_pred)),
-        "test_rmse": np.sqrt(mean_squared_error(y_test, y_test_pred)),
-        "train_mae": mean_absolute_error(y_train, y_train_pred),
-        "test_mae": mean_absolute_error(y_test, y_test_pred),
-    }
+    metrics = train_test_metrics(y_train, y_train_pred, y_test, y_test_pred)
 
     return best_model, metrics, best_params
 
+
+def predict_stream(model, chunks, use_st=False):
+    """
+    Predict Cd chunk by chunk.
+
+    Parameters
+    model : trained model with a predict method
+    chunks : iterable of pandas DataFrame
+        For example the chunks from data_loader.iter_data.
+    use_st : bool
+        If True, the model uses Re and St.
+
+    Yields
+    chunk : pandas DataFrame
+        The input chunk with the prediction added as column Cd_pred.
+    """
+    cols = ["Re", "St"] if use_st else ["Re"]
+    for chunk in chunks:
+        chunk = chunk.copy()
+        chunk["Cd_pred"] = model.predict(chunk[cols].to_numpy())
+        yield chunk
+
+
+def evaluate_stream(model, chunks, use_st=False):
+    """
+    Compute R2, RMSE, MAE and maximum error of a model over chunked data.
+
+    Only running sums are kept, so the full dataset is never in memory.
+    The total sum of squares is merged chunk by chunk from per chunk means.
+
+    Returns
+    metrics : dictionary with n, r2, rmse, mae and max_error
+    """
+    acc = MetricAccumulator()
+    for chunk in predict_stream(model, chunks, use_st):
+        acc.update(chunk["Cd"].to_numpy(dtype=np.float64),
+                   chunk["Cd_pred"].to_numpy(dtype=np.float64))
+    return acc.result()
+
+
+def compare_engines(df, search="halving"):
+    """
+    Train both engines in both input modes and compare accuracy and time.
+
+    Returns
+    rows : list of dictionaries with engine, inputs, fit seconds, number of
+           trees and the test R2, RMSE and MAE
+    """
+    rows = []
+    for use_st in (False, True):
+        for engine in ("exact", "hist"):
+            start = time.perf_counter()
+            model, metrics, _ = train_gbr(df, use_st=use_st, search=search, engine=engine)
+            rows.append({
+                "engine": engine,
+                "inputs": "Re St" if use_st else "Re",
+                "fit_s": time.perf_counter() - start,
+                "trees": getattr(model, "n_iter_", getattr(model, "n_estimators_", None)),
+                "test_r2": metrics["test_r2"],
+                "test_rmse": metrics["test_rmse"],
+                "test_mae": metrics["test_mae"],
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    from src.data_loader import load_data
+
+    parser = argparse.ArgumentParser(description="Compare the exact and hist boosting engines")
+    parser.add_argument("--data", default="data/vortex_data.csv")
+    parser.add_argument("--search", default="halving", choices=["grid", "halving"])
+    args = parser.parse_args()
+
+    results = compare_engines(load_data(args.data), args.search)
+    headers = list(results[0].keys())
+    print("  ".join(f"{h:>10}" for h in headers))
+    for r in results:
+        print("  ".join(f"{r[h]:>10.4g}" if isinstance(r[h], float) else f"{str(r[h]):>10}"
+                        for h in headers))
+
 # Portions of this code, including debugging assistance were developed with help from OpenAI ChatGPT 5.1.
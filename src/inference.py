@@ -0,0 +1,211 @@
+"""
+inference.py
+
+This file predicts Cd from saved model arrays with a fast cold start.
+
+It performs the following tasks.
+1. Import nothing but NumPy and the NumPy only model classes, so a process
+   that scores a few rows does not load pandas, sklearn or matplotlib.
+2. Load the compiled GBR Re St model, gbr_re_st.npz, or the Cd lookup
+   table, cd_table.npz, written by the export stage of main.py. Both are
+   plain npz arrays, so they load without pickle and across library versions.
+3. Fill a missing St with the median St at the given Re from st_curve.npz.
+4. Measure the import time of this module against IMPORT_BUDGET_S.
+
+Example
+python -m src.inference 2000 0.3
+python -m src.inference 2000
+printf "2000,0.3\n500,0.2\n" | python -m src.inference
+"""
+
+import argparse
+import os
+import sys
+import time
+
+_IMPORT_START = time.perf_counter()
+
+import numpy as np
+
+from src.st_curve import StCurve
+from src.surrogate_table import CdLookupTable
+from src.tree_engine import FlatForest
+
+
+# Import time of this module measured at the end of the file, and its budget
+IMPORT_BUDGET_S = 0.5
+IMPORT_S = None
+
+# Modules a cold start must not import
+HEAVY_MODULES = ("pandas", "sklearn", "scipy", "matplotlib", "seaborn", "joblib")
+
+# Stdin rows predicted per call
+STDIN_BATCH = 10000
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                         "results", "models")
+
+
+def load_arrays(path):
+    """
+    Load a FlatForest, CdLookupTable or StCurve from its npz file.
+
+    Raises
+    FileNotFoundError
+        When the file is not found.
+    ValueError
+        When the file is not an npz file.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model not found at: {path}")
+    if not path.endswith(".npz"):
+        raise ValueError(f"Only npz model files can be loaded without pickle: {path}")
+
+    with np.load(path) as data:
+        kind = str(data["kind"]) if "kind" in data else "flat_forest"
+    if kind == "cd_table":
+        return CdLookupTable.load(path)
+    if kind == "st_curve":
+        return StCurve.load(path)
+    return FlatForest.load(path)
+
+
+class CdPredictor:
+    """
+    Cd model with an optional St curve to fill missing St values.
+    """
+
+    def __init__(self, model, st_curve=None):
+        self.model = model
+        self.st_curve = st_curve
+
+    @classmethod
+    def load(cls, model_path=None, st_curve_path=None):
+        """
+        Load the model and the St curve.
+
+        Parameters
+        model_path : str or None
+            gbr_re_st.npz or cd_table.npz. Defaults to the compiled model in
+            results/models.
+        st_curve_path : str or None
+            St curve file. Defaults to st_curve.npz next to the model, which
+            is optional.
+        """
+        if model_path is None:
+            model_path = os.path.join(MODEL_DIR, "gbr_re_st.npz")
+        if st_curve_path is None:
+            st_curve_path = os.path.join(os.path.dirname(model_path), "st_curve.npz")
+            if not os.path.exists(st_curve_path):
+                st_curve_path = None
+        st_curve = load_arrays(st_curve_path) if st_curve_path is not None else None
+        return cls(load_arrays(model_path), st_curve)
+
+    def predict(self, re, st=None):
+        """
+        Predict Cd.
+
+        Parameters
+        re : float or array like
+        st : float, array like or None
+            NaN entries, or all entries when None, are filled from the St curve.
+
+        Returns
+        cd : numpy array of shape (n_rows,)
+
+        Raises
+        ValueError
+            When St is missing and no St curve is loaded.
+        """
+        re = np.atleast_1d(np.asarray(re, dtype=np.float64))
+        if self.model.n_features_in_ == 1:
+            return self.model.predict(re[:, None])
+
+        st = np.full(re.shape, np.nan) if st is None else np.atleast_1d(np.asarray(st, dtype=np.float64))
+        missing = np.isnan(st)
+        if missing.any():
+            if self.st_curve is None:
+                raise ValueError("St is missing and no St curve is loaded")
+            st = np.where(missing, self.st_curve.predict(re), st)
+        return self.model.predict(np.column_stack([re, st]))
+
+
+def _needs_curve(predictor):
+    return predictor.model.n_features_in_ == 2 and predictor.st_curve is None
+
+
+def _parse_row(line, predictor):
+    """
+    Parse one Re,St line of stdin.
+
+    Returns
+    row : (re, st) with st NaN when left empty, None for a blank line, or
+          the reason the line is rejected as a string
+    """
+    fields = [f.strip() for f in line.split(",")]
+    if fields == [""]:
+        return None
+    if len(fields) > 2 or not fields[0]:
+        return "expected a Re,St row"
+    try:
+        re = float(fields[0])
+        st = float(fields[1]) if len(fields) == 2 and fields[1] else np.nan
+    except ValueError:
+        return "Re and St must be numbers"
+    if np.isnan(st) and _needs_curve(predictor):
+        return "St is missing and no St curve is loaded"
+    return re, st
+
+
+def _print_batch(predictor, re, st):
+    for cd in predictor.predict(re, st):
+        print(f"{cd:.6f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict Cd from Re and optionally St")
+    parser.add_argument("values", nargs="*", type=float,
+                        help="Re and optionally St. Without values, Re,St rows are read from stdin")
+    parser.add_argument("--model", default=None, help="gbr_re_st.npz or cd_table.npz")
+    parser.add_argument("--st-curve", default=None)
+    parser.add_argument("--timing", action="store_true", help="Print the import and load times")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    predictor = CdPredictor.load(args.model, args.st_curve)
+    load_s = time.perf_counter() - start
+
+    if args.values:
+        if len(args.values) > 2:
+            parser.error("give Re and optionally St")
+        if len(args.values) == 1 and _needs_curve(predictor):
+            parser.error("St is missing and no St curve is loaded")
+        st = [args.values[1]] if len(args.values) == 2 else None
+        for cd in predictor.predict([args.values[0]], st):
+            print(f"{cd:.6f}")
+    else:
+        # Rows are read line by line and predicted in batches of STDIN_BATCH
+        re, st = [], []
+        for number, line in enumerate(sys.stdin, start=1):
+            row = _parse_row(line, predictor)
+            if isinstance(row, str):
+                parser.error(f"line {number}: {row}: {line.strip()!r}")
+            if row is None:
+                continue
+            re.append(row[0])
+            st.append(row[1])
+            if len(re) == STDIN_BATCH:
+                _print_batch(predictor, re, st)
+                re, st = [], []
+        if re:
+            _print_batch(predictor, re, st)
+
+    if args.timing:
+        print(f"import {IMPORT_S * 1000:.1f} ms (budget {IMPORT_BUDGET_S * 1000:.0f} ms), "
+              f"load {load_s * 1000:.1f} ms", file=sys.stderr)
+
+
+IMPORT_S = time.perf_counter() - _IMPORT_START
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+load_generator.py
+
+This file sends concurrent requests to the Cd prediction service and
+reports the throughput and latency seen by the clients.
+
+It performs the following tasks.
+1. Open a number of persistent client connections.
+2. Send single point or batched requests with random Re and St values
+   inside the valid ranges.
+3. Print client side throughput and p50 / p99 latency.
+4. Print the server side statistics from GET /stats.
+
+Example
+python -m src.load_generator --port 8765 --requests 5000 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+
+async def _request(reader, writer, method, target, payload=None):
+    """
+    Send one HTTP request on an open connection and return the JSON reply.
+    """
+    body = json.dumps(payload).encode() if payload is not None else b""
+    writer.write(
+        f"{method} {target} HTTP/1.1\r\n"
+        "Host: localhost\r\n"
+        "Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await writer.drain()
+
+    status = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    reply = json.loads(await reader.readexactly(length))
+
+    if not status.split()[1].startswith(b"2"):
+        raise RuntimeError(f"Request failed: {status.decode().strip()} {reply}")
+    return reply
+
+
+async def _connect(host, port, unix_path):
+    if unix_path is not None:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def run_load(host="127.0.0.1", port=8765, unix_path=None, n_requests=1000,
+                   concurrency=16, batch_size=1, seed=0):
+    """
+    Send n_requests requests using concurrency parallel connections.
+
+    Returns
+    summary : dictionary with client side throughput, p50 / p99 latency
+              and the server statistics
+    """
+    rng = np.random.default_rng(seed)
+    latencies = []
+    counter = iter(range(n_requests))
+
+    async def client():
+        reader, writer = await _connect(host, port, unix_path)
+        try:
+            for _ in counter:
+                Re = rng.uniform(20, 5000, batch_size)
+                St = rng.uniform(0.12, 0.3, batch_size)
+                if batch_size == 1:
+                    payload = {"Re": float(Re[0]), "St": float(St[0])}
+                else:
+                    payload = {"rows": np.column_stack([Re, St]).tolist()}
+
+                start = time.perf_counter()
+                await _request(reader, writer, "POST", "/predict", payload)
+                latencies.append(time.perf_counter() - start)
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await _connect(host, port, unix_path)
+    server_stats = await _request(reader, writer, "GET", "/stats")
+    writer.close()
+
+    lat = np.array(latencies) * 1000.0
+    return {
+        "requests": len(latencies),
+        "rows": len(latencies) * batch_size,
+        "seconds": elapsed,
+        "requests_per_s": len(latencies) / elapsed,
+        "rows_per_s": len(latencies) * batch_size / elapsed,
+        "p50_ms": float(np.percentile(lat, 50)),
+        "p99_ms": float(np.percentile(lat, 99)),
+        "server": server_stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the Cd prediction service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=1)
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_load(args.host, args.port, args.unix, args.requests,
+                                   args.concurrency, args.batch_size))
+
+    server = summary.pop("server")
+    print("\nClient side")
+    for k, v in summary.items():
+        print(f"{k:<15}  {v:.3f}" if isinstance(v, float) else f"{k:<15}  {v}")
+    print("\nServer side")
+    for k, v in server.items():
+        print(f"{k:<15}  {v:.3f}" if isinstance(v, float) else f"{k:<15}  {v}")
+
+
+if __name__ == "__main__":
+    main()
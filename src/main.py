@@ -12,28 +12,42 @@ The pipeline contains five major stages.
 5. Generate all visual plots and launch an interactive predictor
    for live Cd prediction from user input values.
 
+The stages form a dependency graph run by pipeline.py. Stages whose inputs
+and code are unchanged are loaded from the cache, independent stages run
+concurrently, and a subset can be chosen on the command line, for example
+python -m src.main --stages plots
+python -m src.main --force gbr_re_st
+python -m src.main --list-stages
+
+Large files are scored offline with the saved model, for example
+python -m src.main predict --input data/big.csv --output results/big_pred.csv
+
 All results are saved inside the results folder.
 """
 
+import argparse
+import asyncio
 import os
 import warnings
 warnings.filterwarnings("ignore")
 
-import numpy as np
-import pandas as pd
-
 # Import modules
-from src.data_loader import load_data
-from src.eda import run_eda
-from src.polynomial_regression import polynomial_regression
-from src.gbr_model import train_gbr
-from src.visualization import (
-    plot_cd_vs_re,
-    plot_cd_vs_st,
-    plot_re_vs_st,
-    plot_combined_cd_re,
-    plot_pred_vs_actual,
-)
+# Only modules that need nothing beyond NumPy are imported here. The data,
+# EDA, training and plotting modules pull in pandas, sklearn, seaborn and
+# matplotlib, so they are imported inside the stages that use them.
+# python -m src.main predict only loads pandas, which batch_predict needs to
+# read and write the CSV chunks, and sklearn only for a pickled model.
+from src.predict_server import save_model, serve
+from src.tree_engine import compile_gbr
+from src.surrogate_table import build_lookup_table
+from src.poly_basis import ChebyshevFamily
+from src.metrics import train_test_metrics
+from src.pipeline import Stage, Pipeline
+from src.profiling import PROFILER, span, write_profile
+from src.render import plot_job, render_figures
+from src.st_curve import StCurve
+from src.results_store import ResultsStore, with_frame
+from src.distill import compress_gbr, truncate_gbr, uniform_table
 
 
 
@@ -68,122 +82,440 @@ def print_params(title, params):
 
 
 
-# Main execution pipeline
-def run():
+# Print the work done by the halving search
+def print_search_report(title, report):
+    """
+    Print how many fits the staged halving search saved
+    compared to an exhaustive grid search.
+    """
+    print_params(title, {k: v for k, v in report.items() if k != "rounds"})
 
-    # 1. Setup folders and file paths
-    PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    DATA = os.path.join(PROJECT, "data", "vortex_data.csv")
-    RESULTS = os.path.join(PROJECT, "results")
-    os.makedirs(RESULTS, exist_ok=True)
+    rows = [[i + 1, r["candidates"], r["train_rows"], round(r["best_mse"], 6)]
+            for i, r in enumerate(report["rounds"])]
+    print_table(
+        "Halving Rounds",
+        ["Round", "Candidates", "Train Rows", "Best MSE"],
+        rows
+    )
 
-    # 2. Load dataset
-    df = load_data(DATA)
-    print("\nLoaded dataset with", len(df), "samples")
 
-    # 3. Run exploratory data analysis
-    run_eda(df, os.path.join(RESULTS, "eda"))
-    print("\nEDA completed.\n")
 
-    # 4. Polynomial regression
-    best_model, best_poly_obj, poly_metrics = polynomial_regression(df)
-
-    rows = []
-    for deg, m in poly_metrics.items():
-        rows.append([
-            deg,
-            round(m["train_r2"], 4),
-            round(m["test_r2"], 4),
-            round(m["train_rmse"], 4),
-            round(m["test_rmse"], 4),
-            round(m["train_mae"], 4),
-            round(m["test_mae"], 4),
-        ])
+# Pipeline stages
+# Each stage receives the results of its input stages, see build_pipeline
+def load_stage(path):
+    from src.data_loader import load_data
 
-    print_table(
-        "Polynomial Regression Comparison Re to Cd",
-        ["Degree", "Train R2", "Test R2", "Train RMSE", "Test RMSE", "Train MAE", "Test MAE"],
-        rows
+    with span("load_data") as record:
+        df = load_data(path)
+        record["rows"] = len(df)
+    return df
+
+
+def eda_stage(df, save_dir, n_jobs=1):
+    from src.eda import run_eda
+
+    with span("run_eda", rows=len(df)):
+        return run_eda(df, save_dir, n_workers=n_jobs)
+
+
+def polynomial_stage(df, max_degree, engine):
+    from src.polynomial_regression import polynomial_regression
+
+    with span("polynomial_regression", rows=len(df)):
+        return polynomial_regression(df, max_degree=max_degree, engine=engine)
+
+
+def gbr_stage(df, use_st, search, param_grid, memo_dir, n_jobs=1):
+    from src.gbr_model import train_gbr
+
+    with span("train_gbr", rows=len(df)):
+        return train_gbr(df, use_st=use_st, search=search, n_jobs=n_jobs,
+                         param_grid=param_grid, memo_dir=memo_dir)
+
+
+def predictions_stage(df, poly, gbr_re, gbr_st, store_dir):
+    """
+    Compile both GBR models, predict Cd for every sample and fit the median
+    St versus Re curve used by the combined plot and the predictor.
+
+    The predictions and the median St of every row are written chunk by
+    chunk to a results store in store_dir instead of columns of df, so
+    memory does not grow with the number of models compared.
+    """
+    from src.artifact_cache import data_fingerprint
+
+    best_model, best_poly_obj, _ = poly
+
+    # Flat array engine, gives the same predictions as sklearn with less overhead
+    gbr_re_fast = compile_gbr(gbr_re[0])
+    gbr_st_fast = compile_gbr(gbr_st[0])
+    st_curve = StCurve.fit(df["Re"].values, df["St"].values)
+
+    X_re = df[["Re"]].values
+    X_st = df[["Re", "St"]].values
+    store = ResultsStore.create(store_dir, len(df), key=data_fingerprint(df))
+    store.write("Cd", lambda y: y, df["Cd"].values, dtype="float64")
+    store.write("Cd_poly", lambda X: best_model.predict(best_poly_obj.transform(X)), X_re)
+    store.write("Cd_gbr_re", gbr_re_fast.predict, X_re)
+    store.write("Cd_gbr_rest", gbr_st_fast.predict, X_st)
+    store.write("St_median", st_curve.predict, df["Re"].values)
+
+    return {"gbr_re_fast": gbr_re_fast, "gbr_st_fast": gbr_st_fast, "store": store,
+            "st_curve": st_curve}
+
+
+def plots_stage(df, poly, predictions, save_dir, n_jobs=1):
+    """
+    Render the result figures in parallel worker processes.
+    """
+    from src.visualization import (
+        plot_cd_vs_re,
+        plot_cd_vs_st,
+        plot_re_vs_st,
+        plot_combined_cd_re,
+        plot_pred_vs_actual,
     )
 
-    # Best degree
-    best_deg = max(poly_metrics, key=lambda d: poly_metrics[d]["test_r2"])
-    print(f"\nBest Polynomial Degree = {best_deg}")
+    data = df[["Re", "St", "Cd"]]
+    store = predictions["store"]
+    jobs = [
+        plot_job("cd_vs_re", plot_cd_vs_re, data,
+                 save_path=os.path.join(save_dir, "cd_vs_re.png")),
+        plot_job("cd_vs_st", plot_cd_vs_st, data,
+                 save_path=os.path.join(save_dir, "cd_vs_st.png")),
+        plot_job("re_vs_st", plot_re_vs_st, data,
+                 save_path=os.path.join(save_dir, "re_vs_st.png")),
+        plot_job("combined_cd_re", plot_combined_cd_re, data, poly[2],
+                 predictions["gbr_re_fast"], predictions["gbr_st_fast"],
+                 save_path=os.path.join(save_dir, "combined_cd_re.png"),
+                 poly_family=poly[0].family, st_curve=predictions["st_curve"]),
+        plot_job("pred_vs_actual_gbr_re", with_frame, plot_pred_vs_actual, store,
+                 ["Cd", "Cd_gbr_re"], "Cd_gbr_re",
+                 save_path=os.path.join(save_dir, "pred_vs_actual_gbr_re.png")),
+        plot_job("pred_vs_actual_gbr_rest", with_frame, plot_pred_vs_actual, store,
+                 ["Cd", "Cd_gbr_rest"], "Cd_gbr_rest",
+                 save_path=os.path.join(save_dir, "pred_vs_actual_gbr_rest.png")),
+    ]
+    return render_figures(jobs, n_jobs)
+
+
+def export_stage(gbr_st, predictions, model_dir):
+    """
+    Save the GBR Re St model, its compiled arrays, the Cd lookup table and
+    the median St curve used to fill a missing St.
+    """
+    save_model(gbr_st[0], os.path.join(model_dir, "gbr_re_st.pkl"))
+    predictions["gbr_st_fast"].save(os.path.join(model_dir, "gbr_re_st.npz"))
 
-    df["Cd_poly"] = best_model.predict(best_poly_obj.transform(df[["Re"]]))
+    # Constant time lookup table over the valid Re and St envelope
+    cd_table = build_lookup_table(predictions["gbr_st_fast"])
+    cd_table.save(os.path.join(model_dir, "cd_table.npz"))
+    predictions["st_curve"].save(os.path.join(model_dir, "st_curve.npz"))
+    return cd_table.report
 
-    # 5. GBR model using only Re
-    gbr_re_model, gbr_re_metrics, gbr_re_params = train_gbr(df, use_st=False)
-    print_params("Best GBR Re Hyperparameters", gbr_re_params)
 
-    df["Cd_gbr_re"] = gbr_re_model.predict(df[["Re"]])
+def compress_stage(df, gbr_st, tolerance, model_dir):
+    """
+    Compress the GBR Re St model into the smallest NumPy only predictor whose
+    test RMSE is within tolerance of the original, and save it as
+    gbr_re_st_small.npz.
+    """
+    model, metrics, _ = gbr_st
+    with span("compress_gbr", rows=len(df)):
+        best, report = compress_gbr(model, df, metrics, tolerance=tolerance)
+    os.makedirs(model_dir, exist_ok=True)
+    best.save(os.path.join(model_dir, "gbr_re_st_small.npz"))
+    return report
+
 
+EDA_FIGURES = ["hist_Re.png", "hist_St.png", "hist_Cd.png", "pairplot.png",
+               "corr_heatmap.png", "summary_stats.csv"]
+RESULT_FIGURES = ["cd_vs_re.png", "cd_vs_st.png", "re_vs_st.png", "combined_cd_re.png",
+                  "pred_vs_actual_gbr_re.png", "pred_vs_actual_gbr_rest.png"]
+MODEL_FILES = ["gbr_re_st.pkl", "gbr_re_st.npz", "cd_table.npz", "st_curve.npz"]
+STAGE_NAMES = ["data", "eda", "polynomial", "gbr_re", "gbr_re_st", "predictions", "plots", "export",
+               "compress"]
+
+
+def build_pipeline(project, cache, max_workers=4, profile=False, scheduler=None):
+    """
+    Build the stage graph of the analysis.
+
+    The EDA, polynomial and both GBR stages only depend on the data and run
+    concurrently. Every stage is fingerprinted, so after a code or data change
+    only the stages below the change run again. With a scheduler each GBR
+    search leases half of the cores and the figure stages a quarter, so the
+    two searches run side by side without oversubscribing the machine.
+    """
+    from src.data_loader import load_data
+    from src.eda import run_eda
+    from src.polynomial_regression import polynomial_regression
+    from src.gbr_model import train_gbr, PARAM_GRID
+    from src.score_memo import memo_grid_search
+    from src.artifact_cache import data_fingerprint
+    from src.scheduler import ResourceScheduler
+    from src.visualization import plot_cd_vs_re
+
+    if scheduler is None:
+        scheduler = ResourceScheduler()
+    gbr_workers = scheduler.share(0.5)
+    plot_workers = scheduler.share(0.25)
+
+    data_path = os.path.join(project, "data", "vortex_data.csv")
+    results = os.path.join(project, "results")
+    eda_dir = os.path.join(results, "eda")
+    model_dir = os.path.join(results, "models")
+    memo_dir = os.path.join(results, "cv_scores")
+
+    # The train test split is set by TEST_SIZE and RANDOM_STATE in gbr_model.py,
+    # whose source is part of the GBR stage fingerprints through train_gbr
+    stages = [
+        Stage("data", load_stage, params={"path": data_path}, code=[load_data],
+              cache=False, fingerprint=data_fingerprint),
+        Stage("eda", eda_stage, inputs=["data"], params={"save_dir": eda_dir},
+              outputs=[os.path.join(eda_dir, f) for f in EDA_FIGURES],
+              code=[run_eda, render_figures], workers=plot_workers),
+        Stage("polynomial", polynomial_stage, inputs=["data"],
+              params={"max_degree": 5, "engine": "chebyshev"},
+              code=[polynomial_regression, ChebyshevFamily, train_test_metrics]),
+        Stage("gbr_re", gbr_stage, inputs=["data"],
+              params={"use_st": False, "search": "halving", "param_grid": PARAM_GRID,
+                      "memo_dir": memo_dir},
+              code=[train_gbr, train_test_metrics, memo_grid_search], workers=gbr_workers),
+        Stage("gbr_re_st", gbr_stage, inputs=["data"],
+              params={"use_st": True, "search": "halving", "param_grid": PARAM_GRID,
+                      "memo_dir": memo_dir},
+              code=[train_gbr, train_test_metrics, memo_grid_search], workers=gbr_workers),
+        Stage("predictions", predictions_stage, inputs=["data", "polynomial", "gbr_re", "gbr_re_st"],
+              params={"store_dir": os.path.join(results, "store")},
+              code=[compile_gbr, ChebyshevFamily, StCurve, ResultsStore], cache=False),
+        Stage("plots", plots_stage, inputs=["data", "polynomial", "predictions"],
+              params={"save_dir": results},
+              outputs=[os.path.join(results, f) for f in RESULT_FIGURES],
+              code=[plot_cd_vs_re, render_figures, with_frame], workers=plot_workers),
+        Stage("export", export_stage, inputs=["gbr_re_st", "predictions"],
+              params={"model_dir": model_dir},
+              outputs=[os.path.join(model_dir, f) for f in MODEL_FILES],
+              code=[save_model, compile_gbr, build_lookup_table, StCurve]),
+        Stage("compress", compress_stage, inputs=["data", "gbr_re_st"],
+              params={"tolerance": 0.02, "model_dir": model_dir},
+              outputs=[os.path.join(model_dir, "gbr_re_st_small.npz")],
+              code=[compress_gbr, truncate_gbr, uniform_table, compile_gbr]),
+    ]
+    return Pipeline(stages, cache, max_workers=max_workers, profile=profile,
+                    scheduler=scheduler)
+
+
+def print_metrics(title, metrics):
+    """
+    Print the train and test metrics of a GBR model.
+    """
     print_table(
-        "GBR Re Performance Metrics",
+        title,
         ["Metric", "Value"],
         [
-            ["Train R2", round(gbr_re_metrics["train_r2"], 4)],
-            ["Test R2", round(gbr_re_metrics["test_r2"], 4)],
-            ["Train RMSE", round(gbr_re_metrics["train_rmse"], 4)],
-            ["Test RMSE", round(gbr_re_metrics["test_rmse"], 4)],
-            ["Train MAE", round(gbr_re_metrics["train_mae"], 4)],
-            ["Test MAE", round(gbr_re_metrics["test_mae"], 4)],
+            ["Train R2", round(metrics["train_r2"], 4)],
+            ["Test R2", round(metrics["test_r2"], 4)],
+            ["Train RMSE", round(metrics["train_rmse"], 4)],
+            ["Test RMSE", round(metrics["test_rmse"], 4)],
+            ["Train MAE", round(metrics["train_mae"], 4)],
+            ["Test MAE", round(metrics["test_mae"], 4)],
         ]
     )
 
-    # 6. GBR model using both Re and St
-    gbr_st_model, gbr_st_metrics, gbr_st_params = train_gbr(df, use_st=True)
-    print_params("Best GBR Re St Hyperparameters", gbr_st_params)
 
-    df["Cd_gbr_rest"] = gbr_st_model.predict(df[["Re", "St"]])
+
+# Main execution pipeline
+def run(serve_port=None, stages=None, force=(), jobs=4, profile=False, cores=None):
+    """
+    Run the full pipeline.
+
+    Parameters
+    serve_port : int or None
+        When given, the GBR Re St model is served on this port by the
+        batched prediction service instead of the interactive predictor.
+    stages : list of str or None
+        Run only these stages and the stages they need. None runs all of them.
+    force : list of str
+        Stages that run again even when their cached result is up to date.
+    jobs : int
+        Number of stages run at the same time.
+    profile : bool
+        Run the stages under cProfile and save the profile of the slowest
+        stage that ran next to the run report.
+    cores : int or None
+        Core budget shared by the stages. None uses all available cores.
+    """
+    from src.data_loader import LOAD_STATS
+    from src.artifact_cache import ArtifactCache
+    from src.scheduler import ResourceScheduler
+
+    # 1. Setup folders and build the stage graph
+    PROJECT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    RESULTS = os.path.join(PROJECT, "results")
+    os.makedirs(RESULTS, exist_ok=True)
+
+    # Stage results are reused when their inputs and code are unchanged
+    cache = ArtifactCache(os.path.join(RESULTS, "cache"))
+    scheduler = ResourceScheduler(n_cores=cores)
+    pipeline = build_pipeline(PROJECT, cache, max_workers=jobs, profile=profile,
+                              scheduler=scheduler)
+
+    if serve_port is not None and stages is not None:
+        stages = list(stages) + ["predictions"]
+    PROFILER.clear()
+    with scheduler.activate():
+        results = pipeline.run(stages, force)
 
     print_table(
-        "GBR Re St Performance Metrics",
-        ["Metric", "Value"],
-        [
-            ["Train R2", round(gbr_st_metrics["train_r2"], 4)],
-            ["Test R2", round(gbr_st_metrics["test_r2"], 4)],
-            ["Train RMSE", round(gbr_st_metrics["train_rmse"], 4)],
-            ["Test RMSE", round(gbr_st_metrics["test_rmse"], 4)],
-            ["Train MAE", round(gbr_st_metrics["train_mae"], 4)],
-            ["Test MAE", round(gbr_st_metrics["test_mae"], 4)],
-        ]
+        "Pipeline Stages",
+        ["Stage", "Status", "Seconds", "Wait s"],
+        [[r["stage"], r["status"], round(r["seconds"], 3), round(r["wait_s"], 3)]
+         for r in pipeline.report]
     )
 
-    # 7. Generate all visual plots
-    print("\nGenerating plots...")
+    # Wall time, CPU time, peak memory and rows of every stage and step
+    report_paths = PROFILER.write(RESULTS)
+    print_table(
+        "Run Report",
+        ["Span", "Wall s", "CPU s", "Peak MB", "Rows"],
+        [[r["span"], round(r["wall_s"], 3),
+          "-" if r["cpu_s"] is None else round(r["cpu_s"], 3),
+          "-" if r["peak_rss_mb"] is None else round(r["peak_rss_mb"], 1),
+          "-" if r["rows"] is None else r["rows"]]
+         for r in PROFILER.report()]
+    )
+    print("Run report saved in:", ", ".join(report_paths))
+    print_params("Core Utilization", scheduler.report())
 
-    plot_cd_vs_re(df, os.path.join(RESULTS, "cd_vs_re.png"))
-    plot_cd_vs_st(df, os.path.join(RESULTS, "cd_vs_st.png"))
-    plot_re_vs_st(df, os.path.join(RESULTS, "re_vs_st.png"))
+    if pipeline.profiles:
+        hottest = max(pipeline.profiles,
+                      key=lambda name: next(r["seconds"] for r in pipeline.report if r["stage"] == name))
+        paths = write_profile(pipeline.profiles[hottest], os.path.join(RESULTS, f"profile_{hottest}"))
+        print(f"cProfile of the slowest stage {hottest} saved in:", ", ".join(paths))
 
-    plot_combined_cd_re(
-        df,
-        poly_metrics,
-        gbr_re_model,
-        gbr_st_model,
-        os.path.join(RESULTS, "combined_cd_re.png")
-    )
+    # 2. Dataset
+    df = results["data"]
+    print("\nLoaded dataset with", len(df), "samples")
+    print(f"Source {LOAD_STATS['source']}, load {LOAD_STATS['load_s'] * 1000:.1f} ms, "
+          f"CSV parse {LOAD_STATS['parse_s'] * 1000:.1f} ms")
 
-    plot_pred_vs_actual(df, "Cd_gbr_re", os.path.join(RESULTS, "pred_vs_actual_gbr_re.png"))
-    plot_pred_vs_actual(df, "Cd_gbr_rest", os.path.join(RESULTS, "pred_vs_actual_gbr_rest.png"))
+    # 3. Exploratory data analysis
+    if "eda" in results:
+        print("\nEDA completed.\n")
 
-    print("\nPlots saved in:", RESULTS)
+    # 4. Polynomial regression
+    if "polynomial" in results:
+        poly_metrics = results["polynomial"][2]
+        rows = []
+        for deg, m in poly_metrics.items():
+            rows.append([
+                deg,
+                round(m["train_r2"], 4),
+                round(m["test_r2"], 4),
+                round(m["train_rmse"], 4),
+                round(m["test_rmse"], 4),
+                round(m["train_mae"], 4),
+                round(m["test_mae"], 4),
+            ])
+
+        print_table(
+            "Polynomial Regression Comparison Re to Cd",
+            ["Degree", "Train R2", "Test R2", "Train RMSE", "Test RMSE", "Train MAE", "Test MAE"],
+            rows
+        )
+
+        # Best degree
+        best_deg = max(poly_metrics, key=lambda d: poly_metrics[d]["test_r2"])
+        print(f"\nBest Polynomial Degree = {best_deg}")
+
+    # 5. GBR model using only Re
+    if "gbr_re" in results:
+        gbr_re_model, gbr_re_metrics, gbr_re_params = results["gbr_re"]
+        print_params("Best GBR Re Hyperparameters", gbr_re_params)
+        print_search_report("GBR Re Search Report", gbr_re_model.search_report_)
+        print_metrics("GBR Re Performance Metrics", gbr_re_metrics)
+
+    # 6. GBR model using both Re and St
+    if "gbr_re_st" in results:
+        gbr_st_model, gbr_st_metrics, gbr_st_params = results["gbr_re_st"]
+        print_params("Best GBR Re St Hyperparameters", gbr_st_params)
+        print_search_report("GBR Re St Search Report", gbr_st_model.search_report_)
+        print_metrics("GBR Re St Performance Metrics", gbr_st_metrics)
+
+    # Metrics of every model over all rows, read from the results store
+    if "predictions" in results:
+        store = results["predictions"]["store"]
+        rows = []
+        for label, name in [("Polynomial", "Cd_poly"), ("GBR Re", "Cd_gbr_re"),
+                            ("GBR Re St", "Cd_gbr_rest")]:
+            m = store.metrics("Cd", name)
+            rows.append([label, round(m["r2"], 4), round(m["rmse"], 4), round(m["mae"], 4),
+                         round(m["max_error"], 4)])
+        print_table("Full Dataset Metrics", ["Model", "R2", "RMSE", "MAE", "Max Error"], rows)
+        print(f"Results store: {store.folder}, {len(store.columns)} columns, "
+              f"{store.nbytes() / 1e6:.2f} MB")
+
+    # 7. Figures
+    figures = results.get("eda", []) + results.get("plots", [])
+    if figures:
+        print_table(
+            "Figure Render Report",
+            ["Figure", "Seconds", "KB"],
+            [[r["figure"], round(r["seconds"], 3), round(r["bytes"] / 1024, 1)]
+             for r in figures]
+        )
+        print("\nPlots saved in:", RESULTS)
+
+    # 8. Saved models and live predictor
+    if "export" in results:
+        print_params("Cd Lookup Table", results["export"])
+        print("\nGBR Re St model saved in:", os.path.join(RESULTS, "models", "gbr_re_st.pkl"))
+
+    # Size, latency and accuracy of the compressed candidates
+    if "compress" in results:
+        print_table(
+            "GBR Re St Compression",
+            ["Model", "Size", "KB", "Row us", "Rows/s", "Test RMSE", "Change %", "Within"],
+            [[r["model"], r["size"], round(r["kb"], 1), round(r["row_us"], 1),
+              f"{r['rows_per_s']:.3g}", round(r["test_rmse"], 5),
+              round(100 * r["rmse_change"], 2), "yes" if r["within"] else "no"]
+             for r in results["compress"]]
+        )
+        print("Compressed model saved in:", os.path.join(RESULTS, "models", "gbr_re_st_small.npz"))
+
+    if serve_port is not None:
+        try:
+            asyncio.run(serve(results["predictions"]["gbr_st_fast"], port=serve_port))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    # The interactive predictor only follows a full run
+    if stages is not None:
+        return
+    gbr_st_fast = results["predictions"]["gbr_st_fast"]
+    st_curve = results["predictions"]["st_curve"]
 
-    # 8. Live predictor
     print("\nLive Cd Predictor")
     print("Best model uses Re and St")
     print("Valid input ranges")
     print("Re between 20 and 5000")
     print("St between 0.12 and 0.3")
+    print("Leave St empty to use the median St at the given Re")
     print()
 
     while True:
         try:
             Re_val = float(input("Enter Re: "))
-            St_val = float(input("Enter St: "))
-
-            Cd_val = gbr_st_model.predict([[Re_val, St_val]])[0]
+            St_text = input("Enter St: ").strip()
+            if St_text:
+                St_val = float(St_text)
+            else:
+                St_val = float(st_curve.predict(Re_val))
+                print(f"Using median St = {St_val:.4f}")
+
+            Cd_val = gbr_st_fast.predict([[Re_val, St_val]])[0]
             print(f"Predicted Cd = {Cd_val:.6f}\n")
 
             if input("Another prediction y or n: ").lower() != "y":
@@ -195,6 +527,51 @@ def run():
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Vortex cylinder Cd pipeline")
+    parser.add_argument("--serve", type=int, default=None, metavar="PORT",
+                        help="Serve the GBR Re St model on PORT instead of the interactive predictor")
+    parser.add_argument("--stages", default=None,
+                        help="Comma separated stages to run, with the stages they need")
+    parser.add_argument("--force", default="",
+                        help="Comma separated stages to run again even when cached")
+    parser.add_argument("--jobs", type=int, default=4, help="Stages run at the same time")
+    parser.add_argument("--cores", type=int, default=None,
+                        help="Core budget shared by the stages, default all available cores")
+    parser.add_argument("--list-stages", action="store_true", help="Print the stage graph and exit")
+    parser.add_argument("--profile", action="store_true",
+                        help="Run stages under cProfile and save the profile of the slowest one")
+
+    commands = parser.add_subparsers(dest="command")
+    predict_parser = commands.add_parser(
+        "predict", help="Predict Cd for every row of a CSV file or binary dataset folder")
+    predict_parser.add_argument("--model", default=os.path.join("results", "models", "gbr_re_st.npz"),
+                                help="Saved model, .pkl or compiled .npz")
+    predict_parser.add_argument("--input", required=True, help="CSV file or binary dataset folder")
+    predict_parser.add_argument("--output", required=True, help="Output CSV file")
+    predict_parser.add_argument("--chunksize", type=int, default=200000)
+    predict_parser.add_argument("--workers", type=int, default=None,
+                                help="Worker processes, default one per CPU")
+    args = parser.parse_args()
+
+    stages = args.stages.split(",") if args.stages else None
+    force = [s for s in args.force.split(",") if s]
+
+    if args.command == "predict":
+        from src.batch_predict import predict_file
+        stats = predict_file(args.model, args.input, args.output, args.chunksize, args.workers)
+        print(f"Predicted {stats['rows']} rows in {stats['seconds']:.2f} s, "
+              f"{stats['rows_per_s']:,.0f} rows/s, wrote {args.output}")
+    elif args.list_stages:
+        project = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        graph = build_pipeline(project, cache=None)
+        for name in graph.order:
+            inputs = ", ".join(graph.stages[name].inputs) or "-"
+            print(f"{name:<12}  needs {inputs}")
+    else:
+        unknown = [s for s in (stages or []) + force if s not in STAGE_NAMES]
+        if unknown:
+            parser.error("unknown stage: " + ", ".join(unknown))
+        run(serve_port=args.serve, stages=stages, force=force, jobs=args.jobs,
+            profile=args.profile, cores=args.cores)
 
 # Portions of this code, including debugging assistance were developed with help from OpenAI ChatGPT 5.1.
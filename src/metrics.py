@@ -0,0 +1,214 @@
+"""
+metrics.py
+
+This file computes the regression metrics used to score the models.
+
+It performs the following tasks.
+1. Compute R2, RMSE, MAE and the maximum absolute error of a prediction
+   from one residual array, instead of validating and scanning the arrays
+   once per metric.
+2. Build the train and test metric dictionary returned by train_gbr and
+   polynomial_regression.
+3. Accumulate the same metrics chunk by chunk for data that does not fit in
+   memory. Accumulators of different chunks can be merged.
+4. Compute the metrics of many bootstrap resamples from per row sums with
+   one matrix product per block of resamples.
+
+Example
+m = regression_metrics(y_test, model.predict(X_test))
+print(m["r2"], m["rmse"], m["mae"], m["max_error"])
+"""
+
+import numpy as np
+
+
+METRIC_NAMES = ("r2", "rmse", "mae", "max_error")
+
+
+def _arrays(y_true, y_pred):
+    """
+    Return y_true and y_pred as flat float64 arrays of the same length.
+
+    Raises
+    ValueError
+        When the lengths differ.
+    """
+    y_true = np.asarray(y_true, dtype=np.float64).ravel()
+    y_pred = np.asarray(y_pred, dtype=np.float64).ravel()
+    if len(y_true) != len(y_pred):
+        raise ValueError(f"y_true has {len(y_true)} values but y_pred has {len(y_pred)}")
+    return y_true, y_pred
+
+
+def _r2(sse, ss_tot):
+    # Like sklearn r2_score, constant targets score 1.0 when predicted exactly and 0.0 otherwise
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(ss_tot > 0, 1.0 - np.divide(sse, ss_tot), np.where(sse == 0, 1.0, 0.0))
+
+
+def _finish(n, sse, sae, max_err, ss_tot):
+    if n == 0:
+        nan = float("nan")
+        return {"n": 0, "r2": nan, "rmse": nan, "mae": nan, "max_error": nan}
+    return {
+        "n": n,
+        "r2": float(_r2(sse, ss_tot)),
+        "rmse": float(np.sqrt(sse / n)),
+        "mae": sae / n,
+        "max_error": max_err,
+    }
+
+
+def regression_metrics(y_true, y_pred):
+    """
+    Compute R2, RMSE, MAE and maximum absolute error.
+
+    The residuals are formed once and every metric is a reduction of them
+    or of the centered targets, instead of one sklearn call per metric.
+
+    Parameters
+    y_true, y_pred : array like of shape (n,)
+
+    Returns
+    metrics : dictionary with n, r2, rmse, mae and max_error
+    """
+    y_true, y_pred = _arrays(y_true, y_pred)
+    if len(y_true) == 0:
+        return _finish(0, 0.0, 0.0, 0.0, 0.0)
+
+    abs_err = np.abs(y_true - y_pred)
+    centered = y_true - y_true.mean()
+    return _finish(len(y_true), float(np.dot(abs_err, abs_err)), float(abs_err.sum()),
+                   float(abs_err.max()), float(np.dot(centered, centered)))
+
+
+def train_test_metrics(y_train, y_train_pred, y_test, y_test_pred):
+    """
+    Return the train and test R2, RMSE and MAE of a model.
+
+    Returns
+    metrics : dictionary with train_r2, test_r2, train_rmse, test_rmse,
+              train_mae and test_mae
+    """
+    train = regression_metrics(y_train, y_train_pred)
+    test = regression_metrics(y_test, y_test_pred)
+    return {
+        "train_r2": train["r2"],
+        "test_r2": test["r2"],
+        "train_rmse": train["rmse"],
+        "test_rmse": test["rmse"],
+        "train_mae": train["mae"],
+        "test_mae": test["mae"],
+    }
+
+
+class MetricAccumulator:
+    """
+    Running sums of the regression metrics over chunks of data.
+
+    The total sum of squares is merged from per chunk means, which stays
+    accurate for any number of chunks.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.sse = 0.0
+        self.sae = 0.0
+        self.max_err = 0.0
+        self.mean = 0.0
+        self.ss_tot = 0.0
+
+    def _combine(self, n, sse, sae, max_err, mean, ss_tot):
+        if n == 0:
+            return self
+        delta = mean - self.mean
+        total = self.n + n
+        self.ss_tot += ss_tot + delta ** 2 * self.n * n / total
+        self.mean += delta * n / total
+        self.n = total
+        self.sse += sse
+        self.sae += sae
+        self.max_err = max(self.max_err, max_err)
+        return self
+
+    def update(self, y_true, y_pred):
+        """
+        Add one chunk of targets and predictions.
+        """
+        y_true, y_pred = _arrays(y_true, y_pred)
+        if len(y_true) == 0:
+            return self
+        abs_err = np.abs(y_true - y_pred)
+        mean = y_true.mean()
+        centered = y_true - mean
+        return self._combine(len(y_true), float(np.dot(abs_err, abs_err)),
+                             float(abs_err.sum()), float(abs_err.max()), float(mean),
+                             float(np.dot(centered, centered)))
+
+    def merge(self, other):
+        """
+        Add the sums of another accumulator, for example from another worker.
+        """
+        return self._combine(other.n, other.sse, other.sae, other.max_err,
+                             other.mean, other.ss_tot)
+
+    def result(self):
+        """
+        Return the metrics of all chunks added so far.
+
+        Returns
+        metrics : dictionary with n, r2, rmse, mae and max_error
+        """
+        return _finish(self.n, self.sse, self.sae, self.max_err, self.ss_tot)
+
+
+def bootstrap_metrics(y_true, y_pred, n_resamples=1000, seed=0, block=64):
+    """
+    Compute the metrics of bootstrap resamples of the rows.
+
+    The residual and target sums of every row are formed once. A block of
+    resamples is drawn as row counts, and the sums of all resamples in the
+    block follow from one matrix product with those rows.
+
+    Parameters
+    y_true, y_pred : array like of shape (n,)
+    n_resamples : int
+        Number of bootstrap resamples.
+    seed : int
+        Random seed.
+    block : int
+        Resamples drawn per matrix product, bounds memory to block * n counts.
+
+    Returns
+    samples : dictionary mapping r2, rmse, mae and max_error to arrays of
+              shape (n_resamples,)
+
+    Raises
+    ValueError
+        When there are no rows.
+    """
+    y_true, y_pred = _arrays(y_true, y_pred)
+    n = len(y_true)
+    if n == 0:
+        raise ValueError("Bootstrap needs at least one row")
+
+    # Per row sums, y is centered once so the sum of squares keeps its precision
+    abs_err = np.abs(y_true - y_pred)
+    centered = y_true - y_true.mean()
+    rows = np.column_stack([abs_err ** 2, abs_err, centered, centered ** 2])
+
+    rng = np.random.default_rng(seed)
+    samples = {name: np.empty(n_resamples) for name in METRIC_NAMES}
+    p = np.full(n, 1.0 / n)
+    for start in range(0, n_resamples, block):
+        size = min(block, n_resamples - start)
+        counts = rng.multinomial(n, p, size=size)
+        sse, sae, s1, s2 = (counts @ rows).T
+
+        stop = start + size
+        ss_tot = s2 - s1 ** 2 / n
+        samples["r2"][start:stop] = _r2(sse, ss_tot)
+        samples["rmse"][start:stop] = np.sqrt(sse / n)
+        samples["mae"][start:stop] = sae / n
+        samples["max_error"][start:stop] = np.where(counts > 0, abs_err, 0.0).max(axis=1)
+    return samples
@@ -0,0 +1,239 @@
+"""
+model_update.py
+
+This file keeps a trained GBR model up to date while new measurements are
+appended to the dataset.
+
+It performs the following tasks.
+1. Remember the rows a model was trained on by their count and a hash, so
+   rows appended at the end of the dataset are detected. Any other change
+   to the data leads to a full retrain.
+2. Score the current model on the appended rows, which it has never seen,
+   and compare the RMSE with the test RMSE of the last full training,
+   allowing for the sampling noise of a small batch of rows.
+3. When the error has not drifted past the threshold, add a small number of
+   warm started boosting stages fitted on the residuals of all training
+   rows, as long as the model stays within its tree budget.
+4. Otherwise run the full train_gbr search again.
+5. Report the time of the update and the time saved compared with a cold
+   retrain, estimated from the last full training time scaled by rows.
+
+Example
+python -m src.model_update --data data/vortex_data.csv
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.model_selection import train_test_split
+
+from src.artifact_cache import data_fingerprint
+from src.gbr_model import train_gbr, TEST_SIZE, RANDOM_STATE
+from src.metrics import train_test_metrics
+
+
+class ModelState:
+    """
+    A GBR model together with the data it was trained on.
+
+    test_mask marks the rows of the first n_rows rows that are held out for
+    testing. baseline_rmse and train_seconds come from the last full
+    training, trained_rows is the number of rows it used.
+    """
+
+    def __init__(self, model, use_st, n_rows, fingerprint, test_mask, metrics,
+                 params, baseline_rmse, train_seconds, trained_rows, search):
+        self.model = model
+        self.use_st = use_st
+        self.n_rows = n_rows
+        self.fingerprint = fingerprint
+        self.test_mask = test_mask
+        self.metrics = metrics
+        self.params = params
+        self.baseline_rmse = baseline_rmse
+        self.train_seconds = train_seconds
+        self.trained_rows = trained_rows
+        self.search = search
+        self.history = []
+
+
+def _columns(use_st):
+    return ["Re", "St"] if use_st else ["Re"]
+
+
+def _split_mask(n_rows):
+    """
+    Return the test rows of train_gbr's split of n_rows rows as a mask.
+    """
+    _, test_idx = train_test_split(np.arange(n_rows), test_size=TEST_SIZE,
+                                   random_state=RANDOM_STATE)
+    mask = np.zeros(n_rows, dtype=bool)
+    mask[test_idx] = True
+    return mask
+
+
+def train_state(df, use_st=True, search="halving", n_jobs=-1):
+    """
+    Train a model with the full train_gbr search and start its state.
+
+    Returns
+    state : ModelState
+    """
+    start = time.perf_counter()
+    model, metrics, params = train_gbr(df, use_st=use_st, search=search, n_jobs=n_jobs)
+    seconds = time.perf_counter() - start
+
+    return ModelState(model, use_st, len(df), data_fingerprint(df), _split_mask(len(df)),
+                      metrics, params, metrics["test_rmse"], seconds, len(df), search)
+
+
+def update_model(state, df, extra_trees=50, max_trees=600, drift_threshold=0.1, n_jobs=-1):
+    """
+    Bring a model up to date with the rows appended to its dataset.
+
+    Parameters
+    state : ModelState
+        State from train_state or an earlier update. It is updated in place.
+    df : pandas DataFrame
+        Current dataset, the training rows followed by the appended rows.
+    extra_trees : int
+        Boosting stages added per update.
+    max_trees : int
+        Tree budget of the model. An update that would exceed it retrains.
+    drift_threshold : float
+        Largest relative increase of the RMSE on the appended rows over the
+        baseline test RMSE that is still handled by an incremental update.
+        Twice the standard error of the RMSE on the new rows is added, so a
+        small batch of rows does not trigger a retrain by chance.
+    n_jobs : int
+        Number of parallel jobs of a full retrain.
+
+    Returns
+    state : ModelState
+        The same state object.
+    report : dictionary with the action taken ("unchanged", "updated" or
+             "retrained"), its reason, the row counts, the drift and its
+             standard error, the number of trees, the update time, the
+             estimated cold retrain time and the time saved
+
+    Raises
+    TypeError
+        When the model is not a GradientBoostingRegressor.
+    """
+    if not isinstance(state.model, GradientBoostingRegressor):
+        raise TypeError(f"Incremental updates need a GradientBoostingRegressor, "
+                        f"got {type(state.model).__name__}")
+
+    start = time.perf_counter()
+    n_old, n_total = state.n_rows, len(df)
+    cold_estimate = state.train_seconds * n_total / max(state.trained_rows, 1)
+    report = {"action": "unchanged", "reason": "", "old_rows": n_old,
+              "new_rows": n_total - n_old, "drift": 0.0, "drift_noise": 0.0,
+              "trees": int(state.model.n_estimators_)}
+
+    X = df[_columns(state.use_st)].values
+    y = df["Cd"].values
+
+    # 1. Only rows appended at the end can be used for an update
+    if n_total < n_old or data_fingerprint(df.iloc[:n_old]) != state.fingerprint:
+        reason = "training rows changed"
+    elif n_total == n_old:
+        report["reason"] = "no new rows"
+        report.update(update_s=0.0, cold_retrain_s=cold_estimate, saved_s=cold_estimate)
+        return state, report
+    else:
+        # 2. Error of the current model on the rows it has never seen
+        # A few new rows give a noisy RMSE, so its standard error is allowed for
+        sq = (y[n_old:] - state.model.predict(X[n_old:])) ** 2
+        mse = sq.mean()
+        report["drift"] = float(np.sqrt(mse) / state.baseline_rmse - 1.0)
+        report["drift_noise"] = float(sq.std() / (2 * mse * np.sqrt(len(sq)))) if mse > 0 else 0.0
+        trees = int(state.model.n_estimators_) + extra_trees
+
+        if report["drift"] > drift_threshold + 2 * report["drift_noise"]:
+            reason = f"RMSE on new rows drifted by {report['drift']:.1%}"
+        elif trees > max_trees:
+            reason = f"tree budget of {max_trees} reached"
+        else:
+            reason = None
+
+    # 3. Full search and refit on all rows
+    if reason is not None:
+        history = state.history
+        new_state = train_state(df, state.use_st, state.search, n_jobs)
+        state.__dict__.update(new_state.__dict__)
+        state.history = history
+        report.update(action="retrained", reason=reason, trees=int(state.model.n_estimators_),
+                      update_s=state.train_seconds, cold_retrain_s=state.train_seconds,
+                      saved_s=0.0)
+        state.history.append(report)
+        return state, report
+
+    # 4. Warm started stages on the residuals of all training rows
+    # New rows join the test set with the same probability as in train_gbr
+    rng = np.random.default_rng([RANDOM_STATE, n_old])
+    test_mask = np.concatenate([state.test_mask, rng.random(n_total - n_old) < TEST_SIZE])
+    train_mask = ~test_mask
+
+    model = state.model
+    model.set_params(warm_start=True, n_estimators=trees)
+    model.fit(X[train_mask], y[train_mask])
+    model.set_params(warm_start=False)
+
+    state.metrics = train_test_metrics(y[train_mask], model.predict(X[train_mask]),
+                                       y[test_mask], model.predict(X[test_mask]))
+    state.n_rows = n_total
+    state.fingerprint = data_fingerprint(df)
+    state.test_mask = test_mask
+
+    seconds = time.perf_counter() - start
+    report.update(action="updated", reason=f"added {extra_trees} trees", trees=trees,
+                  update_s=seconds, cold_retrain_s=cold_estimate,
+                  saved_s=cold_estimate - seconds)
+    state.history.append(report)
+    return state, report
+
+
+def main():
+    from src.data_loader import load_data
+    from src.predict_server import save_model, load_model
+
+    parser = argparse.ArgumentParser(description="Update a GBR model with appended rows")
+    parser.add_argument("--data", default=os.path.join("data", "vortex_data.csv"))
+    parser.add_argument("--state", default=os.path.join("results", "models", "gbr_re_st_state.pkl"),
+                        help="Model state file, created by a full training when missing")
+    parser.add_argument("--re-only", action="store_true", help="Use Re only instead of Re and St")
+    parser.add_argument("--extra-trees", type=int, default=50)
+    parser.add_argument("--max-trees", type=int, default=600)
+    parser.add_argument("--drift", type=float, default=0.1,
+                        help="Relative RMSE increase on new rows that triggers a full retrain")
+    parser.add_argument("--jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    df = load_data(args.data)
+    if not os.path.exists(args.state):
+        state = train_state(df, use_st=not args.re_only, n_jobs=args.jobs)
+        print(f"Trained a new model on {state.n_rows} rows in {state.train_seconds:.1f} s")
+    else:
+        state, report = update_model(load_model(args.state), df, args.extra_trees,
+                                     args.max_trees, args.drift, args.jobs)
+        print(f"{report['action'].capitalize()}: {report['reason']}")
+        print(f"Rows {report['old_rows']} + {report['new_rows']}, drift {report['drift']:.1%}, "
+              f"{report['trees']} trees")
+        print(f"Update {report['update_s']:.2f} s, cold retrain about "
+              f"{report['cold_retrain_s']:.1f} s, saved {report['saved_s']:.1f} s")
+
+    save_model(state, args.state)
+    print(f"Test R2 {state.metrics['test_r2']:.4f}, test RMSE {state.metrics['test_rmse']:.4f}")
+
+
+if __name__ == "__main__":
+    # python -m runs this file as __main__. Run main of the imported package
+    # module instead, so saved states refer to src.model_update.ModelState
+    # and load in any process that imports src.model_update.
+    import importlib
+
+    importlib.import_module("src.model_update").main()
@@ -0,0 +1,294 @@
+"""
+pipeline.py
+
+This file runs the analysis as a dependency graph of named stages.
+
+It performs the following tasks.
+1. Describe every stage by its function, the stages it takes as inputs,
+   its parameters, the files it writes and the code it depends on.
+2. Fingerprint a stage from its parameters, the source code of its function
+   and modules, and the fingerprints of its inputs. A change anywhere
+   upstream therefore changes the fingerprint of every stage below it.
+3. Store stage results in the artifact cache under their fingerprint and
+   reuse them while the fingerprint is unchanged and the declared output
+   files still exist.
+4. Run stages whose inputs are ready concurrently in a thread pool.
+5. Run only a chosen subset of stages together with the stages they need.
+6. Measure every stage with profiling.py and optionally run executed
+   stages under cProfile.
+7. With a ResourceScheduler, lease each stage its cores before it runs,
+   so concurrent stages share one core budget. The time a stage waits for
+   its cores is reported apart from its run time.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import nullcontext
+
+from src.profiling import PROFILER, span, profile_call
+
+
+def _source(obj):
+    """
+    Return the source code of obj, or its repr when no source is available.
+    """
+    try:
+        return inspect.getsource(obj)
+    except (OSError, TypeError):
+        return repr(obj)
+
+
+class Stage:
+    """
+    One named step of a Pipeline.
+
+    The stage function is called with the results of the input stages as
+    positional arguments, in the order of inputs, followed by params as
+    keyword arguments. Stages that declare workers also receive the number
+    of cores they were given as the keyword argument n_jobs. The function
+    must not return None.
+    """
+
+    def __init__(self, name, func, inputs=(), params=None, outputs=(), code=(),
+                 cache=True, fingerprint=None, workers=None):
+        """
+        Parameters
+        name : str
+            Unique stage name.
+        func : callable
+            Function computing the stage result.
+        inputs : sequence of str
+            Names of the stages whose results are passed to func.
+        params : dict or None
+            Keyword arguments of func, part of the fingerprint.
+        outputs : sequence of str
+            Files written by the stage. A cached result is only reused when
+            all of them exist.
+        code : sequence of callables
+            Functions or classes the stage relies on. The source of the module
+            defining each one is part of the fingerprint.
+        cache : bool
+            Store the result in the artifact cache. Uncached stages always run.
+        fingerprint : callable or None
+            For stages without inputs that read external data, a function of
+            the result returning a content hash used as the fingerprint.
+        workers : int or None
+            Cores the stage can use in parallel. The granted number is passed
+            as n_jobs and is not part of the fingerprint. None for stages
+            that run on one core.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = dict(params or {})
+        self.outputs = tuple(outputs)
+        self.code = tuple(code)
+        self.cache = cache
+        self.fingerprint = fingerprint
+        self.workers = workers
+
+    def code_hash(self):
+        """
+        Return a hash of the stage function and the modules it depends on.
+        """
+        h = hashlib.sha256(_source(self.func).encode())
+        modules = sorted({obj.__module__ for obj in self.code})
+        for name in modules:
+            h.update(name.encode())
+            h.update(_source(sys.modules[name]).encode())
+        return h.hexdigest()
+
+
+class Pipeline:
+    """
+    Dependency graph of stages with cached, incremental execution.
+
+    After run, report holds the status ("ran" or "cached"), the time, the
+    time spent waiting for cores and the fingerprint of every executed stage. With profile=True, profiles maps
+    every stage that ran to its cProfile pstats.Stats.
+    """
+
+    def __init__(self, stages, cache, max_workers=4, profile=False, scheduler=None):
+        """
+        Parameters
+        stages : sequence of Stage
+        cache : ArtifactCache
+            Store for stage results.
+        max_workers : int
+            Largest number of stages running at the same time.
+        profile : bool
+            Run every stage that is not cached under cProfile.
+        scheduler : ResourceScheduler or None
+            Core budget shared by the stages. Each stage leases its workers,
+            or one core, while it runs.
+
+        Raises
+        ValueError
+            When stage names repeat, an input is unknown or the graph has a cycle.
+        """
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage name: {stage.name}")
+            self.stages[stage.name] = stage
+
+        for stage in stages:
+            for name in stage.inputs:
+                if name not in self.stages:
+                    raise ValueError(f"Stage {stage.name} needs unknown stage {name}")
+
+        self.cache = cache
+        self.max_workers = max_workers
+        self.profile = profile
+        self.scheduler = scheduler
+        self.report = []
+        self.profiles = {}
+        self._lock = threading.Lock()
+        self.order = self._topological_order()
+
+    def _topological_order(self):
+        order = []
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError("Stage graph has a cycle: " + " -> ".join(path + [name]))
+            state[name] = "visiting"
+            for dep in self.stages[name].inputs:
+                visit(dep, path + [name])
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    def select(self, targets=None):
+        """
+        Return the names of the target stages and all their upstream stages,
+        in execution order. All stages are selected when targets is None.
+
+        Raises
+        ValueError
+            When a target is not a stage of the pipeline.
+        """
+        if targets is None:
+            return list(self.order)
+
+        needed = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in self.stages:
+                raise ValueError(f"Unknown stage: {name}")
+            if name not in needed:
+                needed.add(name)
+                stack.extend(self.stages[name].inputs)
+        return [name for name in self.order if name in needed]
+
+    def _fingerprint(self, stage, input_fps):
+        parts = {
+            "stage": stage.name,
+            "params": stage.params,
+            "code": stage.code_hash(),
+            "inputs": input_fps,
+        }
+        text = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _execute(self, stage, args, input_fps, force):
+        start = time.perf_counter()
+        fp = self._fingerprint(stage, input_fps)
+        key = self.cache.key(stage=stage.name, fingerprint=fp)
+
+        # 1. Reuse the stored result when nothing upstream has changed
+        if stage.cache and stage.name not in force:
+            with self._lock:
+                result = self.cache.load(key)
+            if result is not None and all(os.path.exists(p) for p in stage.outputs):
+                seconds = time.perf_counter() - start
+                PROFILER.add(stage.name, seconds)
+                return result, fp, "cached", seconds, 0.0
+
+        # 2. Otherwise wait for the cores of the stage, then run it and store
+        # its result. The wait is reported apart from the run time.
+        wait_start = time.perf_counter()
+        with self._lease(stage) as n_jobs:
+            wait_s = time.perf_counter() - wait_start
+            with span(stage.name):
+                start = time.perf_counter()
+                result = self._call(stage, args, n_jobs)
+                if stage.fingerprint is not None:
+                    fp = hashlib.sha256((fp + stage.fingerprint(result)).encode()).hexdigest()
+                if stage.cache:
+                    with self._lock:
+                        self.cache.save(key, result)
+                seconds = time.perf_counter() - start
+        return result, fp, "ran", seconds, wait_s
+
+    def _lease(self, stage):
+        if self.scheduler is None:
+            return nullcontext(stage.workers)
+        return self.scheduler.lease(stage.workers or 1, stage.name)
+
+    def _call(self, stage, args, n_jobs):
+        kwargs = dict(stage.params)
+        if stage.workers is not None:
+            kwargs["n_jobs"] = n_jobs
+        if self.profile:
+            result, self.profiles[stage.name] = profile_call(stage.func, *args, **kwargs)
+            return result
+        return stage.func(*args, **kwargs)
+
+    def run(self, targets=None, force=()):
+        """
+        Run the selected stages, reusing cached results where possible.
+
+        Parameters
+        targets : sequence of str or None
+            Stages to bring up to date, with the stages they depend on.
+            None runs the whole pipeline.
+        force : sequence of str
+            Stages that run even when a cached result is available.
+
+        Returns
+        results : dict mapping stage name to its result
+        """
+        selected = self.select(targets)
+        force = set(force)
+        results, fps = {}, {}
+        self.report = []
+        self.profiles = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            waiting = list(selected)
+            running = {}
+            while waiting or running:
+                # Start every stage whose inputs are ready
+                for name in list(waiting):
+                    stage = self.stages[name]
+                    if all(dep in results for dep in stage.inputs):
+                        args = [results[dep] for dep in stage.inputs]
+                        input_fps = [fps[dep] for dep in stage.inputs]
+                        running[pool.submit(self._execute, stage, args, input_fps, force)] = name
+                        waiting.remove(name)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    result, fp, status, seconds, wait_s = future.result()
+                    results[name] = result
+                    fps[name] = fp
+                    self.report.append({"stage": name, "status": status, "seconds": seconds,
+                                        "wait_s": wait_s, "fingerprint": fp})
+
+        self.report.sort(key=lambda r: selected.index(r["stage"]))
+        return results
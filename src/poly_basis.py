@@ -0,0 +1,174 @@
+"""
+poly_basis.py
+
+This file fits polynomial models of every degree up to max_degree at once
+using a scaled Chebyshev basis.
+
+It performs the following tasks.
+1. Scale Re to the interval [-1, 1] and build one Chebyshev basis matrix
+   up to max_degree.
+2. Factorize the basis matrix once with QR. Because the columns are nested,
+   the least squares coefficients of every lower degree come from the
+   leading block of the same factorization.
+3. Alternatively accumulate X^T X and X^T y chunk by chunk, so data that
+   does not fit in memory can be used.
+4. Evaluate a fitted degree with the Clenshaw recurrence, the Chebyshev
+   form of Horner's rule.
+
+The Chebyshev basis stays well conditioned for high degrees, unlike the raw
+powers of Re that reach 5000^5 at degree 5.
+"""
+
+import numpy as np
+
+
+def chebyshev_basis(t, max_degree):
+    """
+    Return the matrix [T0(t), T1(t), ..., Tmax(t)] for scaled values t.
+    """
+    t = np.asarray(t, dtype=np.float64)
+    V = np.empty((len(t), max_degree + 1))
+    V[:, 0] = 1.0
+    if max_degree >= 1:
+        V[:, 1] = t
+    for k in range(2, max_degree + 1):
+        V[:, k] = 2.0 * t * V[:, k - 1] - V[:, k - 2]
+    return V
+
+
+def clenshaw(t, coef):
+    """
+    Evaluate sum coef[k] * Tk(t) with the Clenshaw recurrence.
+    """
+    b1 = np.zeros_like(t)
+    b2 = np.zeros_like(t)
+    for c in coef[:0:-1]:
+        b1, b2 = c + 2.0 * t * b1 - b2, b1
+    return coef[0] + t * b1 - b2
+
+
+class ChebyshevFamily:
+    """
+    Least squares Chebyshev fits for all degrees from 1 to max_degree.
+
+    Use fit for in-memory data, or partial_fit on chunks followed by
+    finalize for streamed data. coefs[d] holds the coefficients of degree d.
+    """
+
+    def __init__(self, max_degree=5, domain=None):
+        """
+        Parameters
+        max_degree : int
+            Highest polynomial degree.
+        domain : tuple of float or None
+            Range of Re mapped to [-1, 1]. Taken from the data in fit when
+            None. Must be given for partial_fit.
+        """
+        self.max_degree = max_degree
+        self.domain = domain
+        self.coefs = {}
+        self._gram = None
+        self._rhs = None
+
+    def scale(self, x):
+        lo, hi = self.domain
+        return (2.0 * np.asarray(x, dtype=np.float64).ravel() - (lo + hi)) / (hi - lo)
+
+    def basis(self, x, degree=None):
+        """
+        Return the Chebyshev basis of x up to degree, default max_degree.
+        """
+        return chebyshev_basis(self.scale(x), self.max_degree if degree is None else degree)
+
+    def fit(self, x, y):
+        """
+        Fit every degree from one QR factorization of the basis matrix.
+        """
+        x = np.asarray(x, dtype=np.float64).ravel()
+        if self.domain is None:
+            self.domain = (float(x.min()), float(x.max()))
+
+        Q, R = np.linalg.qr(self.basis(x))
+        qty = Q.T @ np.asarray(y, dtype=np.float64)
+
+        for d in range(1, self.max_degree + 1):
+            self.coefs[d] = np.linalg.solve(R[:d + 1, :d + 1], qty[:d + 1])
+        return self
+
+    def partial_fit(self, x, y):
+        """
+        Add a chunk of data to the accumulated normal equations.
+        """
+        if self.domain is None:
+            raise ValueError("domain must be set before partial_fit")
+
+        V = self.basis(x)
+        y = np.asarray(y, dtype=np.float64)
+        if self._gram is None:
+            self._gram = np.zeros((self.max_degree + 1, self.max_degree + 1))
+            self._rhs = np.zeros(self.max_degree + 1)
+        self._gram += V.T @ V
+        self._rhs += V.T @ y
+        return self
+
+    def finalize(self):
+        """
+        Solve every degree from the accumulated normal equations.
+        """
+        if self._gram is None:
+            raise ValueError("partial_fit must be called before finalize")
+        for d in range(1, self.max_degree + 1):
+            self.coefs[d] = np.linalg.solve(self._gram[:d + 1, :d + 1], self._rhs[:d + 1])
+        return self
+
+    def predict(self, x, degree):
+        """
+        Evaluate the fitted polynomial of the given degree at Re values x.
+        """
+        return clenshaw(self.scale(x), self.coefs[degree])
+
+    def model(self, degree):
+        """
+        Return the (model, basis) pair for one degree, see ChebyshevModel.
+        """
+        return ChebyshevModel(self, degree), ChebyshevBasis(self, degree)
+
+
+class ChebyshevBasis:
+    """
+    Feature transformer for one degree, used like PolynomialFeatures.
+    """
+
+    def __init__(self, family, degree):
+        self.family = family
+        self.degree = degree
+
+    def transform(self, X):
+        x = np.asarray(X, dtype=np.float64)
+        if x.ndim == 2:
+            x = x[:, 0]
+        return self.family.basis(x, self.degree)
+
+    def fit_transform(self, X):
+        return self.transform(X)
+
+
+class ChebyshevModel:
+    """
+    Fitted polynomial of one degree, used like LinearRegression.
+
+    predict takes the output of ChebyshevBasis.transform, so
+    model.predict(basis.transform(df[["Re"]])) works as with sklearn.
+    predict_re evaluates directly from Re values with the Clenshaw recurrence.
+    """
+
+    def __init__(self, family, degree):
+        self.family = family
+        self.degree = degree
+        self.coef_ = family.coefs[degree]
+
+    def predict(self, V):
+        return np.asarray(V) @ self.coef_
+
+    def predict_re(self, x):
+        return self.family.predict(x, self.degree)
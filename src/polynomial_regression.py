@@ -9,17 +9,27 @@ It performs the following tasks.
 3. Compute metrics for each degree.
 4. Select the degree with highest test R2 score.
 5. Return the best model, best polynomial transformer and all results.
+
+With engine="chebyshev" all degrees are solved from one factorization of
+a scaled Chebyshev basis, see poly_basis.py. The fitted ChebyshevFamily is
+available as best_model.family so plots can reuse it without refitting.
 """
 
-import numpy as np
 import pandas as pd
 from sklearn.preprocessing import PolynomialFeatures
 from sklearn.linear_model import LinearRegression
-from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
 from sklearn.model_selection import train_test_split
 
+from src.metrics import train_test_metrics
+from src.poly_basis import ChebyshevFamily
+
+
+# Train test split settings
+TEST_SIZE = 0.2
+RANDOM_STATE = 42
+
 
-def polynomial_regression(df, max_degree=5):
+def polynomial_regression(df, max_degree=5, engine="sklearn"):
     """
     Train polynomial regression models of different degrees.
 
@@ -28,20 +38,26 @@ def polynomial_regression(df, max_degree=5):
         Dataset with Re and Cd.
     max_degree : int
         Highest polynomial degree to be tested.
+    engine : str
+        "sklearn" fits PolynomialFeatures and LinearRegression per degree.
+        "chebyshev" fits every degree from one QR factorization.
 
     Returns
-    best_model : LinearRegression model for best degree
-    best_poly_obj : PolynomialFeatures object for best degree
+    best_model : LinearRegression or ChebyshevModel for best degree
+    best_poly_obj : PolynomialFeatures or ChebyshevBasis for best degree
     all_results : dictionary containing metrics for each degree
     """
 
+    if engine not in ("sklearn", "chebyshev"):
+        raise ValueError(f"Unknown polynomial engine: {engine}")
+
     # 1. Select input and output variables
     X = df[["Re"]].values
     y = df["Cd"].values
 
     # 2. Split data into train and test sets
     X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
+        X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE
     )
 
     results = {}
@@ -49,6 +65,22 @@ def polynomial_regression(df, max_degree=5):
     best_model = None
     best_poly_obj = None
 
+    if engine == "chebyshev":
+        family = ChebyshevFamily(max_degree).fit(X_train, y_train)
+        V_train = family.basis(X_train)
+        V_test = family.basis(X_test)
+
+        for deg in range(1, max_degree + 1):
+            c = family.coefs[deg]
+            results[deg] = train_test_metrics(
+                y_train, V_train[:, :deg + 1] @ c, y_test, V_test[:, :deg + 1] @ c
+            )
+            if results[deg]["test_r2"] > best_score:
+                best_score = results[deg]["test_r2"]
+                best_model, best_poly_obj = family.model(deg)
+
+        return best_model, best_poly_obj, results
+
     # 3. Loop through polynomial degrees
     for deg in range(1, max_degree + 1):
 
@@ -65,25 +97,11 @@ def polynomial_regression(df, max_degree=5):
         y_test_pred = model.predict(X_test_poly)
 
         # 5. Compute metrics for this degree
-        train_r2 = r2_score(y_train, y_train_pred)
-        test_r2  = r2_score(y_test, y_test_pred)
-        train_rmse = np.sqrt(mean_squared_error(y_train, y_train_pred))
-        test_rmse  = np.sqrt(mean_squared_error(y_test, y_test_pred))
-        train_mae = mean_absolute_error(y_train, y_train_pred)
-        test_mae  = mean_absolute_error(y_test, y_test_pred)
-
-        results[deg] = {
-            "train_r2": train_r2,
-            "test_r2": test_r2,
-            "train_rmse": train_rmse,
-            "test_rmse": test_rmse,
-            "train_mae": train_mae,
-            "test_mae": test_mae,
-        }
+        results[deg] = train_test_metrics(y_train, y_train_pred, y_test, y_test_pred)
 
         # 6. Track best model based on test R2
-        if test_r2 > best_score:
-            best_score = test_r2
+        if results[deg]["test_r2"] > best_score:
+            best_score = results[deg]["test_r2"]
             best_model = model
             best_poly_obj = poly
 
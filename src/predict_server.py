@@ -0,0 +1,311 @@
+"""
+predict_server.py
+
+This file runs a long lived Cd prediction service for the GBR Re St model.
+
+It performs the following tasks.
+1. Load a trained Re and St model once at start up.
+2. Serve HTTP requests on a TCP port or on a Unix socket using asyncio.
+3. Accept a single point {"Re": ..., "St": ...} or a batch {"rows": [[Re, St], ...]}.
+4. Collect requests that arrive within a short time window and answer them
+   with one vectorized predict call.
+5. Report throughput and p50 / p99 latency on GET /stats.
+
+Start the service with
+python -m src.predict_server --model results/models/gbr_re_st.pkl --port 8765
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import os
+import pickle
+import time
+
+import numpy as np
+
+
+def save_model(model, path):
+    """
+    Save a trained model so the prediction service can load it.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "wb") as f:
+        pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def load_model(path):
+    """
+    Load a model written by save_model, a compiled FlatForest npz file
+    or a CdLookupTable npz file.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model not found at: {path}")
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            is_table = "kind" in data and str(data["kind"]) == "cd_table"
+        if is_table:
+            from src.surrogate_table import CdLookupTable
+            return CdLookupTable.load(path)
+        from src.tree_engine import FlatForest
+        return FlatForest.load(path)
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def parse_rows(payload):
+    """
+    Convert a request body into an (n, 2) array of Re and St values.
+
+    Raises
+    ValueError
+        When the body does not contain valid Re and St values.
+    """
+    if "rows" in payload:
+        rows = np.asarray(payload["rows"], dtype=np.float64)
+    elif "Re" in payload and "St" in payload:
+        rows = np.array([[payload["Re"], payload["St"]]], dtype=np.float64)
+    else:
+        raise ValueError('Body must contain "Re" and "St" or "rows"')
+
+    if rows.ndim != 2 or rows.shape[1] != 2 or len(rows) == 0:
+        raise ValueError("rows must be a non empty list of [Re, St] pairs")
+    if not np.isfinite(rows).all():
+        raise ValueError("Re and St must be finite numbers")
+
+    return rows
+
+
+class LatencyStats:
+    """
+    Running request statistics for the service.
+    """
+
+    def __init__(self, window=100000):
+        self.latencies = collections.deque(maxlen=window)
+        self.started = time.perf_counter()
+        self.requests = 0
+        self.rows = 0
+        self.batches = 0
+
+    def record_request(self, n_rows, seconds):
+        self.requests += 1
+        self.rows += n_rows
+        self.latencies.append(seconds)
+
+    def summary(self):
+        """
+        Return throughput and latency percentiles as a dictionary.
+        """
+        elapsed = time.perf_counter() - self.started
+        lat = np.array(self.latencies) * 1000.0
+        return {
+            "requests": self.requests,
+            "rows": self.rows,
+            "batches": self.batches,
+            "mean_batch_rows": self.rows / self.batches if self.batches else 0.0,
+            "requests_per_s": self.requests / elapsed if elapsed > 0 else 0.0,
+            "rows_per_s": self.rows / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": float(np.percentile(lat, 50)) if len(lat) else 0.0,
+            "p99_ms": float(np.percentile(lat, 99)) if len(lat) else 0.0,
+        }
+
+
+class PredictionBatcher:
+    """
+    Coalesce concurrent prediction requests into vectorized predict calls.
+
+    Requests are queued. The batching task takes the first waiting request,
+    keeps collecting requests for at most max_delay seconds or until
+    max_rows rows are waiting, then runs one predict call for all of them.
+    """
+
+    def __init__(self, model, stats, max_delay=0.002, max_rows=65536):
+        self.model = model
+        self.stats = stats
+        self.max_delay = max_delay
+        self.max_rows = max_rows
+        self.queue = asyncio.Queue()
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+
+    async def predict(self, rows):
+        """
+        Queue rows for prediction and wait for the result.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = loop.time() + self.max_delay
+
+            # Collect more requests until the window closes or the batch is full
+            while n_rows < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                n_rows += len(item[0])
+
+            X = np.concatenate([rows for rows, _ in batch])
+            try:
+                y = self.model.predict(X)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+
+            self.stats.batches += 1
+            start = 0
+            for rows, future in batch:
+                if not future.done():
+                    future.set_result(y[start:start + len(rows)])
+                start += len(rows)
+
+
+class PredictionServer:
+    """
+    Minimal HTTP/1.1 server around a PredictionBatcher.
+
+    Routes
+    POST /predict : body {"Re": ..., "St": ...} or {"rows": [[Re, St], ...]}
+    GET /stats : throughput and latency summary
+    GET /health : liveness check
+    """
+
+    def __init__(self, model, max_delay=0.002, max_rows=65536):
+        self.stats = LatencyStats()
+        self.batcher = PredictionBatcher(model, self.stats, max_delay, max_rows)
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=8765, unix_path=None):
+        """
+        Start listening. Returns the bound (host, port) or the socket path.
+        """
+        self.batcher.start()
+        if unix_path is not None:
+            self.server = await asyncio.start_unix_server(self._handle, path=unix_path)
+            return unix_path
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        await self.batcher.stop()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get("content-length", 0))
+                body = await reader.readexactly(length) if length else b""
+
+                status, reply = await self._route(method, target, body)
+                data = json.dumps(reply).encode()
+                writer.write(
+                    f"HTTP/1.1 {status}\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+
+                if headers.get("connection", "").lower() == "close":
+                    break
+
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _route(self, method, target, body):
+        if method == "GET" and target == "/health":
+            return "200 OK", {"status": "ok"}
+        if method == "GET" and target == "/stats":
+            return "200 OK", self.stats.summary()
+        if method != "POST" or target != "/predict":
+            return "404 Not Found", {"error": f"No route for {method} {target}"}
+
+        start = time.perf_counter()
+        try:
+            rows = parse_rows(json.loads(body))
+        except (ValueError, TypeError) as exc:
+            return "400 Bad Request", {"error": str(exc)}
+
+        # A failed predict call is answered, the connection stays usable
+        try:
+            Cd = await self.batcher.predict(rows)
+        except Exception as exc:
+            return "500 Internal Server Error", {"error": str(exc)}
+        self.stats.record_request(len(rows), time.perf_counter() - start)
+        return "200 OK", {"Cd": Cd.tolist()}
+
+
+async def serve(model, host="127.0.0.1", port=8765, unix_path=None,
+                max_delay=0.002, max_rows=65536):
+    """
+    Run the prediction service until it is cancelled.
+    """
+    server = PredictionServer(model, max_delay, max_rows)
+    address = await server.start(host, port, unix_path)
+    print("Cd prediction service listening on", address)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cd prediction service")
+    parser.add_argument("--model", default=os.path.join("results", "models", "gbr_re_st.pkl"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None, help="Serve on this Unix socket path instead of TCP")
+    parser.add_argument("--max-delay-ms", type=float, default=2.0)
+    parser.add_argument("--max-rows", type=int, default=65536)
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    try:
+        asyncio.run(serve(model, args.host, args.port, args.unix,
+                          args.max_delay_ms / 1000.0, args.max_rows))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+profiling.py
+
+This file records where the pipeline spends its time and memory.
+
+It performs the following tasks.
+1. Time named spans and record the wall time, the CPU time of the running
+   thread, the peak resident memory of the process and a row count.
+2. Nest spans per thread, so a stage is broken down into its steps, for
+   example gbr_re/train_gbr/search, refit and predict.
+3. Collect measurements made in worker processes, such as rendered figures.
+4. Write the run report as JSON and CSV files.
+5. Profile a function call with cProfile and write its hottest functions.
+6. Measure the proportional memory of a process, which splits shared pages
+   between the processes that map them.
+
+Library code uses the shared PROFILER through span, for example
+with span("search", rows=len(X_train)):
+    ...
+"""
+
+import cProfile
+import csv
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is then not reported
+    resource = None
+
+
+REPORT_FIELDS = ["span", "wall_s", "cpu_s", "peak_rss_mb", "rss_growth_mb", "rows"]
+
+
+def peak_rss_mb():
+    """
+    Return the peak resident memory of the current process in MB, or None.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def pss_mb(pid=None):
+    """
+    Return the proportional set size of a process in MB, or None.
+
+    Pages shared by several processes, such as a memory mapped file, are
+    split between them, so the PSS of a group of processes adds up to the
+    physical memory they use. Only available on Linux.
+    """
+    path = f"/proc/{pid or 'self'}/smaps_rollup"
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        return None
+    return None
+
+
+class RunProfiler:
+    """
+    Collects span measurements for one pipeline run.
+
+    Spans opened in the same thread nest, and their names are joined with
+    "/" into a path. Spans in different threads are independent.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def path(self, name):
+        """
+        Return the full span path of name inside the currently open spans.
+        """
+        return "/".join(self._stack() + [name])
+
+    @contextmanager
+    def span(self, name, rows=None):
+        """
+        Measure the enclosed block.
+
+        The yielded dictionary is the record, so rows can be filled in once
+        they are known, for example record["rows"] = len(df).
+        """
+        record = {"span": self.path(name), "rows": rows}
+        stack = self._stack()
+        stack.append(name)
+
+        rss_start = peak_rss_mb()
+        cpu_start = time.thread_time()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["wall_s"] = time.perf_counter() - start
+            record["cpu_s"] = time.thread_time() - cpu_start
+            record["peak_rss_mb"] = peak_rss_mb()
+            record["rss_growth_mb"] = (record["peak_rss_mb"] - rss_start
+                                       if rss_start is not None else None)
+            stack.pop()
+            with self._lock:
+                self.records.append(record)
+
+    def add(self, name, wall_s, cpu_s=None, peak_rss_mb=None, rows=None):
+        """
+        Add a measurement taken elsewhere, such as in a worker process.
+        """
+        record = {"span": self.path(name), "wall_s": wall_s, "cpu_s": cpu_s,
+                  "peak_rss_mb": peak_rss_mb, "rss_growth_mb": None, "rows": rows}
+        with self._lock:
+            self.records.append(record)
+
+    def clear(self):
+        with self._lock:
+            self.records = []
+
+    def report(self):
+        """
+        Return the records ordered by span path.
+        """
+        with self._lock:
+            return sorted(self.records, key=lambda r: r["span"])
+
+    def write(self, save_dir, name="run_report"):
+        """
+        Write the records to name.json and name.csv in save_dir.
+
+        Returns
+        paths : tuple with the JSON and CSV file paths
+        """
+        os.makedirs(save_dir, exist_ok=True)
+        records = self.report()
+
+        json_path = os.path.join(save_dir, name + ".json")
+        with open(json_path, "w") as f:
+            json.dump({"created": time.time(), "spans": records}, f, indent=2)
+
+        csv_path = os.path.join(save_dir, name + ".csv")
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+            writer.writeheader()
+            writer.writerows(records)
+
+        return json_path, csv_path
+
+
+# Shared profiler used by the pipeline modules
+PROFILER = RunProfiler()
+
+
+def span(name, rows=None):
+    """
+    Open a span on the shared PROFILER.
+    """
+    return PROFILER.span(name, rows)
+
+
+def profile_call(func, *args, **kwargs):
+    """
+    Call func under cProfile.
+
+    Only the calling thread is profiled.
+
+    Returns
+    result : return value of func
+    stats : pstats.Stats of the call
+    """
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args, **kwargs)
+    return result, pstats.Stats(profiler)
+
+
+def write_profile(stats, path_prefix, top=30):
+    """
+    Save cProfile stats as path_prefix.prof and the top functions by
+    cumulative time as path_prefix.txt.
+
+    Returns
+    paths : tuple with the .prof and .txt file paths
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path_prefix)), exist_ok=True)
+    stats.dump_stats(path_prefix + ".prof")
+
+    text = io.StringIO()
+    pstats.Stats(path_prefix + ".prof", stream=text).sort_stats("cumulative").print_stats(top)
+    with open(path_prefix + ".txt", "w") as f:
+        f.write(text.getvalue())
+
+    return path_prefix + ".prof", path_prefix + ".txt"
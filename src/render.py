@@ -0,0 +1,90 @@
+"""
+render.py
+
+This file renders independent figures in parallel.
+
+It performs the following tasks.
+1. Take a list of plot jobs, each a plotting function with its arguments.
+2. Send the jobs to a pool of worker processes that use the Agg backend.
+3. Return the wall time, CPU time, peak memory and output file size of
+   every figure, and add them to the run report of profiling.py.
+
+Each plotting function must create, save and close its own figure, as the
+functions in visualization.py and eda.py do.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.profiling import span, peak_rss_mb, PROFILER
+
+
+def _init_worker():
+    # Non interactive backend, no display is needed in the workers
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+
+
+def _run_job(name, func, args, kwargs, save_path):
+    start = time.perf_counter()
+    cpu_start = time.thread_time()
+    func(*args, **kwargs)
+    seconds = time.perf_counter() - start
+    size = os.path.getsize(save_path) if save_path and os.path.exists(save_path) else 0
+    return {"figure": name, "seconds": seconds, "bytes": size,
+            "cpu_s": time.thread_time() - cpu_start, "peak_rss_mb": peak_rss_mb()}
+
+
+def plot_job(name, func, *args, save_path=None, **kwargs):
+    """
+    Describe one figure to render.
+
+    Parameters
+    name : str
+        Label used in the timing report.
+    func : callable
+        Module level plotting function, it must be picklable.
+    args, kwargs :
+        Arguments passed to func.
+    save_path : str or None
+        Output file, used to report the file size. When given it is also
+        passed to func as its last positional argument.
+    """
+    if save_path is not None:
+        args = args + (save_path,)
+    return (name, func, args, kwargs, save_path)
+
+
+def render_figures(jobs, n_workers=None):
+    """
+    Render plot jobs, in parallel when more than one worker is used.
+
+    Parameters
+    jobs : list
+        Jobs built with plot_job.
+    n_workers : int or None
+        Number of worker processes. Defaults to one per CPU, at most one per
+        job. With 1 the jobs run in the current process.
+
+    Returns
+    report : list of dictionaries with figure name, seconds, bytes, CPU
+             seconds and peak memory of the rendering process, in the
+             order of jobs
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    n_workers = max(1, min(n_workers, len(jobs)))
+
+    with span("render_figures"):
+        if n_workers == 1:
+            report = [_run_job(*job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker) as pool:
+                futures = [pool.submit(_run_job, *job) for job in jobs]
+                report = [f.result() for f in futures]
+
+        for r in report:
+            PROFILER.add(r["figure"], r["seconds"], r["cpu_s"], r["peak_rss_mb"])
+
+    return report
@@ -0,0 +1,190 @@
+"""
+results_store.py
+
+This file keeps per row model outputs in a columnar store on disk instead of
+adding columns to the working dataframe.
+
+It performs the following tasks.
+1. Hold one .npy file per column in a folder, together with a meta.json file
+   with the number of rows, the column types and a key of the dataset the
+   rows belong to. Row i of every column belongs to row i of the dataset.
+2. Compute a column chunk by chunk from input arrays and write each chunk
+   straight into the memory mapped file, so only one chunk is in memory.
+   Predictions are stored as float32, which keeps about seven significant
+   digits, far more than the noise of the measured Cd.
+3. Open columns with memory mapping and combine them into a dataframe that
+   shares their memory, for plots and metrics.
+4. Compute metrics of a stored column against a target column in chunks.
+
+A store object only holds its folder and meta data, so it is cheap to send
+to worker processes, which open the columns themselves.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from src.metrics import MetricAccumulator
+
+
+# Bump when the layout of a store folder changes
+STORE_FORMAT = 1
+
+
+class ResultsStore:
+    """
+    Folder of memory mapped result columns keyed by row number.
+
+    Create one with ResultsStore.create and open an existing one with
+    ResultsStore.open.
+    """
+
+    def __init__(self, folder, meta):
+        self.folder = folder
+        self.meta = meta
+
+    @property
+    def n_rows(self):
+        return self.meta["rows"]
+
+    @property
+    def columns(self):
+        return list(self.meta["columns"])
+
+    def _path(self, name):
+        return os.path.join(self.folder, f"{name}.npy")
+
+    def _save_meta(self):
+        tmp_path = os.path.join(self.folder, "meta.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(tmp_path, os.path.join(self.folder, "meta.json"))
+
+    @classmethod
+    def create(cls, folder, n_rows, key=None):
+        """
+        Start an empty store for n_rows rows. Columns of an earlier store in
+        the same folder are removed.
+
+        Parameters
+        folder : str
+        n_rows : int
+            Number of rows of the dataset.
+        key : str or None
+            Identifies the dataset, for example its data_fingerprint.
+        """
+        os.makedirs(folder, exist_ok=True)
+        meta_path = os.path.join(folder, "meta.json")
+        if os.path.exists(meta_path):
+            old = cls.open(folder)
+            for name in old.columns:
+                if os.path.exists(old._path(name)):
+                    os.remove(old._path(name))
+
+        store = cls(folder, {"format": STORE_FORMAT, "rows": int(n_rows), "key": key,
+                             "columns": {}})
+        store._save_meta()
+        return store
+
+    @classmethod
+    def open(cls, folder):
+        """
+        Open an existing store.
+
+        Raises
+        ValueError
+            When the folder is not a store or has another format.
+        """
+        meta_path = os.path.join(folder, "meta.json")
+        if not os.path.exists(meta_path):
+            raise ValueError(f"Not a results store: {folder}")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get("format") != STORE_FORMAT:
+            raise ValueError(f"Unsupported results store format in {folder}")
+        return cls(folder, meta)
+
+    def write(self, name, func, inputs, chunksize=1000000, dtype="float32"):
+        """
+        Compute a column chunk by chunk and write it to the store.
+
+        Parameters
+        name : str
+            Column name.
+        func : callable
+            Takes a chunk of inputs and returns the column values of its rows.
+        inputs : array like of shape (n_rows, ...)
+            Rows passed to func, for example a memory mapped data column.
+        chunksize : int
+            Rows per chunk.
+        dtype : str
+            Stored type, float32 for predictions and float64 for exact copies.
+
+        Raises
+        ValueError
+            When inputs does not have one row per store row.
+        """
+        if len(inputs) != self.n_rows:
+            raise ValueError(f"Store has {self.n_rows} rows but inputs has {len(inputs)}")
+
+        out = np.lib.format.open_memmap(self._path(name), mode="w+", dtype=dtype,
+                                        shape=(self.n_rows,))
+        for start in range(0, self.n_rows, chunksize):
+            stop = min(start + chunksize, self.n_rows)
+            out[start:stop] = func(inputs[start:stop])
+        out.flush()
+        del out
+
+        self.meta["columns"][name] = np.dtype(dtype).name
+        self._save_meta()
+
+    def column(self, name):
+        """
+        Return a read only memory mapped column.
+
+        Raises
+        KeyError
+            When the column is not in the store.
+        """
+        if name not in self.meta["columns"]:
+            raise KeyError(f"Column {name} is not in the results store")
+        return np.load(self._path(name), mmap_mode="r")
+
+    def frame(self, columns=None):
+        """
+        Return a dataframe of the given columns that shares their memory maps.
+        """
+        import pandas as pd
+
+        columns = self.columns if columns is None else list(columns)
+        return pd.DataFrame({name: self.column(name) for name in columns}, copy=False)
+
+    def metrics(self, target, name, chunksize=1000000):
+        """
+        Compute the metrics of column name against column target in chunks.
+
+        Returns
+        metrics : dictionary with n, r2, rmse, mae and max_error
+        """
+        y, y_pred = self.column(target), self.column(name)
+        acc = MetricAccumulator()
+        for start in range(0, self.n_rows, chunksize):
+            acc.update(y[start:start + chunksize], y_pred[start:start + chunksize])
+        return acc.result()
+
+    def nbytes(self):
+        """
+        Return the size of all column files in bytes.
+        """
+        return sum(os.path.getsize(self._path(name)) for name in self.columns)
+
+
+def with_frame(func, store, columns, *args, **kwargs):
+    """
+    Call func with a dataframe of store columns followed by args.
+
+    Used for plot jobs, so a worker process opens the columns itself instead
+    of receiving a copy of the data.
+    """
+    return func(store.frame(columns), *args, **kwargs)
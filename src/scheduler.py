@@ -0,0 +1,161 @@
+"""
+scheduler.py
+
+This file owns the CPU budget of a pipeline run and shares it between the
+stages that run at the same time.
+
+It performs the following tasks.
+1. Hold a fixed number of cores and lend them to tasks. A task waits until
+   the cores it asked for are free, so the tasks running together never
+   use more cores than the budget.
+2. Pin BLAS and OpenMP to a fixed number of threads in the main process and
+   in the joblib workers of every task, so nested thread pools do not
+   multiply the number of busy threads.
+3. Measure the core utilization of the run from the system CPU counters,
+   which include worker processes, together with the core seconds leased
+   to every task.
+
+Example
+scheduler = ResourceScheduler(n_cores=4)
+with scheduler.activate():
+    with scheduler.lease(2, "gbr_re") as n_jobs:
+        train_gbr(df, n_jobs=n_jobs)
+print(scheduler.report())
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from joblib import parallel_config
+from threadpoolctl import threadpool_limits
+
+
+def _cpu_counters():
+    """
+    Return (busy, total) CPU jiffies of the machine, or None when /proc/stat
+    is not available.
+    """
+    try:
+        with open("/proc/stat") as f:
+            fields = [int(v) for v in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    # user nice system idle iowait irq softirq steal ...
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+    total = sum(fields[:8])
+    return total - idle, total
+
+
+class ResourceScheduler:
+    """
+    Core budget shared by concurrent tasks.
+
+    Use activate around the whole run and lease around every task.
+    """
+
+    def __init__(self, n_cores=None, blas_threads=1):
+        """
+        Parameters
+        n_cores : int or None
+            Cores in the budget. Defaults to the cores available to the process.
+        blas_threads : int
+            BLAS and OpenMP threads allowed per process or worker.
+        """
+        if n_cores is None:
+            n_cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        self.n_cores = max(1, int(n_cores or 1))
+        self.blas_threads = blas_threads
+        self.free = self.n_cores
+        self.leases = []
+        self._cond = threading.Condition()
+        self._started = None
+        self._counters = None
+        self._cpu = None
+        self._wall = None
+        self._process_cpu = 0.0
+        self._machine = None
+
+    def share(self, fraction):
+        """
+        Return the number of cores in a fraction of the budget, at least one.
+        """
+        return max(1, int(self.n_cores * fraction))
+
+    @contextmanager
+    def activate(self):
+        """
+        Limit BLAS and OpenMP threads for the run and measure utilization.
+        """
+        self.leases = []
+        self._started = time.perf_counter()
+        self._counters = _cpu_counters()
+        self._cpu = os.times()
+        try:
+            with threadpool_limits(limits=self.blas_threads):
+                yield self
+        finally:
+            self._wall = time.perf_counter() - self._started
+            end_counters = _cpu_counters()
+            end_cpu = os.times()
+            self._process_cpu = sum(end_cpu[:4]) - sum(self._cpu[:4])
+            self._machine = None
+            if self._counters is not None and end_counters is not None:
+                busy = end_counters[0] - self._counters[0]
+                total = end_counters[1] - self._counters[1]
+                self._machine = busy / total if total > 0 else None
+
+    @contextmanager
+    def lease(self, n, name=""):
+        """
+        Borrow n cores for a task, at most the whole budget.
+
+        Blocks until the cores are free. Inside the block joblib
+        uses the loky backend with the granted number of jobs and with the
+        BLAS threads of its workers limited.
+
+        Yields
+        n_jobs : int
+            Number of cores granted to the task.
+        """
+        granted = max(1, min(int(n), self.n_cores))
+        with self._cond:
+            while self.free < granted:
+                self._cond.wait()
+            self.free -= granted
+
+        start = time.perf_counter()
+        try:
+            with parallel_config(backend="loky", n_jobs=granted,
+                                 inner_max_num_threads=self.blas_threads):
+                yield granted
+        finally:
+            seconds = time.perf_counter() - start
+            with self._cond:
+                self.free += granted
+                self.leases.append({"task": name, "cores": granted, "seconds": seconds})
+                self._cond.notify_all()
+
+    def report(self):
+        """
+        Return the utilization of the last activated run.
+
+        Returns
+        report : dictionary with the core budget, wall time, core seconds
+                 leased to tasks, the leased share of the budget, the CPU time
+                 of this process and its finished children, and the busy share
+                 of all machine cores when the system counters are available
+        """
+        wall = self._wall if self._wall is not None else 0.0
+        capacity = self.n_cores * wall
+        leased = sum(l["cores"] * l["seconds"] for l in self.leases)
+        return {
+            "cores": self.n_cores,
+            "blas_threads": self.blas_threads,
+            "wall_s": wall,
+            "leased_core_s": leased,
+            "leased_utilization": leased / capacity if capacity > 0 else 0.0,
+            "process_cpu_s": self._process_cpu,
+            "machine_utilization": self._machine,
+        }
@@ -0,0 +1,225 @@
+"""
+score_memo.py
+
+This file keeps the cross validation scores of every hyperparameter
+candidate on disk, so a search only evaluates candidates it has not scored
+before.
+
+It performs the following tasks.
+1. Key a memo file by a hash of the search setup: the training data, the
+   feature set, the split and cross validation scheme, the estimator and
+   the library versions. Any change to these starts a new file.
+2. Key every entry inside the file by all parameters of the candidate
+   estimator, defaults included, the fold and the number of training rows.
+3. Append every score to the file as soon as its fit is done. An
+   interrupted search keeps all finished fits and resumes from them. A
+   line cut off by the interruption is removed when the file is opened.
+4. Run a grid search that only fits the (candidate, fold) pairs missing
+   from the memo and merges the cached and fresh scores into a
+   cv_results_ style dictionary.
+
+Example
+memo = ScoreMemo("results/cv_scores", data=arrays_fingerprint(X, y), features=["Re", "St"],
+                 cv={"kind": "KFold", "n_splits": 3})
+best_params, cv_results, report = memo_grid_search(GradientBoostingRegressor(random_state=42),
+                                                   PARAM_GRID, X, y, memo)
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+
+def arrays_fingerprint(*arrays):
+    """
+    Return a sha256 hash of the shapes and values of numpy arrays.
+    """
+    h = hashlib.sha256()
+    for a in arrays:
+        a = np.ascontiguousarray(a, dtype=np.float64)
+        h.update(str(a.shape).encode())
+        h.update(a.tobytes())
+    return h.hexdigest()
+
+
+def full_params(estimator, params):
+    """
+    Return every parameter of estimator with params set.
+
+    A candidate then has the same key whether a default value is listed in
+    the grid or not, so adding a new axis to a grid reuses the scores of
+    the candidates at its default value.
+    """
+    from sklearn.base import clone
+
+    return clone(estimator).set_params(**params).get_params()
+
+
+def _dumps(obj):
+    # Canonical JSON, numpy scalars are stored as Python numbers
+    return json.dumps(obj, sort_keys=True, default=lambda v: v.item())
+
+
+class ScoreMemo:
+    """
+    Append only file of cross validation scores for one search setup.
+    """
+
+    def __init__(self, folder, **setup):
+        """
+        Parameters
+        folder : str
+            Folder holding one .jsonl file per search setup.
+        setup : keyword arguments
+            Everything the scores depend on besides the candidate, for
+            example data, features, split, cv and estimator. The library
+            versions are added.
+        """
+        from src.artifact_cache import library_versions
+
+        self.setup = dict(setup, versions=library_versions())
+        self.key = hashlib.sha256(_dumps(self.setup).encode()).hexdigest()[:24]
+        self.path = os.path.join(folder, f"{self.key}.jsonl")
+        self.entries = {}
+
+        os.makedirs(folder, exist_ok=True)
+        if os.path.exists(self.path):
+            with open(self.path, "rb+") as f:
+                data = f.read()
+                # Cut a last line without newline, left by an interrupted write,
+                # so new entries start on a line of their own
+                complete = data.rfind(b"\n") + 1
+                if complete < len(data):
+                    f.truncate(complete)
+            for line in data[:complete].decode().splitlines():
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                self.entries[entry["key"]] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    @staticmethod
+    def entry_key(params, fold, rows):
+        return _dumps([params, int(fold), int(rows)])
+
+    def get(self, params, fold, rows):
+        """
+        Return the stored entry of a fit, or None when it was never scored.
+        """
+        return self.entries.get(self.entry_key(params, fold, rows))
+
+    def put(self, params, fold, rows, **scores):
+        """
+        Store the scores of a fit and append them to the memo file.
+        """
+        entry = {"key": self.entry_key(params, fold, rows), **scores}
+        self.entries[entry["key"]] = entry
+        with open(self.path, "a") as f:
+            f.write(_dumps(entry) + "\n")
+        return entry
+
+
+def _fit_and_score(tag, estimator, params, X, y, train_idx, val_idx):
+    """
+    Fit a clone of estimator with params on one fold and return tag with
+    the negative MSE on the validation and training rows and the fit time.
+    """
+    from sklearn.base import clone
+
+    model = clone(estimator).set_params(**params)
+    start = time.perf_counter()
+    model.fit(X[train_idx], y[train_idx])
+    fit_time = time.perf_counter() - start
+    return tag, {
+        "test_score": -float(np.mean((y[val_idx] - model.predict(X[val_idx])) ** 2)),
+        "train_score": -float(np.mean((y[train_idx] - model.predict(X[train_idx])) ** 2)),
+        "fit_time": fit_time,
+    }
+
+
+def memo_grid_search(estimator, param_grid, X, y, memo, cv=3, n_jobs=-1):
+    """
+    Grid search that reuses the fold scores stored in memo.
+
+    The folds are the unshuffled KFold splits GridSearchCV uses for a
+    regressor, and the score is the negative MSE, so the results match
+    GridSearchCV(estimator, param_grid, cv=cv, scoring="neg_mean_squared_error").
+
+    Parameters
+    estimator : sklearn estimator
+    param_grid : dict
+        Grid in the same format as PARAM_GRID.
+    X, y : numpy arrays
+        Training inputs and targets.
+    memo : ScoreMemo
+        Memo of the search setup. Every fresh fit is appended to it as soon
+        as it is done.
+    cv : int
+        Number of cross validation folds.
+    n_jobs : int
+        Number of parallel jobs used for the missing fits.
+
+    Returns
+    best_params : dictionary of best hyperparameters
+    cv_results : dictionary in the layout of GridSearchCV.cv_results_ with
+                 a cached column that is True for candidates scored
+                 entirely from the memo
+    report : dictionary with the number of candidates and of cached and
+             fresh fits
+    """
+    from joblib import Parallel, delayed
+    from sklearn.model_selection import KFold, ParameterGrid
+
+    candidates = list(ParameterGrid(param_grid))
+    keys = [full_params(estimator, params) for params in candidates]
+    folds = list(KFold(n_splits=cv).split(X))
+
+    # 1. Fits missing from the memo
+    missing = [(c, i) for c, key in enumerate(keys) for i, (train_idx, _) in enumerate(folds)
+               if memo.get(key, i, len(train_idx)) is None]
+
+    # 2. Store every fresh fit as soon as it finishes, in any order
+    results = Parallel(n_jobs=n_jobs, return_as="generator_unordered")(
+        delayed(_fit_and_score)((c, i), estimator, candidates[c], X, y, *folds[i])
+        for c, i in missing
+    )
+    for (c, i), scores in results:
+        memo.put(keys[c], i, len(folds[i][0]), **scores)
+
+    # 3. Merge the cached and fresh scores of every candidate
+    entries = [[memo.get(key, i, len(train_idx)) for i, (train_idx, _) in enumerate(folds)]
+               for key in keys]
+    fresh = {c for c, _ in missing}
+    cv_results = {"params": candidates}
+    for name in sorted(param_grid):
+        cv_results[f"param_{name}"] = np.array([p[name] for p in candidates], dtype=object)
+    for kind in ("test", "train"):
+        scores = np.array([[e[f"{kind}_score"] for e in row] for row in entries])
+        for i in range(cv):
+            cv_results[f"split{i}_{kind}_score"] = scores[:, i]
+        cv_results[f"mean_{kind}_score"] = scores.mean(axis=1)
+        cv_results[f"std_{kind}_score"] = scores.std(axis=1)
+    fit_times = np.array([[e["fit_time"] for e in row] for row in entries])
+    cv_results["mean_fit_time"] = fit_times.mean(axis=1)
+    cv_results["std_fit_time"] = fit_times.std(axis=1)
+
+    # Tied candidates share the best rank and the first of them wins, like GridSearchCV
+    mean = cv_results["mean_test_score"]
+    cv_results["rank_test_score"] = (mean[None, :] > mean[:, None]).sum(axis=1).astype(np.int32) + 1
+    best = int(np.argmax(mean))
+    cv_results["cached"] = np.array([c not in fresh for c in range(len(candidates))])
+
+    report = {
+        "candidates": len(candidates),
+        "grid_fits": len(candidates) * cv,
+        "fits": len(missing),
+        "cached_fits": len(candidates) * cv - len(missing),
+        "memo": memo.path,
+    }
+    return candidates[best], cv_results, report
@@ -0,0 +1,84 @@
+"""
+shared_data.py
+
+This file places training arrays in shared memory for parallel workers.
+
+It performs the following tasks.
+1. Write the arrays once to .npy files in /dev/shm, or in the temporary
+   folder when /dev/shm is not available or too small. Docker limits
+   /dev/shm to 64 MB by default, so a write that fills it up is repeated
+   in the temporary folder.
+2. Open them again with read only memory mapping. joblib sends a memory
+   mapped array to its workers as a file reference, so every worker maps
+   the same physical pages instead of unpickling its own copy.
+3. Remove the files when the search is done.
+
+Workers then only receive fold indices and read their rows from the shared
+pages. sklearn still converts the rows of a fold to its own float32 array
+inside every fit.
+
+Example
+with shared_arrays(X_train, y_train) as (X_shared, y_shared):
+    GridSearchCV(model, grid, n_jobs=4).fit(X_shared, y_shared)
+"""
+
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+
+def _shared_root(nbytes):
+    # /dev/shm when it is writable and has room for the arrays, else the temporary folder
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        if shutil.disk_usage("/dev/shm").free > nbytes:
+            return "/dev/shm"
+    return None
+
+
+def _write_arrays(arrays, root):
+    folder = tempfile.mkdtemp(prefix="vortex_shared_", dir=root)
+    try:
+        paths = []
+        for i, a in enumerate(arrays):
+            path = os.path.join(folder, f"{i}.npy")
+            np.save(path, np.ascontiguousarray(a))
+            paths.append(path)
+    except OSError:
+        shutil.rmtree(folder, ignore_errors=True)
+        raise
+    return folder, paths
+
+
+@contextmanager
+def shared_arrays(*arrays, enabled=True):
+    """
+    Yield read only memory mapped copies of arrays backed by shared files.
+
+    Parameters
+    arrays : numpy arrays
+    enabled : bool
+        When False the arrays are yielded unchanged, for example for a
+        search that runs in a single process.
+
+    Yields
+    arrays : tuple of numpy memmap
+    """
+    if not enabled:
+        yield arrays
+        return
+
+    root = _shared_root(sum(np.asarray(a).nbytes for a in arrays))
+    try:
+        folder, paths = _write_arrays(arrays, root)
+    except OSError:
+        if root is None:
+            raise
+        # /dev/shm filled up while writing, for example from another process
+        folder, paths = _write_arrays(arrays, None)
+    try:
+        yield tuple(np.load(path, mmap_mode="r") for path in paths)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
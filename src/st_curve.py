@@ -0,0 +1,196 @@
+"""
+st_curve.py
+
+This file estimates the typical St value at a given Re from the binned
+median of St over Re.
+
+It performs the following tasks.
+1. Split the Re range into equal width bins and compute the median St of
+   every bin in one vectorized pass. The rows are sorted once by bin and St,
+   and the medians are read at the middle of every bin segment.
+2. Fill empty bins by linear interpolation between their neighbours and
+   hold the first and last medians beyond the ends.
+3. Keep the fitted curve, so St is estimated for any Re with a single
+   interpolation and the input data is never modified.
+4. For data read in chunks, accumulate a mergeable histogram sketch of St
+   per Re bin and turn it into the same curve at the end.
+5. Save and load the curve as an npz file. Loading and querying only need NumPy.
+
+Example
+curve = StCurve.fit(df["Re"], df["St"])
+St = curve.predict([100.0, 2500.0])
+"""
+
+import numpy as np
+
+
+class StCurve:
+    """
+    Fitted median St versus Re curve.
+
+    Build it with StCurve.fit or StMedianSketch.curve and query it with predict.
+    """
+
+    def __init__(self, centers, medians, counts):
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.medians = np.asarray(medians, dtype=np.float64)
+        self.counts = np.asarray(counts, dtype=np.int64)
+
+    @staticmethod
+    def _fill(medians, counts):
+        # Empty bins are interpolated, the ends hold the nearest median
+        filled = counts > 0
+        if not filled.any():
+            raise ValueError("No rows to fit the St curve")
+        positions = np.arange(len(medians))
+        return np.interp(positions, positions[filled], medians[filled])
+
+    @classmethod
+    def fit(cls, re, st, n_bins=59, re_range=None):
+        """
+        Compute the median St in equal width Re bins.
+
+        Parameters
+        re, st : array like
+            Re and St values of the rows.
+        n_bins : int
+            Number of Re bins.
+        re_range : tuple of float or None
+            Range split into bins. Defaults to the range of re.
+
+        Returns
+        curve : StCurve
+
+        Raises
+        ValueError
+            When there are no rows inside re_range.
+        """
+        re = np.asarray(re, dtype=np.float64)
+        st = np.asarray(st, dtype=np.float64)
+        lo, hi = re_range if re_range is not None else (re.min(), re.max())
+        edges = np.linspace(lo, hi, n_bins + 1)
+
+        # 1. Bin index of every row, rows outside the range are dropped
+        inside = (re >= lo) & (re <= hi)
+        bins = np.clip(np.searchsorted(edges, re[inside], side="right") - 1, 0, n_bins - 1)
+        st = st[inside]
+
+        # 2. One sort by bin and St, every bin is then a contiguous segment
+        order = np.lexsort((st, bins))
+        st_sorted = st[order]
+        counts = np.bincount(bins, minlength=n_bins)
+        starts = np.cumsum(counts) - counts
+
+        # 3. Median at the middle of every non empty segment
+        medians = np.zeros(n_bins)
+        full = counts > 0
+        low = starts[full] + (counts[full] - 1) // 2
+        high = starts[full] + counts[full] // 2
+        medians[full] = (st_sorted[low] + st_sorted[high]) / 2
+
+        centers = (edges[:-1] + edges[1:]) / 2
+        return cls(centers, cls._fill(medians, counts), counts)
+
+    def predict(self, re):
+        """
+        Estimate St for the given Re values.
+
+        Parameters
+        re : float or array like
+
+        Returns
+        st : float or numpy array, with the shape of re
+        """
+        return np.interp(re, self.centers, self.medians)
+
+    def save(self, path):
+        """
+        Save the curve to an npz file.
+        """
+        np.savez(path, kind=np.array("st_curve"), centers=self.centers,
+                 medians=self.medians, counts=self.counts)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a curve written by save.
+        """
+        with np.load(path) as data:
+            return cls(data["centers"], data["medians"], data["counts"])
+
+
+class StMedianSketch:
+    """
+    Mergeable sketch of St per Re bin for data read in chunks.
+
+    Every Re bin keeps a histogram of St on fixed edges, so sketches of
+    different chunks are merged by adding their counts. Medians are exact up
+    to the St resolution of the histogram.
+    """
+
+    def __init__(self, re_range, st_range, n_bins=59, st_resolution=1024):
+        """
+        Parameters
+        re_range : tuple of float
+            Range of Re split into n_bins equal width bins.
+        st_range : tuple of float
+            Range of St covered by the histograms. Values outside are clipped.
+        n_bins : int
+            Number of Re bins.
+        st_resolution : int
+            Number of St histogram bins.
+        """
+        self.re_edges = np.linspace(re_range[0], re_range[1], n_bins + 1)
+        self.st_edges = np.linspace(st_range[0], st_range[1], st_resolution + 1)
+        self.counts = np.zeros((n_bins, st_resolution), dtype=np.int64)
+
+    def update(self, re, st):
+        """
+        Add the rows of a chunk. Rows with Re outside the range are skipped.
+        """
+        re = np.asarray(re, dtype=np.float64)
+        st = np.asarray(st, dtype=np.float64)
+        n_bins, n_st = self.counts.shape
+
+        inside = (re >= self.re_edges[0]) & (re <= self.re_edges[-1])
+        i = np.clip(np.searchsorted(self.re_edges, re[inside], side="right") - 1, 0, n_bins - 1)
+        j = np.clip(np.searchsorted(self.st_edges, st[inside], side="right") - 1, 0, n_st - 1)
+        self.counts += np.bincount(i * n_st + j, minlength=n_bins * n_st).reshape(n_bins, n_st)
+        return self
+
+    def merge(self, other):
+        """
+        Add the counts of a sketch built with the same ranges.
+
+        Raises
+        ValueError
+            When the bins of the two sketches differ.
+        """
+        if (self.counts.shape != other.counts.shape
+                or not np.array_equal(self.re_edges, other.re_edges)
+                or not np.array_equal(self.st_edges, other.st_edges)):
+            raise ValueError("Only sketches with the same bins can be merged")
+        self.counts += other.counts
+        return self
+
+    def curve(self):
+        """
+        Return the StCurve of all rows added so far.
+
+        The median of a bin is interpolated linearly inside the St histogram
+        bin that holds the middle row.
+        """
+        n_bins, n_st = self.counts.shape
+        totals = self.counts.sum(axis=1)
+        cumulative = np.cumsum(self.counts, axis=1)
+
+        half = totals / 2
+        j = np.minimum((cumulative < half[:, None]).sum(axis=1), n_st - 1)
+        rows = np.arange(n_bins)
+        before = np.where(j > 0, cumulative[rows, np.maximum(j - 1, 0)], 0)
+        inside = np.maximum(self.counts[rows, j], 1)
+        frac = np.clip((half - before) / inside, 0, 1)
+        medians = self.st_edges[j] + frac * (self.st_edges[j + 1] - self.st_edges[j])
+
+        centers = (self.re_edges[:-1] + self.re_edges[1:]) / 2
+        return StCurve(centers, StCurve._fill(medians, totals), totals)
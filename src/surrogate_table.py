@@ -0,0 +1,240 @@
+"""
+surrogate_table.py
+
+This file tabulates a trained Re and St model onto a 2D grid so that Cd can
+be looked up in constant time with bilinear interpolation.
+
+It performs the following tasks.
+1. Start from a grid with log spacing in Re and linear spacing in St over
+   the valid envelope, Re 20 to 5000 and St 0.12 to 0.3.
+2. Refine the grid where the model has steps. When the model exposes its
+   split thresholds, as a compiled FlatForest does, two nodes are placed on
+   either side of every step. Otherwise midpoints are inserted in every
+   interval where the model jumps by more than a tolerance.
+3. Answer queries with an O(1) bucket lookup of the grid cell followed by
+   bilinear interpolation in (log Re, St).
+4. Report the largest interpolation error against the real model.
+5. Save and load the table as an npz file. Loading and querying only need NumPy.
+"""
+
+import time
+
+import numpy as np
+
+
+# Valid operating envelope of the dataset
+RE_RANGE = (20.0, 5000.0)
+ST_RANGE = (0.12, 0.3)
+
+
+class _AxisIndex:
+    """
+    Constant time cell lookup on a sorted, non uniform axis.
+
+    The axis range is split into equal buckets. Each bucket stores the index
+    of the grid cell containing its left edge, so a query needs one bucket
+    lookup and a few forward steps when a bucket holds several nodes.
+    """
+
+    def __init__(self, nodes, max_buckets=1 << 16):
+        self.nodes = nodes
+        self.lo = nodes[0]
+        spacing = np.diff(nodes).min()
+        n_buckets = int(min(max_buckets, np.ceil((nodes[-1] - nodes[0]) / spacing)))
+        self.n_buckets = max(1, n_buckets)
+        self.scale = self.n_buckets / (nodes[-1] - nodes[0])
+
+        edges = self.lo + np.arange(self.n_buckets) / self.scale
+        self.start = np.clip(np.searchsorted(nodes, edges, side="right") - 1, 0, len(nodes) - 2)
+        self.max_steps = int(np.max(np.diff(np.append(self.start, len(nodes) - 2))))
+
+    def locate(self, x):
+        """
+        Return the cell index i with nodes[i] <= x <= nodes[i + 1].
+        x must already be clipped to the axis range.
+        """
+        b = np.minimum(((x - self.lo) * self.scale).astype(np.intp), self.n_buckets - 1)
+        i = self.start[b]
+        for _ in range(self.max_steps):
+            i = np.where(x > self.nodes[i + 1], i + 1, i)
+        return i
+
+
+class CdLookupTable:
+    """
+    Bilinear lookup table of Cd over (log Re, St).
+
+    predict takes the same [Re, St] input rows as the GBR Re St model.
+    Inputs outside the envelope are clipped to its edge.
+    """
+
+    def __init__(self, log_re, st, values, report=None):
+        self.log_re = np.ascontiguousarray(log_re, dtype=np.float64)
+        self.st = np.ascontiguousarray(st, dtype=np.float64)
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+        self.report = report or {}
+        self.n_features_in_ = 2
+        self._re_index = _AxisIndex(self.log_re)
+        self._st_index = _AxisIndex(self.st)
+
+    def predict(self, X):
+        """
+        Interpolate Cd for the rows of X.
+
+        Parameters
+        X : array like of shape (n_rows, 2)
+            Re and St values.
+
+        Returns
+        y : numpy array of shape (n_rows,)
+        """
+        X = np.asarray(X, dtype=np.float64)
+        u = np.clip(np.log10(X[:, 0]), self.log_re[0], self.log_re[-1])
+        v = np.clip(X[:, 1], self.st[0], self.st[-1])
+
+        i = self._re_index.locate(u)
+        j = self._st_index.locate(v)
+
+        tu = (u - self.log_re[i]) / (self.log_re[i + 1] - self.log_re[i])
+        tv = (v - self.st[j]) / (self.st[j + 1] - self.st[j])
+
+        V = self.values
+        return ((1 - tu) * (1 - tv) * V[i, j] + tu * (1 - tv) * V[i + 1, j]
+                + (1 - tu) * tv * V[i, j + 1] + tu * tv * V[i + 1, j + 1])
+
+    def save(self, path):
+        """
+        Save the table to an npz file.
+        """
+        np.savez(path, kind=np.array("cd_table"), log_re=self.log_re, st=self.st,
+                 values=self.values,
+                 report_keys=np.array(list(self.report.keys()), dtype=str),
+                 report_values=np.array(list(self.report.values()), dtype=np.float64))
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a table written by save.
+        """
+        with np.load(path) as data:
+            report = dict(zip(data["report_keys"].tolist(), data["report_values"].tolist()))
+            return cls(data["log_re"], data["st"], data["values"], report)
+
+
+def _grid_values(model, re_nodes, st_nodes):
+    Re, St = np.meshgrid(re_nodes, st_nodes, indexing="ij")
+    return model.predict(np.column_stack([Re.ravel(), St.ravel()])).reshape(Re.shape)
+
+
+def _step_nodes(thresholds, lo, hi):
+    """
+    Return the float32 values just below and just above each threshold.
+
+    Tree models compare float32 inputs with x <= threshold, so these two
+    values land on the two sides of the step.
+    """
+    t = thresholds[(thresholds > lo) & (thresholds < hi)]
+    below = t.astype(np.float32)
+    below = np.where(below > t, np.nextafter(below, np.float32(-np.inf)), below)
+    above = np.nextafter(below, np.float32(np.inf))
+    return np.concatenate([below, above]).astype(np.float64)
+
+
+def _midpoints(coords, jumps, tol, min_width):
+    """
+    Return the midpoints of every interval whose jump exceeds tol.
+    The midpoints are taken in the interpolation coordinate coords.
+    """
+    split = (jumps > tol) & (np.diff(coords) > 2 * min_width)
+    return (coords[:-1] + coords[1:])[split] / 2
+
+
+def build_lookup_table(model, re_range=RE_RANGE, st_range=ST_RANGE, n_re=128, n_st=32,
+                       tol=0.005, max_levels=8, max_nodes=4096, n_check=100000, seed=0):
+    """
+    Tabulate a trained Re and St model on an adaptive grid.
+
+    Parameters
+    model : object with a predict method taking [Re, St] rows
+        For example the GBR Re St model or its compiled FlatForest.
+    re_range, st_range : tuple of float
+        Envelope covered by the table.
+    n_re, n_st : int
+        Number of nodes of the starting grid on each axis.
+    tol : float
+        Intervals where the model changes by more than tol are split.
+    max_levels : int
+        Number of refinement passes.
+    max_nodes : int
+        Upper limit on the number of nodes per axis.
+    n_check : int
+        Number of random points used to measure the interpolation error.
+
+    Returns
+    table : CdLookupTable
+        table.report holds the grid size, build time and the maximum and
+        RMS interpolation errors against the model.
+    """
+    start = time.perf_counter()
+
+    re_nodes = np.geomspace(re_range[0], re_range[1], n_re)
+    st = np.linspace(st_range[0], st_range[1], n_st)
+
+    # Nodes on both sides of every known step of a compiled tree model
+    edges = getattr(model, "edges", None)
+    if edges is not None and len(edges) == 2:
+        re_steps = _step_nodes(edges[0], re_range[0], re_range[1])
+        st_steps = _step_nodes(edges[1], st_range[0], st_range[1])
+        if len(re_steps) + n_re <= max_nodes and len(st_steps) + n_st <= max_nodes:
+            re_nodes = np.unique(np.concatenate([re_nodes, re_steps]))
+            st = np.unique(np.concatenate([st, st_steps]))
+
+    min_re_width = np.log10(re_range[1] / re_range[0]) / (max_nodes * 4)
+    min_st_width = (st_range[1] - st_range[0]) / (max_nodes * 4)
+
+    # Refine both axes where the model still jumps by more than tol
+    values = _grid_values(model, re_nodes, st)
+    for _ in range(max_levels):
+        re_jumps = np.abs(np.diff(values, axis=0)).max(axis=1)
+        st_jumps = np.abs(np.diff(values, axis=1)).max(axis=0)
+
+        re_mids = 10.0 ** _midpoints(np.log10(re_nodes), re_jumps, tol, min_re_width)
+        st_mids = _midpoints(st, st_jumps, tol, min_st_width)
+        if len(re_mids) == 0 and len(st_mids) == 0:
+            break
+        if len(re_nodes) + len(re_mids) > max_nodes or len(st) + len(st_mids) > max_nodes:
+            break
+
+        re_nodes = np.unique(np.concatenate([re_nodes, re_mids]))
+        st = np.unique(np.concatenate([st, st_mids]))
+        values = _grid_values(model, re_nodes, st)
+
+    table = CdLookupTable(np.log10(re_nodes), st, values)
+    log_re = table.log_re
+
+    # Interpolation error against the model at random points and cell centres.
+    # Cells that only span the gap between two float32 values around a step
+    # are skipped, a tree model cannot be evaluated inside them.
+    rng = np.random.default_rng(seed)
+    X_check = np.column_stack([
+        10.0 ** rng.uniform(log_re[0], log_re[-1], n_check),
+        rng.uniform(st[0], st[-1], n_check),
+    ])
+    re_mid = 10.0 ** ((log_re[:-1] + log_re[1:]) / 2)
+    st_mid = (st[:-1] + st[1:]) / 2
+    Re_mid, St_mid = np.meshgrid(re_mid[np.diff(log_re) > min_re_width],
+                                 st_mid[np.diff(st) > min_st_width], indexing="ij")
+    X_check = np.vstack([X_check, np.column_stack([Re_mid.ravel(), St_mid.ravel()])])
+    err = np.abs(table.predict(X_check) - model.predict(X_check))
+
+    table.report = {
+        "re_nodes": len(log_re),
+        "st_nodes": len(st),
+        "cells": (len(log_re) - 1) * (len(st) - 1),
+        "build_s": time.perf_counter() - start,
+        "check_points": len(X_check),
+        "max_abs_error": float(err.max()),
+        "rms_error": float(np.sqrt(np.mean(err ** 2))),
+        "p99_abs_error": float(np.percentile(err, 99)),
+    }
+    return table
@@ -0,0 +1,299 @@
+"""
+synthetic.py
+
+This file generates synthetic Re, St and Cd datasets of any size that follow
+the joint distribution of the measured data.
+
+It performs the following tasks.
+1. Fit the distribution of the measured data.
+   a. The marginal distribution of log Re as a quantile function.
+   b. The distribution of St given Re as quantiles per Re bin, which keeps
+      the St(Re) trend and its spread.
+   c. The mean of Cd per (Re bin, St bin) cell and the residual noise level
+      per Re bin.
+   d. The number of decimals of every column.
+2. Draw rows chunk by chunk. Chunk i always uses the random stream
+   (seed, i), so the output only depends on the seed and the chunk size,
+   not on the number of worker processes.
+3. Write the rows to a CSV file, or to a folder of .npy columns that
+   load_data opens with memory mapping. Chunks are made in parallel worker
+   processes and memory stays constant for any number of rows.
+
+Example
+python -m src.synthetic --rows 100000000 --out data/synthetic_100m --binary
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+
+COLUMNS = ("Re", "St", "Cd")
+
+# Layout version of the binary output folder, read by data_loader.load_binary
+BINARY_FORMAT = 1
+
+
+def _decimals(values, max_decimals=6):
+    """
+    Return the smallest number of decimals that represents all values.
+    """
+    for d in range(max_decimals + 1):
+        if np.allclose(np.round(values, d), values, rtol=0, atol=1e-9):
+            return d
+    return None
+
+
+class SyntheticModel:
+    """
+    Fitted joint distribution of Re, St and Cd.
+
+    Build it with SyntheticModel.fit(df) and draw rows with sample.
+    """
+
+    def __init__(self, re_levels, re_quantiles, re_edges, st_levels, st_quantiles,
+                 st_edges, cd_mean, cd_std, decimals):
+        self.re_levels = re_levels
+        self.re_quantiles = re_quantiles
+        self.re_edges = re_edges
+        self.st_levels = st_levels
+        self.st_quantiles = st_quantiles
+        self.st_edges = st_edges
+        self.cd_mean = cd_mean
+        self.cd_std = cd_std
+        self.decimals = decimals
+
+    @classmethod
+    def fit(cls, df, n_re_bins=48, n_st_bins=20, n_quantiles=256):
+        """
+        Fit the distribution of a dataset with Re, St and Cd columns.
+
+        Parameters
+        df : pandas DataFrame
+            Measured dataset.
+        n_re_bins : int
+            Number of equal count bins of log Re for the conditional models.
+        n_st_bins : int
+            Number of St bins of the Cd mean table.
+        n_quantiles : int
+            Number of quantiles kept for the Re and St distributions.
+
+        Returns
+        model : SyntheticModel
+        """
+        log_re = np.log10(df["Re"].to_numpy(dtype=np.float64))
+        st = df["St"].to_numpy(dtype=np.float64)
+        cd = df["Cd"].to_numpy(dtype=np.float64)
+
+        # 1. Marginal of log Re
+        re_levels = np.linspace(0, 1, n_quantiles)
+        re_quantiles = np.quantile(log_re, re_levels)
+
+        # 2. St given Re, quantiles per equal count Re bin
+        re_edges = np.quantile(log_re, np.linspace(0, 1, n_re_bins + 1))
+        re_bin = np.clip(np.searchsorted(re_edges, log_re, side="right") - 1, 0, n_re_bins - 1)
+        st_levels = np.linspace(0, 1, 65)
+        st_quantiles = np.vstack([np.quantile(st[re_bin == b], st_levels)
+                                  for b in range(n_re_bins)])
+
+        # 3. Cd mean per (Re, St) cell and residual spread per Re bin
+        st_edges = np.linspace(st.min(), st.max(), n_st_bins + 1)
+        st_bin = np.clip(np.searchsorted(st_edges, st, side="right") - 1, 0, n_st_bins - 1)
+        cell = re_bin * n_st_bins + st_bin
+        counts = np.bincount(cell, minlength=n_re_bins * n_st_bins)
+        sums = np.bincount(cell, weights=cd, minlength=n_re_bins * n_st_bins)
+
+        re_mean = np.bincount(re_bin, weights=cd, minlength=n_re_bins) / np.bincount(re_bin, minlength=n_re_bins)
+        cd_mean = np.where(counts > 0, sums / np.maximum(counts, 1),
+                           np.repeat(re_mean, n_st_bins)).reshape(n_re_bins, n_st_bins)
+
+        resid = cd - cd_mean[re_bin, st_bin]
+        cd_std = np.sqrt(np.bincount(re_bin, weights=resid ** 2, minlength=n_re_bins)
+                         / np.bincount(re_bin, minlength=n_re_bins))
+
+        decimals = {col: _decimals(df[col].to_numpy(dtype=np.float64)) for col in COLUMNS}
+        return cls(re_levels, re_quantiles, re_edges, st_levels, st_quantiles,
+                   st_edges, cd_mean, cd_std, decimals)
+
+    def sample(self, n_rows, rng):
+        """
+        Draw n_rows rows.
+
+        Parameters
+        n_rows : int
+        rng : numpy Generator
+
+        Returns
+        columns : dictionary of Re, St and Cd arrays
+        """
+        n_re_bins, n_st_bins = self.cd_mean.shape
+
+        # Re from the inverse distribution function of log Re
+        log_re = np.interp(rng.random(n_rows), self.re_levels, self.re_quantiles)
+        re_bin = np.clip(np.searchsorted(self.re_edges, log_re, side="right") - 1, 0, n_re_bins - 1)
+
+        # St from the quantiles of its Re bin, interpolated between levels
+        pos = rng.random(n_rows) * (len(self.st_levels) - 1)
+        k = np.minimum(pos.astype(np.intp), len(self.st_levels) - 2)
+        frac = pos - k
+        q = self.st_quantiles
+        st = q[re_bin, k] * (1 - frac) + q[re_bin, k + 1] * frac
+
+        # Cd from the cell mean and the noise level of the Re bin
+        st_bin = np.clip(np.searchsorted(self.st_edges, st, side="right") - 1, 0, n_st_bins - 1)
+        cd = self.cd_mean[re_bin, st_bin] + self.cd_std[re_bin] * rng.standard_normal(n_rows)
+
+        columns = {"Re": 10.0 ** log_re, "St": st, "Cd": cd}
+        for col, d in self.decimals.items():
+            if d is not None:
+                columns[col] = np.round(columns[col], d)
+        return columns
+
+
+def _chunk_bounds(n_rows, chunksize):
+    return [(i, start, min(start + chunksize, n_rows))
+            for i, start in enumerate(range(0, n_rows, chunksize))]
+
+
+def _sample_chunk(model, seed, index, n_rows):
+    # The random stream of a chunk only depends on the seed and its index
+    return model.sample(n_rows, np.random.default_rng([seed, index]))
+
+
+def generate_chunks(model, n_rows, chunksize=1000000, seed=0):
+    """
+    Yield the synthetic dataset as DataFrame chunks in the current process.
+    """
+    for index, start, stop in _chunk_bounds(n_rows, chunksize):
+        chunk = pd.DataFrame(_sample_chunk(model, seed, index, stop - start))
+        chunk.index = pd.RangeIndex(start, stop)
+        yield chunk
+
+
+def _csv_chunk(model, seed, index, n_rows):
+    # Rounded values print in their shortest form, as in the measured file
+    columns = _sample_chunk(model, seed, index, n_rows)
+    return pd.DataFrame(columns).to_csv(header=False, index=False).encode()
+
+
+def _binary_chunk(model, seed, index, start, stop, folder):
+    columns = _sample_chunk(model, seed, index, stop - start)
+    for i, col in enumerate(COLUMNS):
+        out = np.load(os.path.join(folder, f"{i}.npy"), mmap_mode="r+")
+        out[start:stop] = columns[col]
+        out.flush()
+        del out
+    return stop - start
+
+
+def _run_ordered(tasks, n_workers, consume):
+    """
+    Run tasks in worker processes and consume their results in order.
+    At most two tasks per worker are in flight, so memory stays bounded.
+    """
+    if n_workers == 1:
+        for func, args in tasks:
+            consume(func(*args))
+        return
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        pending = []
+        for func, args in tasks:
+            pending.append(pool.submit(func, *args))
+            if len(pending) >= 2 * n_workers:
+                consume(pending.pop(0).result())
+        for future in pending:
+            consume(future.result())
+
+
+def write_dataset(model, path, n_rows, chunksize=1000000, seed=0, n_workers=None,
+                  binary=False):
+    """
+    Write a synthetic dataset of n_rows rows.
+
+    Parameters
+    model : SyntheticModel
+    path : str
+        CSV file, or output folder when binary is True.
+    n_rows : int
+        Number of rows.
+    chunksize : int
+        Rows generated per task. The output depends on seed and chunksize.
+    seed : int
+        Random seed.
+    n_workers : int or None
+        Worker processes. None uses one per CPU.
+    binary : bool
+        Write one .npy file per column and a meta.json file into the folder
+        path instead of a CSV file. load_data opens such a folder directly.
+
+    Returns
+    stats : dictionary with rows, seconds, rows_per_s and bytes
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count() or 1
+    start = time.perf_counter()
+    bounds = _chunk_bounds(n_rows, chunksize)
+
+    if binary:
+        os.makedirs(path, exist_ok=True)
+        for i in range(len(COLUMNS)):
+            out = np.lib.format.open_memmap(os.path.join(path, f"{i}.npy"), mode="w+",
+                                            dtype=np.float64, shape=(n_rows,))
+            del out
+        tasks = [(_binary_chunk, (model, seed, index, lo, hi, path)) for index, lo, hi in bounds]
+        _run_ordered(tasks, n_workers, lambda n: None)
+
+        meta = {
+            "format": BINARY_FORMAT,
+            "columns": list(COLUMNS),
+            "rows": n_rows,
+            "seed": seed,
+            "chunksize": chunksize,
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+    else:
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write((",".join(COLUMNS) + "\n").encode())
+            tasks = [(_csv_chunk, (model, seed, index, hi - lo)) for index, lo, hi in bounds]
+            _run_ordered(tasks, n_workers, f.write)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+    seconds = time.perf_counter() - start
+    return {"rows": n_rows, "seconds": seconds,
+            "rows_per_s": n_rows / seconds if seconds > 0 else 0.0, "bytes": size}
+
+
+def main():
+    from src.data_loader import load_data
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic vortex dataset")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--out", required=True, help="CSV file, or folder with --binary")
+    parser.add_argument("--binary", action="store_true", help="Write .npy columns instead of CSV")
+    parser.add_argument("--source", default=os.path.join("data", "vortex_data.csv"),
+                        help="Measured dataset the distribution is fitted to")
+    parser.add_argument("--chunksize", type=int, default=1000000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    model = SyntheticModel.fit(load_data(args.source))
+    stats = write_dataset(model, args.out, args.rows, args.chunksize, args.seed,
+                          args.workers, args.binary)
+    print(f"Wrote {stats['rows']} rows to {args.out} in {stats['seconds']:.1f} s, "
+          f"{stats['rows_per_s'] / 1e6:.2f} M rows/s, {stats['bytes'] / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
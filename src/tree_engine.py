@@ -0,0 +1,339 @@
+"""
+tree_engine.py
+
+This file compiles a fitted GradientBoostingRegressor into flat NumPy arrays
+and predicts with vectorized array operations instead of sklearn.
+
+It performs the following tasks.
+1. Copy the nodes of every tree into contiguous arrays for the split feature,
+   the threshold, the left and right child and the leaf value.
+2. Evaluate all trees for all rows at once. Each step moves every
+   (row, tree) pair one level down, so the loop runs max_depth times.
+3. Lower the node arrays to an exact cell table. The ensemble is constant
+   between consecutive split thresholds of each feature, so every leaf is a
+   box of cells and the table holds the summed prediction of each cell.
+   A query is then one searchsorted per feature and one table lookup.
+4. Save and load the arrays as an npz file.
+5. Benchmark the latency against sklearn for batch sizes from 1 to 1M rows.
+
+Only NumPy is needed to load and evaluate a compiled model.
+"""
+
+import itertools
+import time
+
+import numpy as np
+
+
+# Largest cell table built by compile_gbr, larger ensembles use tree traversal
+MAX_TABLE_CELLS = 4_000_000
+
+
+class FlatForest:
+    """
+    Array based evaluator for a compiled gradient boosting ensemble.
+
+    Leaves point to themselves as both children, so extra descent steps
+    leave a finished (row, tree) pair on its leaf. When a cell table has
+    been built, predict uses it instead of walking the trees.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots,
+                 max_depth, learning_rate, baseline, n_features,
+                 edges=None, table=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.learning_rate = float(learning_rate)
+        self.baseline = float(baseline)
+        self.n_features_in_ = int(n_features)
+        self.edges = edges
+        self.table = table
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict(self, X, chunk_cells=1 << 20):
+        """
+        Predict Cd for the rows of X.
+
+        Parameters
+        X : array like of shape (n_rows, n_features)
+            Input values in the same column order used for training.
+        chunk_cells : int
+            Upper bound on rows times trees evaluated at once, which keeps
+            the temporary index arrays small for very large batches.
+
+        Returns
+        y : numpy array of shape (n_rows,)
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(-1, 1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[1]} features, model expects {self.n_features_in_}"
+            )
+
+        # sklearn compares float32 inputs against the stored thresholds
+        X = X.astype(np.float32).astype(np.float64)
+
+        if self.table is not None:
+            return self._predict_table(X)
+
+        n_rows = len(X)
+        out = np.empty(n_rows, dtype=np.float64)
+        step = max(1, chunk_cells // self.n_trees)
+        for start in range(0, n_rows, step):
+            out[start:start + step] = self._predict_chunk(X[start:start + step])
+        return out
+
+    def _predict_chunk(self, X):
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees)).copy()
+
+        if self.n_features_in_ == 1:
+            x = X[:, :1]
+            for _ in range(self.max_depth):
+                go_left = x <= self.threshold[node]
+                node = np.where(go_left, self.left[node], self.right[node])
+        else:
+            rows = np.arange(len(X))[:, None]
+            for _ in range(self.max_depth):
+                x = X[rows, self.feature[node]]
+                go_left = x <= self.threshold[node]
+                node = np.where(go_left, self.left[node], self.right[node])
+
+        return self.baseline + self.learning_rate * self.value[node].sum(axis=1)
+
+    def _predict_table(self, X):
+        # Cell i of a feature holds the values edges[i - 1] < x <= edges[i]
+        cells = tuple(
+            np.searchsorted(self.edges[j], X[:, j], side="left")
+            for j in range(self.n_features_in_)
+        )
+        return self.table[cells]
+
+    def build_table(self, max_cells=MAX_TABLE_CELLS):
+        """
+        Build the exact cell table from the node arrays.
+
+        Returns
+        built : bool
+            False when the table would have more than max_cells cells.
+        """
+        edges = [np.unique(self.threshold[(self.feature == j) & np.isfinite(self.threshold)])
+                 for j in range(self.n_features_in_)]
+        shape = tuple(len(e) + 1 for e in edges)
+        if np.prod(shape, dtype=np.float64) > max_cells:
+            return False
+
+        # Each leaf adds its value to a box of cells. The boxes are written
+        # into a difference array and summed with one cumsum per feature.
+        diff = np.zeros(tuple(n + 1 for n in shape), dtype=np.float64)
+        for root in self.roots:
+            stack = [(root, [0] * len(shape), list(shape))]
+            while stack:
+                node, lo, hi = stack.pop()
+                if self.left[node] == node:
+                    for corner in itertools.product((0, 1), repeat=len(shape)):
+                        index = tuple(h if c else l for c, l, h in zip(corner, lo, hi))
+                        diff[index] += (-1) ** sum(corner) * self.value[node]
+                    continue
+
+                f = self.feature[node]
+                k = int(np.searchsorted(edges[f], self.threshold[node])) + 1
+                hi_left = hi.copy()
+                hi_left[f] = min(hi[f], k)
+                lo_right = lo.copy()
+                lo_right[f] = max(lo[f], k)
+                stack.append((self.left[node], lo, hi_left))
+                stack.append((self.right[node], lo_right, hi))
+
+        table = diff
+        for axis in range(len(shape)):
+            table = np.cumsum(table, axis=axis)
+        table = table[tuple(slice(0, n) for n in shape)]
+
+        self.edges = edges
+        self.table = np.ascontiguousarray(self.baseline + self.learning_rate * table)
+        return True
+
+    def save(self, path):
+        """
+        Save the arrays to an npz file.
+        """
+        arrays = {
+            "feature": self.feature,
+            "threshold": self.threshold,
+            "left": self.left,
+            "right": self.right,
+            "value": self.value,
+            "roots": self.roots,
+            "meta": np.array([self.max_depth, self.learning_rate,
+                              self.baseline, self.n_features_in_]),
+        }
+        if self.table is not None:
+            arrays["table"] = self.table
+            for j, e in enumerate(self.edges):
+                arrays[f"edges_{j}"] = e
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a FlatForest written by save.
+        """
+        with np.load(path) as data:
+            max_depth, learning_rate, baseline, n_features = data["meta"]
+            edges, table = None, None
+            if "table" in data:
+                table = data["table"]
+                edges = [data[f"edges_{j}"] for j in range(int(n_features))]
+            return cls(data["feature"], data["threshold"], data["left"],
+                       data["right"], data["value"], data["roots"],
+                       max_depth, learning_rate, baseline, n_features,
+                       edges, table)
+
+
+def compile_gbr(model, max_cells=MAX_TABLE_CELLS):
+    """
+    Compile a fitted GradientBoostingRegressor into a FlatForest.
+
+    Parameters
+    model : fitted GradientBoostingRegressor
+        A model trained with the squared error loss, such as the best_model
+        returned by train_gbr.
+    max_cells : int
+        Size limit of the cell table. Use 0 to keep only the node arrays.
+
+    Returns
+    forest : FlatForest
+
+    Raises
+    TypeError
+        When model is not a fitted GradientBoostingRegressor, for example a
+        model trained with engine="hist".
+    """
+    if not hasattr(model, "estimators_"):
+        raise TypeError(f"compile_gbr needs a fitted GradientBoostingRegressor, got {type(model).__name__}")
+
+    trees = [est.tree_ for est in model.estimators_[:, 0]]
+
+    counts = np.array([t.node_count for t in trees])
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    feature, threshold, left, right, value = [], [], [], [], []
+    for t, off in zip(trees, offsets):
+        idx = np.arange(t.node_count) + off
+        is_leaf = t.children_left == -1
+
+        feature.append(np.where(is_leaf, 0, t.feature))
+        threshold.append(np.where(is_leaf, np.inf, t.threshold))
+        left.append(np.where(is_leaf, idx, t.children_left + off))
+        right.append(np.where(is_leaf, idx, t.children_right + off))
+        value.append(t.value[:, 0, 0])
+
+    # Baseline prediction from the init estimator
+    if model.init_ == "zero":
+        baseline = 0.0
+    else:
+        baseline = model.init_.predict(np.zeros((1, model.n_features_in_)))[0]
+
+    forest = FlatForest(
+        feature=np.ascontiguousarray(np.concatenate(feature), dtype=np.intp),
+        threshold=np.ascontiguousarray(np.concatenate(threshold), dtype=np.float64),
+        left=np.ascontiguousarray(np.concatenate(left), dtype=np.intp),
+        right=np.ascontiguousarray(np.concatenate(right), dtype=np.intp),
+        value=np.ascontiguousarray(np.concatenate(value), dtype=np.float64),
+        roots=offsets.astype(np.intp),
+        max_depth=max(t.max_depth for t in trees),
+        learning_rate=model.learning_rate,
+        baseline=baseline,
+        n_features=model.n_features_in_,
+    )
+    if max_cells > 0:
+        forest.build_table(max_cells)
+
+    return forest
+
+
+def benchmark(model, forest=None, batch_sizes=(1, 10, 100, 1000, 10000, 100000, 1000000),
+              repeats=5, seed=0):
+    """
+    Compare the prediction latency of sklearn and the FlatForest.
+
+    Parameters
+    model : fitted GradientBoostingRegressor
+    forest : FlatForest or None
+        Compiled model. Compiled from model when not given.
+    batch_sizes : sequence of int
+        Number of rows per predict call.
+    repeats : int
+        Calls per batch size. Large batches use fewer calls.
+
+    Returns
+    rows : list of dictionaries with the batch size, the best latency in
+           milliseconds of sklearn, the tree walk and the cell table, and the
+           largest absolute difference to sklearn
+    """
+    if forest is None:
+        forest = compile_gbr(model)
+
+    # Same node arrays without the cell table
+    walker = FlatForest(forest.feature, forest.threshold, forest.left, forest.right,
+                        forest.value, forest.roots, forest.max_depth,
+                        forest.learning_rate, forest.baseline, forest.n_features_in_)
+    engines = [("sklearn", model.predict), ("walk", walker.predict)]
+    if forest.table is not None:
+        engines.append(("table", forest.predict))
+
+    rng = np.random.default_rng(seed)
+    results = []
+    for n in batch_sizes:
+        X = np.column_stack([rng.uniform(20, 5000, n), rng.uniform(0.12, 0.3, n)])
+        X = X[:, :forest.n_features_in_]
+        reps = max(1, min(repeats, 1000000 // (n * 10) + 1))
+
+        timings = {}
+        preds = {}
+        for name, fn in engines:
+            best = np.inf
+            for _ in range(reps):
+                start = time.perf_counter()
+                preds[name] = fn(X)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best * 1000.0
+
+        row = {"batch": n}
+        for name, _ in engines:
+            row[f"{name}_ms"] = timings[name]
+        row["max_abs_diff"] = max(float(np.max(np.abs(preds["sklearn"] - preds[name])))
+                                  for name, _ in engines)
+        results.append(row)
+
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    import pickle
+
+    parser = argparse.ArgumentParser(description="Benchmark the flat tree engine against sklearn")
+    parser.add_argument("--model", default="results/models/gbr_re_st.pkl")
+    parser.add_argument("--max-batch", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with open(args.model, "rb") as f:
+        gbr = pickle.load(f)
+
+    sizes = [n for n in (1, 10, 100, 1000, 10000, 100000, 1000000) if n <= args.max_batch]
+    results = benchmark(gbr, batch_sizes=sizes)
+    headers = list(results[0].keys())
+    print("\n" + "  ".join(f"{h:>12}" for h in headers))
+    for r in results:
+        print("  ".join(f"{r[h]:>12.4g}" for h in headers))
@@ -8,6 +8,11 @@ It contains four groups of plots.
 2. Predicted versus actual plots for checking model accuracy.
 3. A combined comparison plot showing theory, experiment and all machine learning models.
 4. A bar plot of best GBR hyperparameters.
+
+Scatter layers are rasterized, so vector outputs stay small. With
+density="hexbin", or density="auto" above DENSITY_THRESHOLD points, the
+points are drawn as a hexbin density map instead, so plot time and file
+size stay flat as the dataset grows.
 """
 
 import matplotlib.pyplot as plt
@@ -17,17 +22,49 @@ import pandas as pd
 from sklearn.preprocessing import PolynomialFeatures
 from sklearn.linear_model import LinearRegression
 
+from src.st_curve import StCurve
+
+
+# Number of points above which density="auto" switches to a hexbin map
+DENSITY_THRESHOLD = 200000
+
+
+def _scatter(x, y, density="auto", log_x=False, **kwargs):
+    """
+    Draw a rasterized scatter layer, or a hexbin density map for large data.
+
+    Parameters
+    x, y : array like
+        Point coordinates.
+    density : str
+        "scatter", "hexbin" or "auto".
+    log_x : bool
+        True when the x axis uses a log scale.
+    kwargs : dict
+        Extra arguments for the scatter layer.
+    """
+    if density not in ("scatter", "hexbin", "auto"):
+        raise ValueError(f"Unknown density mode: {density}")
+
+    if density == "hexbin" or (density == "auto" and len(x) > DENSITY_THRESHOLD):
+        plt.hexbin(np.asarray(x), np.asarray(y), gridsize=120, bins="log", mincnt=1,
+                   cmap="viridis", xscale="log" if log_x else "linear",
+                   label=kwargs.get("label"))
+        plt.colorbar(label="count, log scale")
+    else:
+        sns.scatterplot(x=x, y=y, rasterized=True, **kwargs)
+
 
 
 # 1. Scatter plots
 
-def plot_cd_vs_re(df, save_path):
+def plot_cd_vs_re(df, save_path, density="auto"):
     """
     Plot Cd versus Re using a log scale for Re.
     Save the figure at the specified path.
     """
     plt.figure(figsize=(6, 4))
-    sns.scatterplot(x=df["Re"], y=df["Cd"], s=18, alpha=0.35)
+    _scatter(df["Re"], df["Cd"], density, log_x=True, s=18, alpha=0.35)
     plt.xscale("log")
     plt.xlabel("Re log scale")
     plt.ylabel("Cd")
@@ -38,13 +75,13 @@ def plot_cd_vs_re(df, save_path):
     plt.close()
 
 
-def plot_cd_vs_st(df, save_path):
+def plot_cd_vs_st(df, save_path, density="auto"):
     """
     Plot Cd versus St.
     Save the figure at the specified path.
     """
     plt.figure(figsize=(6, 4))
-    sns.scatterplot(x=df["St"], y=df["Cd"], s=18, alpha=0.35)
+    _scatter(df["St"], df["Cd"], density, s=18, alpha=0.35)
     plt.xlabel("St")
     plt.ylabel("Cd")
     plt.title("Cd vs St")
@@ -54,13 +91,13 @@ def plot_cd_vs_st(df, save_path):
     plt.close()
 
 
-def plot_re_vs_st(df, save_path):
+def plot_re_vs_st(df, save_path, density="auto"):
     """
     Plot Re versus St using log scale for Re.
     Save the figure at the specified path.
     """
     plt.figure(figsize=(6, 4))
-    sns.scatterplot(x=df["Re"], y=df["St"], s=18, alpha=0.35)
+    _scatter(df["Re"], df["St"], density, log_x=True, s=18, alpha=0.35)
     plt.xscale("log")
     plt.xlabel("Re log scale")
     plt.ylabel("St")
@@ -74,13 +111,13 @@ def plot_re_vs_st(df, save_path):
 
 # 2. Predicted versus actual plots
 
-def plot_pred_vs_actual(df, pred_col, save_path):
+def plot_pred_vs_actual(df, pred_col, save_path, density="auto"):
     """
     Create a scatter plot comparing actual Cd and predicted Cd.
     A diagonal reference line is drawn to indicate perfect prediction.
     """
     plt.figure(figsize=(5.5, 5.5))
-    sns.scatterplot(x=df["Cd"], y=df[pred_col], s=18, alpha=0.35)
+    _scatter(df["Cd"], df[pred_col], density, s=18, alpha=0.35)
 
     mn = min(df["Cd"].min(), df[pred_col].min())
     mx = max(df["Cd"].max(), df[pred_col].max())
@@ -98,7 +135,8 @@ def plot_pred_vs_actual(df, pred_col, save_path):
 
 # 3. Combined comparison plot
 
-def plot_combined_cd_re(df, poly_results, gbr_re_model, gbr_st_model, save_path):
+def plot_combined_cd_re(df, poly_results, gbr_re_model, gbr_st_model, save_path,
+                        poly_family=None, density="auto", st_curve=None):
     """
     Create a combined Cd versus Re plot including the following items.
     1. Experimental data from the dataset.
@@ -108,14 +146,23 @@ def plot_combined_cd_re(df, poly_results, gbr_re_model, gbr_st_model, save_path)
     5. A GBR model that uses both Re and St. The St values are smoothed using
        moving median smoothing,applied through binning followed by linear interpolation.
        This smoothing reduces noise and produces a stable St versus Re trend.
+       A fitted StCurve can be passed as st_curve, otherwise one is fitted
+       from df. df itself is never modified.
 
     All curves are plotted on the same figure to show how each method compares.
+
+    When poly_family, a fitted ChebyshevFamily, is given the polynomial curves
+    are evaluated from it instead of refitting every degree on the full data.
     """
 
     plt.figure(figsize=(10, 6))
 
     # 1. Experimental data
-    plt.scatter(df["Re"], df["Cd"], color="black", s=10, alpha=0.30, label="Experimental Data")
+    if density == "hexbin" or (density == "auto" and len(df) > DENSITY_THRESHOLD):
+        _scatter(df["Re"], df["Cd"], "hexbin", log_x=True, label="Experimental Data")
+    else:
+        plt.scatter(df["Re"], df["Cd"], color="black", s=10, alpha=0.30,
+                    rasterized=True, label="Experimental Data")
 
     # 2. Theoretical Cd curve
     Re_grid = np.linspace(20, 5000, 500)
@@ -126,43 +173,28 @@ def plot_combined_cd_re(df, poly_results, gbr_re_model, gbr_st_model, save_path)
     # 3. Polynomial regression curves
     colors = ["red", "green", "orange", "purple", "brown"]
     for i, deg in enumerate(poly_results.keys()):
-        poly = PolynomialFeatures(degree=deg)
-        model = LinearRegression()
-        model.fit(poly.fit_transform(df[["Re"]]), df["Cd"])
-        Cd_poly_curve = model.predict(poly.transform(Re_grid.reshape(-1, 1)))
+        if poly_family is not None:
+            Cd_poly_curve = poly_family.predict(Re_grid, deg)
+        else:
+            poly = PolynomialFeatures(degree=deg)
+            model = LinearRegression()
+            model.fit(poly.fit_transform(df[["Re"]]), df["Cd"])
+            Cd_poly_curve = model.predict(poly.transform(Re_grid.reshape(-1, 1)))
         plt.plot(Re_grid, Cd_poly_curve, linestyle="--", linewidth=1.3,
-                 color=colors[i], alpha=0.8, label=f"Polynomial degree {deg}")
+                 color=colors[i % len(colors)], alpha=0.8, label=f"Polynomial degree {deg}")
 
     # 4. GBR using Re only
     Cd_gbr_re_curve = gbr_re_model.predict(Re_grid.reshape(-1, 1))
     plt.plot(Re_grid, Cd_gbr_re_curve, color="magenta", linewidth=2,
              label="GBR using Re")
 
-    # 5. Smoothing St for the GBR model using Re and St
-
-    # Step 1. Define number of bins
-    bin_count = 60
-    bins = np.linspace(df["Re"].min(), df["Re"].max(), bin_count)
-
-    # Step 2. Assign each Re to a bin index
-    df["Re_bin"] = np.digitize(df["Re"], bins) - 1
-
-    # Step 3. Keep only valid bins
-    df_valid = df[df["Re_bin"].between(0, bin_count - 2)]
-
-    # Step 4. Compute median St in each bin
-    med_st = df_valid.groupby("Re_bin")["St"].median()
-
-    # Step 5. Compute bin centers
-    bin_centers = (bins[:-1] + bins[1:]) / 2
-
-    # Step 6. Interpolate median St values to create smooth curve
-    median_st = med_st.reindex(range(bin_count - 1)).interpolate().bfill().ffill().values
-
-    # Step 7. Create smooth St curve for Re_grid
-    St_curve = np.interp(Re_grid, bin_centers, median_st)
+    # 5. Smoothed St for the GBR model using Re and St
+    # The binned median curve is fitted without touching df
+    if st_curve is None:
+        st_curve = StCurve.fit(df["Re"].values, df["St"].values)
+    St_curve = st_curve.predict(Re_grid)
 
-    # Step 8. Predict using GBR that uses both Re and St
+    # Predict using GBR that uses both Re and St
     X_grid_st = np.column_stack([Re_grid, St_curve])
     Cd_gbr_st_curve = gbr_st_model.predict(X_grid_st)
     # This code snippet is generated by Open AI chatgpt version 5.1 
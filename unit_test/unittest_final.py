@@ -8,23 +8,75 @@ components of the CMSE 802 final project. It checks that:
 2. Polynomial regression returns the correct output structure.
 3. Gradient Boosting using only Re returns model, metrics, and best parameters.
 4. Gradient Boosting using Re and St returns model, metrics, and best parameters.
+5. The staged halving search returns the same outputs with fewer fits.
+6. The artifact cache returns stored models and rebuilds corrupted entries.
+7. The batched prediction service answers concurrent requests correctly.
+8. The flat array tree engine matches sklearn predictions.
+9. The Cd lookup table reproduces the model inside the valid envelope.
+10. The streaming loader and evaluator match the in-memory versions.
+11. The binary column cache is reused and invalidated when the CSV changes.
+12. The Chebyshev polynomial engine matches sklearn and its streaming fit.
+13. Figures render in parallel workers, including the hexbin density mode.
+14. The scalable EDA mode matches describe() and keeps the pairplot sample small.
+15. The stage pipeline only reruns stages below a changed input.
+16. The run profiler records nested spans and writes JSON and CSV reports.
+17. The benchmark harness measures scaling and flags regressions.
+18. The synthetic generator is deterministic and matches the measured data.
+19. The hist boosting engine returns the same outputs as the exact engine.
+20. The resource scheduler never lends more cores than its budget.
+21. The binned median St curve matches pandas and leaves the data unchanged.
+22. The fused metrics match sklearn in memory, streamed and bootstrapped.
+23. Appended rows extend a GBR model with warm started trees.
+24. Batch prediction streams CSV and binary files in input order.
+25. The inference module starts with NumPy only and within its import budget.
+26. The results store writes typed columns in chunks and serves plots and metrics.
+27. Search workers receive the training arrays as shared memory maps.
+28. The compressed GBR model stays within its test RMSE tolerance.
+29. The score memo matches GridSearchCV and only fits new or unfinished candidates.
 
 Only a small sample of the dataset is used to keep execution fast.
 """
 
 import sys
 import os
+import asyncio
+import tempfile
 import unittest
+import numpy as np
 import pandas as pd
+from sklearn.ensemble import GradientBoostingRegressor
 
 # Add project root to sys.path so imports work correctly
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, PROJECT_ROOT)
 
 # Import the project modules under test
-from src.data_loader import load_data
+from src.data_loader import load_data, iter_data, LOAD_STATS
 from src.polynomial_regression import polynomial_regression
-from src.gbr_model import train_gbr
+from src.gbr_model import train_gbr, evaluate_stream
+from src.artifact_cache import ArtifactCache, data_fingerprint
+from src.predict_server import PredictionServer
+from src.load_generator import run_load, _connect, _request
+from src.tree_engine import compile_gbr, FlatForest
+from src.surrogate_table import build_lookup_table, CdLookupTable
+from src.poly_basis import ChebyshevFamily
+from src.render import plot_job, render_figures
+from src.visualization import plot_cd_vs_re, plot_pred_vs_actual
+from src.eda import run_eda, summary_stats, binned_kde, stratified_sample
+from src.pipeline import Stage, Pipeline
+from src.profiling import RunProfiler, profile_call, write_profile, pss_mb
+from src.benchmark import run_benchmarks, scaling_exponents, compare, save_results, load_results
+from src.synthetic import SyntheticModel, write_dataset
+from src.scheduler import ResourceScheduler
+from src.st_curve import StCurve, StMedianSketch
+from src.metrics import regression_metrics, MetricAccumulator, bootstrap_metrics
+from src.model_update import ModelState, update_model, _split_mask
+from src.batch_predict import predict_file
+from src.inference import CdPredictor, IMPORT_BUDGET_S, HEAVY_MODULES, load_arrays
+from src.results_store import ResultsStore, with_frame
+from src.shared_data import shared_arrays, _shared_root
+from src.distill import compress_gbr, truncate_gbr
+from src.score_memo import ScoreMemo, memo_grid_search
 
 
 class TestCMSE802Project(unittest.TestCase):
@@ -115,6 +167,771 @@ class TestCMSE802Project(unittest.TestCase):
         for key in expected_param_keys:
             self.assertIn(key, best_params)
 
+    def test_gbr_halving_search(self):
+        """
+        Ensure the staged halving search keeps the train_gbr outputs
+        and reports fewer fits than the full grid search.
+        """
+        model, metrics, best_params = train_gbr(self.df, use_st=True, search="halving")
+
+        self.assertIn("test_r2", metrics)
+        expected_param_keys = ["n_estimators", "learning_rate", "max_depth", "subsample"]
+        for key in expected_param_keys:
+            self.assertIn(key, best_params)
+
+        report = model.search_report_
+        self.assertLess(report["fits"], report["grid_fits"])
+        self.assertEqual(report["fits_saved"], report["grid_fits"] - report["fits"])
+
+    def test_artifact_cache(self):
+        """
+        Ensure cached artifacts are reused and corrupted entries are rebuilt.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ArtifactCache(tmp)
+            key = cache.key(stage="polynomial", data=data_fingerprint(self.df))
+
+            first, hit = cache.get_or_build(key, lambda: polynomial_regression(self.df))
+            self.assertFalse(hit)
+            second, hit = cache.get_or_build(key, lambda: polynomial_regression(self.df))
+            self.assertTrue(hit)
+            self.assertEqual(first[2], second[2])
+
+            # Damage the stored pickle, the entry must be rebuilt
+            with open(os.path.join(tmp, key + ".pkl"), "ab") as f:
+                f.write(b"garbage")
+            self.assertIsNone(cache.load(key))
+            _, hit = cache.get_or_build(key, lambda: polynomial_regression(self.df))
+            self.assertFalse(hit)
+
+    def test_predict_server(self):
+        """
+        Ensure the prediction service matches model.predict for single and
+        batched requests and reports latency statistics.
+        """
+        X = self.df[["Re", "St"]].values
+        model = GradientBoostingRegressor(n_estimators=20, random_state=42)
+        model.fit(X, self.df["Cd"].values)
+
+        async def scenario():
+            server = PredictionServer(model)
+            host, port = await server.start(port=0)
+            try:
+                reader, writer = await _connect(host, port, None)
+                single = await _request(reader, writer, "POST", "/predict",
+                                        {"Re": X[0, 0], "St": X[0, 1]})
+                batch = await _request(reader, writer, "POST", "/predict",
+                                       {"rows": X[:10].tolist()})
+                writer.close()
+                summary = await run_load(host, port, n_requests=50, concurrency=8)
+            finally:
+                await server.stop()
+            return single, batch, summary
+
+        single, batch, summary = asyncio.run(scenario())
+
+        np.testing.assert_allclose(single["Cd"], model.predict(X[:1]))
+        np.testing.assert_allclose(batch["Cd"], model.predict(X[:10]))
+        self.assertEqual(summary["requests"], 50)
+        self.assertIn("p99_ms", summary["server"])
+
+        # A Re only model fed Re and St answers 500 and keeps the connection open
+        re_only = compile_gbr(GradientBoostingRegressor(n_estimators=5, random_state=42)
+                              .fit(X[:, :1], self.df["Cd"].values))
+
+        async def failing():
+            server = PredictionServer(re_only)
+            host, port = await server.start(port=0)
+            try:
+                reader, writer = await _connect(host, port, None)
+                with self.assertRaisesRegex(RuntimeError, "500 Internal Server Error"):
+                    await _request(reader, writer, "POST", "/predict", {"Re": 100.0, "St": 0.2})
+                health = await _request(reader, writer, "GET", "/health")
+                writer.close()
+            finally:
+                await server.stop()
+            return health
+
+        self.assertEqual(asyncio.run(failing()), {"status": "ok"})
+
+    def test_tree_engine(self):
+        """
+        Ensure the compiled forest matches sklearn with and without the
+        cell table and after an npz round trip.
+        """
+        X = self.df[["Re", "St"]].values
+        model = GradientBoostingRegressor(n_estimators=30, max_depth=3, random_state=42)
+        model.fit(X, self.df["Cd"].values)
+
+        rng = np.random.default_rng(0)
+        X_new = np.vstack([X, np.column_stack([rng.uniform(20, 5000, 200),
+                                               rng.uniform(0.12, 0.3, 200)])])
+        expected = model.predict(X_new)
+
+        forest = compile_gbr(model)
+        walker = compile_gbr(model, max_cells=0)
+        self.assertIsNotNone(forest.table)
+        self.assertIsNone(walker.table)
+        np.testing.assert_allclose(forest.predict(X_new), expected, atol=1e-12)
+        np.testing.assert_allclose(walker.predict(X_new), expected, atol=1e-12)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "forest.npz")
+            forest.save(path)
+            np.testing.assert_allclose(FlatForest.load(path).predict(X_new), expected, atol=1e-12)
+
+    def test_lookup_table(self):
+        """
+        Ensure the lookup table matches the compiled model on the data points
+        inside the envelope and survives an npz round trip.
+        """
+        X = self.df[["Re", "St"]].values
+        model = GradientBoostingRegressor(n_estimators=30, max_depth=3, random_state=42)
+        model.fit(X, self.df["Cd"].values)
+        forest = compile_gbr(model)
+
+        table = build_lookup_table(forest, n_check=2000)
+        self.assertIn("max_abs_error", table.report)
+
+        inside = X[(X[:, 1] >= 0.12) & (X[:, 1] <= 0.3) & (X[:, 0] >= 20) & (X[:, 0] <= 5000)]
+        np.testing.assert_allclose(table.predict(inside), forest.predict(inside), atol=1e-9)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "table.npz")
+            table.save(path)
+            np.testing.assert_allclose(CdLookupTable.load(path).predict(inside),
+                                       table.predict(inside))
+
+    def test_streaming(self):
+        """
+        Ensure iter_data yields the same cleaned rows as load_data and that
+        evaluate_stream matches the in-memory metrics.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sample.csv")
+            sample = self.df.copy()
+            sample.loc[3, "St"] = np.nan
+            sample.to_csv(path, index=False)
+
+            expected = load_data(path)
+            chunks = list(iter_data(path, chunksize=7))
+            streamed = pd.concat(chunks).reset_index(drop=True)
+            pd.testing.assert_frame_equal(streamed, expected[["Re", "St", "Cd"]])
+
+            small = list(iter_data(path, chunksize=7, dtype="float32"))
+            self.assertEqual(small[0]["Re"].dtype, np.float32)
+
+            X = expected[["Re", "St"]].values
+            y = expected["Cd"].values
+            model = GradientBoostingRegressor(n_estimators=20, random_state=42).fit(X, y)
+            metrics = evaluate_stream(model, iter_data(path, chunksize=7), use_st=True)
+            y_pred = model.predict(X)
+
+            self.assertEqual(metrics["n"], len(y))
+            self.assertAlmostEqual(metrics["rmse"], np.sqrt(np.mean((y - y_pred) ** 2)))
+            self.assertAlmostEqual(metrics["r2"],
+                                   1 - np.sum((y - y_pred) ** 2) / np.sum((y - y.mean()) ** 2))
+
+            with self.assertRaises(ValueError):
+                next(iter_data(path, columns=("Re", "Missing")))
+
+    def test_binary_cache(self):
+        """
+        Ensure load_data reuses the memory mapped cache and rebuilds it
+        after the CSV changes.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "sample.csv")
+            self.df.to_csv(path, index=False)
+
+            first = load_data(path)
+            self.assertEqual(LOAD_STATS["source"], "csv")
+            second = load_data(path)
+            self.assertEqual(LOAD_STATS["source"], "cache")
+            pd.testing.assert_frame_equal(first, second)
+
+            # Edits to the loaded dataframe must not reach the cache
+            second.loc[0, "Cd"] = -1.0
+            pd.testing.assert_frame_equal(load_data(path), first)
+
+            self.df.head(10).to_csv(path, index=False)
+            third = load_data(path)
+            self.assertEqual(LOAD_STATS["source"], "csv")
+            self.assertEqual(len(third), 10)
+
+    def test_chebyshev_polynomial(self):
+        """
+        Ensure the single factorization engine returns the same output
+        structure, agrees with sklearn at low degree and that the streamed
+        normal equations give the same coefficients as the QR fit.
+        """
+        model, basis, metrics = polynomial_regression(self.df, engine="chebyshev")
+        _, _, sk_metrics = polynomial_regression(self.df)
+
+        self.assertEqual(set(metrics), set(sk_metrics))
+        for deg in (1, 2):
+            self.assertAlmostEqual(metrics[deg]["test_rmse"], sk_metrics[deg]["test_rmse"], places=6)
+
+        y_pred = model.predict(basis.transform(self.df[["Re"]]))
+        np.testing.assert_allclose(y_pred, model.predict_re(self.df["Re"].values))
+
+        x = self.df["Re"].values
+        y = self.df["Cd"].values
+        full = ChebyshevFamily(8, domain=(20.0, 5000.0)).fit(x, y)
+        streamed = ChebyshevFamily(8, domain=(20.0, 5000.0))
+        for start in range(0, len(x), 7):
+            streamed.partial_fit(x[start:start + 7], y[start:start + 7])
+        streamed.finalize()
+        for deg in range(1, 9):
+            np.testing.assert_allclose(streamed.coefs[deg], full.coefs[deg], rtol=1e-6, atol=1e-8)
+
+    def test_parallel_render(self):
+        """
+        Ensure figures rendered by worker processes are written and reported.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            df = self.df.assign(Cd_pred=self.df["Cd"])
+            jobs = [
+                plot_job("scatter", plot_cd_vs_re, df,
+                         save_path=os.path.join(tmp, "scatter.png")),
+                plot_job("hexbin", plot_cd_vs_re, df,
+                         save_path=os.path.join(tmp, "hexbin.png"), density="hexbin"),
+                plot_job("pred", plot_pred_vs_actual, df, "Cd_pred",
+                         save_path=os.path.join(tmp, "pred.png")),
+            ]
+            report = render_figures(jobs, n_workers=2)
+
+            self.assertEqual([r["figure"] for r in report], ["scatter", "hexbin", "pred"])
+            for r in report:
+                self.assertGreater(r["bytes"], 0)
+
+    def test_scalable_eda(self):
+        """
+        Ensure the one pass statistics, binned KDE and sampled pairplot are consistent.
+        """
+        stats, corr = summary_stats(self.df)
+        np.testing.assert_allclose(stats.values, self.df[["Re", "St", "Cd"]].describe().values)
+        np.testing.assert_allclose(corr.values, self.df[["Re", "St", "Cd"]].corr().values)
+
+        edges, counts, grid, density = binned_kde(self.df["Re"])
+        self.assertEqual(counts.sum(), len(self.df))
+        self.assertAlmostEqual(density.sum() * (grid[1] - grid[0]), 1.0, places=3)
+
+        sample = stratified_sample(self.df, cap=20)
+        self.assertLessEqual(abs(len(sample) - 20), 1)
+        self.assertTrue(sample.index.isin(self.df.index).all())
+
+        with tempfile.TemporaryDirectory() as tmp:
+            report = run_eda(self.df, tmp, mode="large", sample_cap=20)
+            self.assertEqual(len(report), 5)
+            for r in report:
+                self.assertGreater(r["bytes"], 0)
+            self.assertTrue(os.path.exists(os.path.join(tmp, "summary_stats.csv")))
+
+    def test_pipeline(self):
+        """
+        Ensure cached stages are reused and only downstream stages rerun.
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = ArtifactCache(tmp)
+
+            def build(scale):
+                return Pipeline([
+                    Stage("data", lambda: self.df, cache=False, fingerprint=data_fingerprint),
+                    Stage("mean_re", lambda df: float(df["Re"].mean()), inputs=["data"]),
+                    Stage("mean_cd", lambda df, scale: float(df["Cd"].mean()) * scale,
+                          inputs=["data"], params={"scale": scale}),
+                    Stage("ratio", lambda re, cd: cd / re, inputs=["mean_re", "mean_cd"]),
+                ], cache, max_workers=2)
+
+            pipeline = build(1.0)
+            first = pipeline.run()
+            self.assertEqual({r["status"] for r in pipeline.report if r["stage"] != "data"}, {"ran"})
+
+            second = pipeline.run()
+            self.assertEqual(second["ratio"], first["ratio"])
+            self.assertEqual({r["status"] for r in pipeline.report if r["stage"] != "data"}, {"cached"})
+
+            pipeline = build(2.0)
+            third = pipeline.run(targets=["ratio"])
+            status = {r["stage"]: r["status"] for r in pipeline.report}
+            self.assertEqual(status["mean_re"], "cached")
+            self.assertEqual(status["mean_cd"], "ran")
+            self.assertEqual(status["ratio"], "ran")
+            self.assertAlmostEqual(third["ratio"], 2 * first["ratio"])
+
+            self.assertEqual(pipeline.select(["mean_re"]), ["data", "mean_re"])
+            with self.assertRaises(ValueError):
+                pipeline.select(["missing"])
+
+    def test_profiling(self):
+        """
+        Ensure spans nest, carry row counts and are written to the run report.
+        """
+        profiler = RunProfiler()
+        with profiler.span("stage"):
+            with profiler.span("step", rows=len(self.df)):
+                np.sort(np.random.default_rng(0).random(10000))
+            profiler.add("worker", 0.5, cpu_s=0.4)
+
+        spans = {r["span"]: r for r in profiler.report()}
+        self.assertEqual(set(spans), {"stage", "stage/step", "stage/worker"})
+        self.assertEqual(spans["stage/step"]["rows"], len(self.df))
+        self.assertGreaterEqual(spans["stage"]["wall_s"], spans["stage/step"]["wall_s"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            json_path, csv_path = profiler.write(tmp)
+            self.assertEqual(len(pd.read_csv(csv_path)), 3)
+
+            result, stats = profile_call(sorted, [3, 1, 2])
+            self.assertEqual(result, [1, 2, 3])
+            prof_path, txt_path = write_profile(stats, os.path.join(tmp, "profile"))
+            self.assertTrue(os.path.getsize(txt_path) > 0)
+
+    def test_benchmark(self):
+        """
+        Ensure benchmark results are saved, reloaded and compared correctly.
+        """
+        import warnings
+
+        filters = list(warnings.filters)
+        results = run_benchmarks(sizes=[1000, 4000], cases=["load_data_csv", "polynomial_chebyshev"],
+                                 repeats=1)
+        self.assertEqual(warnings.filters, filters)
+        self.assertEqual(len(results), 4)
+        self.assertEqual(set(scaling_exponents(results)), {"load_data_csv", "polynomial_chebyshev"})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "baseline.json")
+            save_results(results, path)
+            baseline = load_results(path)
+        self.assertEqual(compare(results, baseline), [])
+
+        slower = [dict(r, seconds=r["seconds"] * 2 + 1.0) for r in results]
+        flagged = compare(slower, baseline, threshold=0.2)
+        self.assertEqual(len(flagged), 4)
+        self.assertTrue(all(r["metric"] == "seconds" for r in flagged))
+
+    def test_synthetic_data(self):
+        """
+        Ensure synthetic CSV and binary output agree for any worker count.
+        """
+        real = load_data("data/vortex_data.csv")
+        model = SyntheticModel.fit(real)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "synthetic.csv")
+            write_dataset(model, csv_path, 30000, chunksize=7000, seed=5, n_workers=1)
+            write_dataset(model, os.path.join(tmp, "binary"), 30000, chunksize=7000, seed=5,
+                          n_workers=2, binary=True)
+
+            from_csv = load_data(csv_path, use_cache=False)
+            from_binary = load_data(os.path.join(tmp, "binary"))
+            self.assertEqual(LOAD_STATS["source"], "binary")
+            self.assertEqual(len(from_binary), 30000)
+            np.testing.assert_allclose(from_csv.values, from_binary.values)
+
+            chunks = list(iter_data(os.path.join(tmp, "binary"), chunksize=10000))
+            self.assertEqual(sum(len(c) for c in chunks), 30000)
+
+        # Same ranges, trends and noise as the measured data
+        self.assertLessEqual(from_csv["Re"].max(), real["Re"].max())
+        np.testing.assert_allclose(from_csv.corr().values, real.corr().values, atol=0.03)
+        self.assertAlmostEqual(from_csv["Cd"].std(), real["Cd"].std(), delta=0.01)
+
+    def test_gbr_hist_engine(self):
+        """
+        Ensure the hist engine keeps the train_gbr contract in both search modes.
+        """
+        df = load_data("data/vortex_data.csv").head(3000)
+        for search in ("grid", "halving"):
+            model, metrics, params = train_gbr(df, use_st=True, search=search, engine="hist")
+            self.assertEqual(set(metrics), {"train_r2", "test_r2", "train_rmse",
+                                            "test_rmse", "train_mae", "test_mae"})
+            self.assertIn("max_leaf_nodes", params)
+            self.assertGreater(metrics["test_r2"], 0.5)
+            self.assertLess(model.n_iter_, 1000)
+
+        self.assertIn("rounds", model.search_report_)
+        with self.assertRaises(TypeError):
+            compile_gbr(model)
+        with self.assertRaises(ValueError):
+            train_gbr(df, engine="xgboost")
+
+    def test_scheduler(self):
+        """
+        Ensure concurrent leases stay within the core budget and are reported.
+        """
+        import threading
+        import time
+        from threadpoolctl import threadpool_info
+
+        scheduler = ResourceScheduler(n_cores=3)
+        in_use = []
+        lock = threading.Lock()
+        current = [0]
+
+        def task(n):
+            with scheduler.lease(n, f"task{n}") as granted:
+                with lock:
+                    current[0] += granted
+                    in_use.append(current[0])
+                time.sleep(0.02)
+                with lock:
+                    current[0] -= granted
+
+        with scheduler.activate():
+            self.assertTrue(all(p["num_threads"] == 1 for p in threadpool_info()))
+            threads = [threading.Thread(target=task, args=(n,)) for n in (2, 2, 1, 5, 1)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        self.assertLessEqual(max(in_use), 3)
+        self.assertEqual(scheduler.free, 3)
+        report = scheduler.report()
+        self.assertEqual(report["cores"], 3)
+        self.assertEqual(len(scheduler.leases), 5)
+        self.assertEqual(max(l["cores"] for l in scheduler.leases), 3)
+        self.assertGreater(report["leased_core_s"], 0)
+
+    def test_st_curve(self):
+        """
+        Ensure the St curve matches a pandas groupby median and its sketch.
+        """
+        df = load_data("data/vortex_data.csv").head(5000)
+        columns = list(df.columns)
+        curve = StCurve.fit(df["Re"].values, df["St"].values, n_bins=20)
+        self.assertEqual(list(df.columns), columns)
+
+        edges = np.linspace(df["Re"].min(), df["Re"].max(), 21)
+        bins = np.clip(np.searchsorted(edges, df["Re"], side="right") - 1, 0, 19)
+        expected = df["St"].groupby(bins).median().reindex(range(20)).interpolate().bfill().ffill()
+        np.testing.assert_allclose(curve.medians, expected.values)
+        self.assertEqual(curve.counts.sum(), len(df))
+        self.assertAlmostEqual(float(curve.predict(curve.centers[3])), curve.medians[3])
+
+        sketch = StMedianSketch((df["Re"].min(), df["Re"].max()),
+                                (df["St"].min(), df["St"].max()), n_bins=20)
+        other = StMedianSketch((df["Re"].min(), df["Re"].max()),
+                               (df["St"].min(), df["St"].max()), n_bins=20)
+        sketch.update(df["Re"].values[:2500], df["St"].values[:2500])
+        other.update(df["Re"].values[2500:], df["St"].values[2500:])
+        streamed = sketch.merge(other).curve()
+        np.testing.assert_array_equal(streamed.counts, curve.counts)
+        np.testing.assert_allclose(streamed.medians, curve.medians, atol=1e-3)
+
+    def test_metrics(self):
+        """
+        Ensure the fused metrics match sklearn for whole, chunked and resampled data.
+        """
+        from sklearn.metrics import r2_score, mean_squared_error, mean_absolute_error, max_error
+
+        rng = np.random.default_rng(0)
+        y = rng.normal(1.0, 0.2, 1000)
+        y_pred = y + rng.normal(0, 0.05, 1000)
+
+        m = regression_metrics(y, y_pred)
+        self.assertEqual(m["n"], 1000)
+        self.assertAlmostEqual(m["r2"], r2_score(y, y_pred))
+        self.assertAlmostEqual(m["rmse"], np.sqrt(mean_squared_error(y, y_pred)))
+        self.assertAlmostEqual(m["mae"], mean_absolute_error(y, y_pred))
+        self.assertAlmostEqual(m["max_error"], max_error(y, y_pred))
+
+        first, second = MetricAccumulator(), MetricAccumulator()
+        for lo in range(0, 600, 70):
+            first.update(y[lo:min(lo + 70, 600)], y_pred[lo:min(lo + 70, 600)])
+        second.update(y[600:], y_pred[600:])
+        merged = first.merge(second).result()
+        for key in m:
+            self.assertAlmostEqual(merged[key], m[key])
+
+        samples = bootstrap_metrics(y, y_pred, n_resamples=5, seed=1, block=2)
+        draws = np.random.default_rng(1).multinomial(1000, np.full(1000, 1e-3), size=2)
+        idx = np.repeat(np.arange(1000), draws[0])
+        self.assertAlmostEqual(samples["r2"][0], r2_score(y[idx], y_pred[idx]))
+        self.assertAlmostEqual(samples["mae"][0], mean_absolute_error(y[idx], y_pred[idx]))
+        self.assertAlmostEqual(samples["max_error"][0], max_error(y[idx], y_pred[idx]))
+        self.assertEqual(samples["rmse"].shape, (5,))
+
+        # Constant targets follow the sklearn rule instead of dividing by zero
+        flat = np.ones(10)
+        self.assertEqual(regression_metrics(flat, flat)["r2"], r2_score(flat, flat))
+        self.assertEqual(regression_metrics(flat, flat + 0.1)["r2"], r2_score(flat, flat + 0.1))
+        self.assertEqual(bootstrap_metrics(flat, flat + 0.1, n_resamples=2)["r2"].tolist(), [0.0, 0.0])
+
+        with self.assertRaises(ValueError):
+            regression_metrics(y, y_pred[:-1])
+
+    def test_model_update(self):
+        """
+        Ensure appended rows add trees to the model and unchanged data does nothing.
+        """
+        df = load_data("data/vortex_data.csv").head(1200)
+        old = df.head(1000)
+        mask = _split_mask(len(old))
+        X = old[["Re", "St"]].values
+        y = old["Cd"].values
+        model = GradientBoostingRegressor(n_estimators=40, random_state=42).fit(X[~mask], y[~mask])
+        rmse = np.sqrt(np.mean((y[mask] - model.predict(X[mask])) ** 2))
+        state = ModelState(model, True, len(old), data_fingerprint(old), mask, {}, {},
+                           rmse, 10.0, len(old), "halving")
+
+        state, report = update_model(state, df, extra_trees=10, max_trees=100)
+        self.assertEqual(report["action"], "updated")
+        self.assertEqual(report["new_rows"], 200)
+        self.assertEqual(state.model.n_estimators_, 50)
+        self.assertEqual(state.n_rows, 1200)
+        self.assertEqual(len(state.test_mask), 1200)
+        self.assertAlmostEqual(report["cold_retrain_s"], 12.0)
+        self.assertGreater(report["saved_s"], 0)
+        self.assertGreater(state.metrics["test_r2"], 0.5)
+
+        state, report = update_model(state, df)
+        self.assertEqual(report["action"], "unchanged")
+        self.assertEqual(len(state.history), 1)
+
+        state.model = FlatForest.__new__(FlatForest)
+        with self.assertRaises(TypeError):
+            update_model(state, df)
+
+    def test_batch_predict(self):
+        """
+        Ensure predict_file matches model.predict for CSV and binary inputs.
+        """
+        df = load_data("data/vortex_data.csv").head(2000)
+        X = df[["Re", "St"]].values
+        model = GradientBoostingRegressor(n_estimators=20, random_state=42).fit(X, df["Cd"].values)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "input.csv")
+            sample = df.copy()
+            sample.loc[5, "St"] = np.nan
+            sample.to_csv(csv_path, index=False)
+            expected = model.predict(np.delete(X, 5, axis=0))
+
+            for n_workers in (1, 2):
+                out = os.path.join(tmp, f"pred_{n_workers}.csv")
+                stats = predict_file(model, csv_path, out, chunksize=300, n_workers=n_workers)
+                result = pd.read_csv(out)
+                self.assertEqual(stats["rows"], len(df) - 1)
+                self.assertEqual(list(result.columns), ["Re", "St", "Cd_pred"])
+                np.testing.assert_allclose(result["Cd_pred"].values, expected)
+                self.assertGreater(stats["rows_per_s"], 0)
+
+            folder = os.path.join(tmp, "binary")
+            write_dataset(SyntheticModel.fit(df), folder, 1000, chunksize=400, n_workers=1,
+                          binary=True)
+            out = os.path.join(tmp, "pred_binary.csv")
+            predict_file(model, folder, out, chunksize=300, n_workers=2)
+            data = load_data(folder)
+            np.testing.assert_allclose(pd.read_csv(out)["Cd_pred"].values,
+                                       model.predict(data[["Re", "St"]].values))
+
+    def test_inference(self):
+        """
+        Ensure the inference module loads npz models, fills St and starts fast.
+        """
+        import subprocess
+
+        df = load_data("data/vortex_data.csv").head(2000)
+        X = df[["Re", "St"]].values
+        model = GradientBoostingRegressor(n_estimators=20, random_state=42).fit(X, df["Cd"].values)
+        curve = StCurve.fit(df["Re"].values, df["St"].values)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            compile_gbr(model).save(os.path.join(tmp, "model.npz"))
+            curve.save(os.path.join(tmp, "st_curve.npz"))
+            predictor = CdPredictor.load(os.path.join(tmp, "model.npz"))
+
+            # One row per line on stdin, spaces around the comma are allowed
+            command = [sys.executable, "-m", "src.inference", "--model", os.path.join(tmp, "model.npz")]
+            out = subprocess.run(command, input="2000, 0.3\n500,\n", cwd=PROJECT_ROOT,
+                                 capture_output=True, text=True, check=True).stdout.split()
+            np.testing.assert_allclose([float(v) for v in out],
+                                       predictor.predict([2000.0, 500.0], [0.3, np.nan]), rtol=1e-5)
+            for bad_input in ("2000,0.3,1\n", "abc,0.2\n", "2000,xyz\n"):
+                bad = subprocess.run(command, input=bad_input, cwd=PROJECT_ROOT,
+                                     capture_output=True, text=True)
+                self.assertEqual(bad.returncode, 2)
+                self.assertNotIn("Traceback", bad.stderr)
+
+            # Without an St curve a missing St is reported, not raised
+            os.makedirs(os.path.join(tmp, "no_curve"))
+            compile_gbr(model).save(os.path.join(tmp, "no_curve", "model.npz"))
+            bad = subprocess.run([sys.executable, "-m", "src.inference", "--model",
+                                  os.path.join(tmp, "no_curve", "model.npz")], input="2000\n",
+                                 cwd=PROJECT_ROOT, capture_output=True, text=True)
+            self.assertEqual(bad.returncode, 2)
+            self.assertIn("no St curve", bad.stderr)
+
+        np.testing.assert_allclose(predictor.predict(X[:50, 0], X[:50, 1]), model.predict(X[:50]))
+        filled = predictor.predict([100.0, 2000.0], [np.nan, 0.2])
+        np.testing.assert_allclose(filled, model.predict([[100.0, curve.predict(100.0)], [2000.0, 0.2]]))
+        with self.assertRaises(ValueError):
+            CdPredictor(predictor.model).predict([100.0])
+
+        # Cold start in a fresh interpreter, neither module may load the heavy libraries
+        code = ("import sys, time; t = time.perf_counter(); import src.inference; "
+                "s = time.perf_counter() - t; import src.main; "
+                "print(s); print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,))
+        out = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True,
+                             text=True, check=True).stdout.split("\n")
+        self.assertLess(float(out[0]), IMPORT_BUDGET_S)
+        self.assertEqual(out[1], "")
+
+    def test_results_store(self):
+        """
+        Ensure the results store keeps typed columns per row and reads them back.
+        """
+        import pickle
+
+        df = load_data("data/vortex_data.csv").head(1000)
+        X = df[["Re", "St"]].values
+        model = compile_gbr(GradientBoostingRegressor(n_estimators=20, random_state=42)
+                            .fit(X, df["Cd"].values))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            folder = os.path.join(tmp, "store")
+            store = ResultsStore.create(folder, len(df), key="sample")
+            store.write("Cd", lambda y: y, df["Cd"].values, chunksize=300, dtype="float64")
+            store.write("Cd_pred", model.predict, X, chunksize=300)
+            with self.assertRaises(ValueError):
+                store.write("bad", model.predict, X[:10])
+
+            store = pickle.loads(pickle.dumps(ResultsStore.open(folder)))
+            self.assertEqual(store.columns, ["Cd", "Cd_pred"])
+            self.assertEqual(store.column("Cd_pred").dtype, np.float32)
+            np.testing.assert_array_equal(store.column("Cd"), df["Cd"].values)
+            np.testing.assert_allclose(store.column("Cd_pred"), model.predict(X), rtol=1e-6)
+
+            expected = regression_metrics(df["Cd"].values, store.column("Cd_pred"))
+            for key, value in store.metrics("Cd", "Cd_pred", chunksize=256).items():
+                self.assertAlmostEqual(value, expected[key])
+
+            frame = with_frame(lambda f, n: f.head(n), store, ["Cd_pred"], 5)
+            self.assertEqual(list(frame.columns), ["Cd_pred"])
+            self.assertEqual(len(frame), 5)
+            with self.assertRaises(KeyError):
+                store.column("Cd_poly")
+
+            ResultsStore.create(folder, 10)
+            self.assertFalse(os.path.exists(os.path.join(folder, "Cd_pred.npy")))
+
+    def test_shared_data(self):
+        """
+        Ensure shared arrays reach joblib workers as memory maps and are removed.
+        """
+        from joblib import Parallel, delayed
+
+        X = np.arange(20000, dtype=np.float64).reshape(-1, 2)
+        y = X.sum(axis=1)
+
+        with shared_arrays(X, y, enabled=False) as (X_in, y_in):
+            self.assertIs(X_in, X)
+
+        with shared_arrays(X, y) as (X_in, y_in):
+            folder = os.path.dirname(X_in.filename)
+            self.assertIsInstance(X_in, np.memmap)
+            np.testing.assert_array_equal(X_in, X)
+            types = Parallel(n_jobs=2)(delayed(lambda a, i: (type(a).__name__, float(a[i].sum())))(X_in, i)
+                                       for i in range(2))
+            self.assertEqual(types, [("memmap", 1.0), ("memmap", 5.0)])
+        self.assertFalse(os.path.exists(folder))
+
+        # Arrays larger than the free space of /dev/shm go to the temporary folder
+        self.assertIsNone(_shared_root(2 ** 62))
+
+        pss = pss_mb()
+        self.assertTrue(pss is None or pss > 0)
+
+        df = load_data("data/vortex_data.csv").head(2000)
+        model, metrics, _ = train_gbr(df, use_st=True, search="halving", n_jobs=2)
+        self.assertGreater(metrics["test_r2"], 0.5)
+
+    def test_distill(self):
+        """
+        Ensure the compressed model is smaller and within the RMSE tolerance.
+        """
+        df = load_data("data/vortex_data.csv").head(3000)
+        X = df[["Re", "St"]].values
+        model = GradientBoostingRegressor(n_estimators=150, max_depth=3, random_state=42)
+        model.fit(X, df["Cd"].values)
+
+        np.testing.assert_allclose(truncate_gbr(model, 40).predict(X),
+                                   list(model.staged_predict(X))[39])
+        self.assertEqual(len(model.estimators_), 150)
+
+        best, report = compress_gbr(model, df, tolerance=0.05, repeats=1)
+        self.assertEqual([r["model"] for r in report[:2]], ["gbr", "flat_forest"])
+        original, chosen = report[1], min((r for r in report if r["within"]), key=lambda r: r["kb"])
+        self.assertTrue(chosen["within"])
+        self.assertLessEqual(chosen["rmse_change"], 0.05)
+        self.assertLess(chosen["kb"], original["kb"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "small.npz")
+            best.save(path)
+            np.testing.assert_allclose(load_arrays(path).predict(X), best.predict(X))
+
+        from sklearn.ensemble import HistGradientBoostingRegressor
+
+        hist = HistGradientBoostingRegressor(max_iter=10).fit(X, df["Cd"].values)
+        for bad in (object(), hist):
+            with self.assertRaises(TypeError):
+                compress_gbr(bad, df)
+
+    def test_score_memo(self):
+        """
+        Ensure memoized grid searches match GridSearchCV and resume from the memo.
+        """
+        from sklearn.model_selection import GridSearchCV
+
+        df = load_data("data/vortex_data.csv").head(600)
+        X, y = df[["Re", "St"]].values, df["Cd"].values
+        estimator = GradientBoostingRegressor(random_state=42)
+        grid = {"n_estimators": [10, 20], "max_depth": [2, 3]}
+
+        with tempfile.TemporaryDirectory() as tmp:
+            best, results, report = memo_grid_search(estimator, grid, X, y, ScoreMemo(tmp, data="a"),
+                                                     n_jobs=1)
+            search = GridSearchCV(estimator, grid, cv=3, scoring="neg_mean_squared_error",
+                                  return_train_score=True).fit(X, y)
+            self.assertEqual(best, search.best_params_)
+            for key in ("mean_test_score", "mean_train_score", "split2_test_score", "rank_test_score"):
+                np.testing.assert_allclose(results[key], search.cv_results_[key])
+            self.assertEqual(report["fits"], 12)
+
+            # An interrupted run keeps its finished fits, a cut off line is skipped
+            memo = ScoreMemo(tmp, data="a")
+            with open(memo.path) as f:
+                lines = f.readlines()
+            with open(memo.path, "w") as f:
+                f.writelines(lines[:5] + [lines[5][:20]])
+            self.assertEqual(len(ScoreMemo(tmp, data="a")), 5)
+            _, results, report = memo_grid_search(estimator, grid, X, y, ScoreMemo(tmp, data="a"),
+                                                  n_jobs=1)
+            self.assertEqual(report["fits"], 7)
+            np.testing.assert_allclose(results["mean_test_score"], search.cv_results_["mean_test_score"])
+
+            # A new axis only fits the candidates away from its default value
+            wide = dict(grid, learning_rate=[0.1, 0.2])
+            _, results, report = memo_grid_search(estimator, wide, X, y, ScoreMemo(tmp, data="a"),
+                                                  n_jobs=1)
+            self.assertEqual((report["fits"], report["cached_fits"]), (12, 12))
+            self.assertEqual(list(results["cached"]), [True] * 4 + [False] * 4)
+
+            # Another dataset starts an empty memo
+            self.assertEqual(len(ScoreMemo(tmp, data="b")), 0)
+
+            _, _, params = train_gbr(df, use_st=True, search="halving", n_jobs=1, param_grid=grid,
+                                     memo_dir=tmp)
+            model, _, cached_params = train_gbr(df, use_st=True, search="halving", n_jobs=1,
+                                                param_grid=grid, memo_dir=tmp)
+            self.assertEqual(params, cached_params)
+            self.assertEqual(model.search_report_["fits"], 0)
+
 
 if __name__ == "__main__":
     unittest.main()